@@ -1,31 +1,43 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from app.db.session import get_db
+from app.db.session import get_async_db
+from app.core import auth_cache
 from app.core.security import decode_token
 from app.models.user import User
 
 bearer = HTTPBearer(auto_error=False)
 
-def get_current_user(
-    db: Session = Depends(get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     creds: HTTPAuthorizationCredentials = Depends(bearer),
-) -> User:
+):
     if not creds or not creds.credentials:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
 
-    try:
-        payload = decode_token(creds.credentials)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise ValueError("No sub")
-        uid = UUID(user_id)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    uid = auth_cache.cached_token(creds.credentials)
+    if uid is None:
+        try:
+            payload = decode_token(creds.credentials)
+            user_id = payload.get("sub")
+            if not user_id:
+                raise ValueError("No sub")
+            uid = UUID(user_id)
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        auth_cache.store_token(creds.credentials, uid, payload.get("exp"))
+
+    # snapshot de solo lectura (id, email, is_admin, ...), no un objeto de la sesión
+    user = auth_cache.cached_user(uid)
+    if user is None:
+        row = await db.scalar(select(User).where(User.id == uid))
+        if row:
+            user = auth_cache.principal(row)
+            auth_cache.store_user(user)
 
-    user = db.query(User).filter(User.id == uid).first()
     if not user or not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found/inactive")
     return user
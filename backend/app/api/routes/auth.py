@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timezone
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.user import User
 from app.schemas.auth import RegisterIn, LoginIn, GoogleLoginIn, AuthOut
 from app.schemas.user import UserOut
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import hash_password, verify_and_update, create_access_token
+from app.core import password_pool
 from app.core.google_auth import verify_google_id_token
 from app.api.deps import get_current_user
 
@@ -17,45 +19,62 @@ def _auth_response(user: User) -> AuthOut:
     token = create_access_token(str(user.id))
     return AuthOut(token=token, user=UserOut.model_validate(user))
 
+async def _password_op(fn, *args):
+    # bcrypt va al pool de procesos propio; lleno -> 503 enseguida en vez de hacer cola
+    try:
+        return await password_pool.run(fn, *args)
+    except password_pool.PoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas solicitudes de autenticación en curso, reintenta en unos segundos.",
+            headers={"Retry-After": "1"},
+        )
+
+# bcrypt corre en core/password_pool; la verificación del token de Google bloquea y va al pool de hilos
+
 @router.post("/register", response_model=AuthOut)
-def register(payload: RegisterIn, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == payload.email).first()
+async def register(payload: RegisterIn, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(User).where(User.email == payload.email))
     if existing:
         raise HTTPException(status_code=409, detail="El Email ya ha sido usado ")
 
     user = User(
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=await _password_op(hash_password, payload.password),
         full_name=payload.full_name,
         provider="local",
         is_active=True,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return _auth_response(user)
 
 @router.post("/login", response_model=AuthOut)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
+async def login(payload: LoginIn, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.email == payload.email))
     if not user or not user.password_hash:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario Inactivo")
-    if not verify_password(payload.password, user.password_hash):
+    valid, new_hash = await _password_op(verify_and_update, payload.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
 
+    # hash con otro costo (BCRYPT_ROUNDS cambió): se guarda el nuevo, ya calculado en el worker
+    if new_hash:
+        user.password_hash = new_hash
     user.last_login_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.commit()
     return _auth_response(user)
 
 @router.post("/google", response_model=AuthOut)
-def google_login(payload: GoogleLoginIn, db: Session = Depends(get_db)):
+async def google_login(payload: GoogleLoginIn, db: AsyncSession = Depends(get_async_db)):
     if not payload.id_token:
         raise HTTPException(status_code=400, detail="Falta id_token")
 
     try:
-        info = verify_google_id_token(payload.id_token)
+        info = await run_in_threadpool(verify_google_id_token, payload.id_token)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Google token inválido")
 
@@ -67,7 +86,7 @@ def google_login(payload: GoogleLoginIn, db: Session = Depends(get_db)):
     if not email or not sub:
         raise HTTPException(status_code=401, detail="Google payload inválido")
 
-    user = db.query(User).filter(or_(User.google_sub == sub, User.email == email)).first()
+    user = await db.scalar(select(User).where(or_(User.google_sub == sub, User.email == email)).limit(1))
 
     if not user:
         user = User(
@@ -79,8 +98,8 @@ def google_login(payload: GoogleLoginIn, db: Session = Depends(get_db)):
             is_active=True,
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     else:
         if not user.google_sub:
             user.google_sub = sub
@@ -91,7 +110,7 @@ def google_login(payload: GoogleLoginIn, db: Session = Depends(get_db)):
         if user.provider == "local":
             user.provider = "mixed"
         user.last_login_at = datetime.now(timezone.utc)
-        db.commit()
+        await db.commit()
 
     if not user.is_active:
         raise HTTPException(status_code=401, detail="Usuario Inactivo")
@@ -99,14 +118,11 @@ def google_login(payload: GoogleLoginIn, db: Session = Depends(get_db)):
     return _auth_response(user)
 
 @router.get("/me", response_model=UserOut)
-def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: User = Depends(get_current_user)):
     return UserOut.model_validate(current_user)
 
 @router.get("/ping")
-def admin_ping(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
+async def admin_ping(current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
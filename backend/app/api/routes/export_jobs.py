@@ -0,0 +1,64 @@
+import os
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.api.deps import get_current_user
+from app.api.routes.files import _resolve_file, _safe_filename
+from app.core import export_jobs
+from app.core.xlsx_export import XLSX_MEDIA_TYPE
+from app.models.export_job import ExportJob
+from app.models.file import File
+from app.schemas.export_job import ExportJobCreateIn, ExportJobOut
+
+router = APIRouter(prefix="/export-jobs", tags=["export-jobs"])
+
+
+def _get_job(db: Session, current_user, job_id: str) -> ExportJob:
+    try:
+        uid = UUID(job_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Export job not found")
+
+    job = db.query(ExportJob).filter(ExportJob.id == uid).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+
+    if (not getattr(current_user, "is_admin", False)) and (job.owner_id != current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    return job
+
+
+@router.post("", response_model=ExportJobOut, status_code=202)
+def create_export_job(payload: ExportJobCreateIn, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    f = _resolve_file(db, current_user, payload.file_id)
+    if not f.file_json:
+        raise HTTPException(status_code=400, detail="File has no JSON to export")
+    return export_jobs.enqueue(db, f, current_user.id)
+
+
+@router.get("/{job_id}", response_model=ExportJobOut)
+def get_export_job(job_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    return _get_job(db, current_user, job_id)
+
+
+@router.get("/{job_id}/download")
+def download_export_job(job_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    job = _get_job(db, current_user, job_id)
+
+    if job.status == "expired":
+        raise HTTPException(status_code=410, detail="Export expired")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=job.error or "Export failed")
+    if job.status != "done" or not job.artifact_path:
+        raise HTTPException(status_code=409, detail="Export not ready")
+    if not os.path.exists(job.artifact_path):
+        raise HTTPException(status_code=410, detail="Export expired")
+
+    f = db.query(File.code, File.name).filter(File.id == job.file_id).first()
+    base = f"{f.code}-{f.name}" if f else str(job.file_id)
+    fname = _safe_filename(base.strip("-")) + ".xlsx"
+
+    return FileResponse(job.artifact_path, media_type=XLSX_MEDIA_TYPE, filename=fname)
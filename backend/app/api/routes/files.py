@@ -1,57 +1,163 @@
-import copy
+import base64
 import json
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from app.db.session import get_db
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from sqlalchemy import Text, bindparam, cast, func, literal, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, REGCONFIG, UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+
+from app.db.session import get_async_db
 from app.api.deps import get_current_user
 from app.models.file import File
+from app.models.file_node import FileNode
 from app.models.template import Template
-from app.schemas.file import FileCreateIn, FileListOut, FileOut
+from app.schemas.file import (
+    FileBulkCreateIn,
+    FileBulkExportIn,
+    FileCreateIn,
+    FileListOut,
+    FileMetaOut,
+    FileNodeOut,
+    FileOut,
+    FilePageOut,
+    FileSaveOut,
+    FileScoresBatchIn,
+    FileScoresOut,
+    FileScoreSummaryOut,
+    FileSearchOut,
+    FileSubtreeMetaOut,
+    FileSubtreeOut,
+)
+from app.core.file_search import SEARCH_ACCENTS, SEARCH_CONFIG, SEARCH_PLAIN
 from app.core.ids import random_code, random_share_token
+import uuid
 from uuid import UUID
 
+import asyncio
 import io
 import re
-import unicodedata
+import time
+import zipfile
+from collections import deque
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
 from fastapi.responses import StreamingResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
+from app.core.config import (
+    XLSX_SPOOL_MAX_BYTES,
+    XLSX_CHUNK_SIZE,
+    EXPORT_POOL_WORKERS,
+    EXPORT_BULK_MAX_FILES,
+    FILE_BULK_CREATE_MAX,
+    FILE_STORAGE_MODE,
+    COMPRESS_ENABLED,
+    COMPRESS_MIN_BYTES,
+    SCORES_BATCH_MAX,
+    SCORES_CHUNK_FILES,
+)
+from app.core.xlsx_export import XLSX_MEDIA_TYPE, build_file_xlsx
+from app.core import (
+    compression,
+    export_cache,
+    export_pool,
+    file_nodes,
+    file_store,
+    file_summary,
+    file_view,
+    metrics,
+    scoring,
+    template_cache,
+)
+from app.core.json_response import document_response, dumps_compact
+from app.core.json_patch import (
+    JSON_PATCH_MEDIA_TYPE,
+    MERGE_PATCH_MEDIA_TYPE,
+    PatchError,
+    apply_json_patch,
+    apply_merge_patch,
+    format_pointer,
+    json_size,
+    parse_pointer,
+    to_simple_ops,
+)
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 
-def _unique_file_code(db: Session) -> str:
-    while True:
-        code = random_code("F-", 6)
-        exists = db.query(File).filter(File.code == code).first()
-        if not exists:
-            return code
+_LIST_COLUMNS = [getattr(File, k) for k in FileListOut.model_fields]
+_SAVE_COLUMNS = [getattr(File, k) for k in FileSaveOut.model_fields]
+_META_FIELDS = list(FileMetaOut.model_fields)
+_META_COLUMNS = [getattr(File, k) for k in _META_FIELDS]
 
 
-def _unique_share_token(db: Session) -> str:
-    while True:
-        tok = random_share_token()
-        exists = db.query(File).filter(File.share_token == tok).first()
-        if not exists:
-            return tok
+def _encode_cursor(updated_at: datetime, file_id) -> str:
+    raw = json.dumps([updated_at.isoformat(), str(file_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
 
-@router.get("", response_model=list[FileListOut])
-def list_files(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    files = (
-        db.query(File)
-        .filter(File.owner_id == current_user.id)
-        .order_by(File.updated_at.desc())
-        .all()
-    )
-    return files
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, fid = json.loads(raw)
+        return datetime.fromisoformat(ts), UUID(fid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
 
 
-@router.post("", response_model=FileOut, status_code=201)
-def create_file(payload: FileCreateIn, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    tpl = db.query(Template).filter(Template.id == payload.template_id, Template.is_active == True).first()
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.get("", response_model=FilePageOut)
+async def list_files(
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: str | None = None,
+    template_id: UUID | None = None,
+    name_prefix: str | None = Query(default=None, max_length=120),
+    updated_from: datetime | None = None,
+    updated_to: datetime | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    # solo las columnas de FileListOut: no traemos file_json ni hidratamos entidades
+    q = select(*_LIST_COLUMNS).where(File.owner_id == current_user.id)
+
+    if template_id:
+        q = q.where(File.template_id == template_id)
+    if name_prefix:
+        q = q.where(File.name.ilike(_like_escape(name_prefix) + "%", escape="\\"))
+    if updated_from:
+        q = q.where(File.updated_at >= updated_from)
+    if updated_to:
+        q = q.where(File.updated_at < updated_to)
+
+    # keyset: seguimos estrictamente después de (updated_at, id) del último ítem entregado
+    if cursor:
+        after_ts, after_id = _decode_cursor(cursor)
+        q = q.where(tuple_(File.updated_at, File.id) < tuple_(after_ts, after_id))
+
+    q = q.order_by(File.updated_at.desc(), File.id.desc()).limit(limit + 1)
+    rows = (await db.execute(q)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].updated_at, rows[-1].id)
+
+    return FilePageOut(items=rows, next_cursor=next_cursor)
+
+
+async def _load_template(db: AsyncSession, template_id, current_user) -> Template:
+    # template_json se pide solo si la versión no está en template_cache
+    tpl = await db.scalar(
+        select(Template)
+        .options(defer(Template.template_json))
+        .where(Template.id == template_id, Template.is_active == True)
+    )
     if not tpl:
         raise HTTPException(status_code=404, detail="Template not found")
 
@@ -59,64 +165,171 @@ def create_file(payload: FileCreateIn, db: Session = Depends(get_db), current_us
         allowed = (tpl.visibility in ["public", "shared"]) or (tpl.owner_id == current_user.id)
         if not allowed:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Template not allowed")
+    return tpl
 
-    def _unwrap_template_json(tj):
-        if not isinstance(tj, dict):
-            return {}
 
-        if "template" in tj and "data" in tj and isinstance(tj["data"], dict):
-            return tj["data"]
+async def _new_file_doc(db: AsyncSession, tpl: Template) -> tuple[bytes, int, str, bytes]:
+    """
+    file_json inicial de un archivo creado desde `tpl`, ya serializado:
+    (bytes UTF-8, size_bytes, storage, bytes a guardar en la columna).
+    Igual a dumps_compact({"template": {...}, "data": <plantilla desenvuelta>}).
+    """
+    # en modo delta un archivo recién creado es la plantilla tal cual (delta vacío): el documento
+    # se arma con la copia de template_versions, la misma base con la que se va a materializar
+    if FILE_STORAGE_MODE == file_store.DELTA and await db.run_sync(file_store.ensure_snapshot, tpl.id, tpl.version):
+        entry = template_cache.get(tpl.id, tpl.version, snapshot=True)
+        if entry is None:
+            tj = await db.run_sync(file_store.snapshot_json, tpl.id, tpl.version)
+            with metrics.timer("json_serialize"):
+                entry = await run_in_threadpool(template_cache.put, tpl.id, tpl.version, tj, True)
+        header = _template_header(tpl, tpl.version)
+        doc = b"".join([b'{"template":', header, b',"data":', entry.data_bytes, b"}"])
+        return doc, len(doc), file_store.DELTA, b"".join([b'{"template":', header, b',"delta":{"o":{}}}'])
+
+    entry = template_cache.get(tpl.id, tpl.version)
+    if entry is None:
+        row = (
+            await db.execute(select(Template.template_json, Template.version).where(Template.id == tpl.id))
+        ).one()
+        with metrics.timer("json_serialize"):
+            entry = await run_in_threadpool(template_cache.put, tpl.id, row.version, row.template_json)
+        tpl_version = row.version
+    else:
+        tpl_version = tpl.version
 
-        if "data" in tj and isinstance(tj["data"], dict) and (
-            "columns" in tj["data"] or "nodes" in tj["data"] or "meta" in tj["data"]
-        ):
-            return tj["data"]
+    doc = b"".join([b'{"template":', _template_header(tpl, tpl_version), b',"data":', entry.data_bytes, b"}"])
+    return doc, len(doc), file_store.FULL, doc
 
-        # Caso ideal: ya viene plano (ui/meta/columns/nodes)
-        return tj
 
-    base_json = _unwrap_template_json(copy.deepcopy(tpl.template_json))
+def _template_header(tpl: Template, version) -> bytes:
+    return dumps_compact({"id": str(tpl.id), "code": tpl.code, "version": version}).encode("utf-8")
 
-    file_json = {
-        "template": {"id": str(tpl.id), "code": tpl.code, "version": tpl.version},
-        "data": base_json,
-    }
 
-    raw = json.dumps(file_json, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
-    size_bytes = len(raw)
-
-    f = File(
-        code=_unique_file_code(db),
-        name=payload.name,
-        owner_id=current_user.id,
-        template_id=tpl.id,
-        is_public=payload.is_public,
-        share_token=_unique_share_token(db),
-        share_enabled=True,
-        file_json=file_json,
-        size_bytes=size_bytes,
+_INSERT_ATTEMPTS = 5
+
+
+async def _insert_files(
+    db: AsyncSession,
+    tpl: Template,
+    names: list[str],
+    owner_id,
+    is_public: bool,
+    storage: str,
+    doc: bytes,
+    size_bytes: int,
+    returning: list,
+) -> list:
+    """
+    Inserta un archivo por nombre con un solo INSERT ... SELECT FROM unnest(...): el documento
+    viaja una vez y se castea a jsonb en la base. code/share_token se generan acá y los choques
+    con los índices únicos se resuelven con ON CONFLICT DO NOTHING + reintento de los que faltan.
+    Devuelve las filas de `returning` en el orden de `names`.
+    """
+    doc_param = cast(bindparam("doc", doc.decode("utf-8"), type_=Text), JSONB)
+    ids = [uuid.uuid4() for _ in names]
+    pending = dict(zip(ids, names))
+    rows = {}
+
+    for _ in range(_INSERT_ATTEMPTS):
+        codes, tokens = set(), set()
+        while len(codes) < len(pending):
+            codes.add(random_code("F-", 6))
+        while len(tokens) < len(pending):
+            tokens.add(random_share_token())
+
+        src = func.unnest(
+            bindparam("ids", list(pending), type_=ARRAY(PG_UUID(as_uuid=True))),
+            bindparam("codes", list(codes), type_=ARRAY(Text)),
+            bindparam("tokens", list(tokens), type_=ARRAY(Text)),
+            bindparam("names", list(pending.values()), type_=ARRAY(Text)),
+        ).table_valued("id", "code", "share_token", "name").render_derived(name="src")
+        stmt = (
+            pg_insert(File)
+            .from_select(
+                ["id", "code", "share_token", "name", "owner_id", "template_id", "is_public",
+                 "share_enabled", "storage", "file_json", "size_bytes", "revision"],
+                select(
+                    src.c.id, src.c.code, src.c.share_token, src.c.name,
+                    literal(owner_id, PG_UUID(as_uuid=True)), literal(tpl.id, PG_UUID(as_uuid=True)),
+                    literal(is_public), literal(True), literal(storage), doc_param, literal(size_bytes), literal(1),
+                ),
+            )
+            .on_conflict_do_nothing()
+            .returning(*returning)
+        )
+        for row in (await db.execute(stmt)).all():
+            rows[row.id] = row
+            pending.pop(row.id, None)
+        if not pending:
+            break
+    else:
+        raise HTTPException(status_code=503, detail="No se pudieron generar códigos únicos, reintenta.")
+
+    return [rows[fid] for fid in ids]
+
+
+@router.post("", response_model=FileOut, status_code=201)
+async def create_file(
+    payload: FileCreateIn,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    tpl = await _load_template(db, payload.template_id, current_user)
+
+    doc, size_bytes, storage, stored = await _new_file_doc(db, tpl)
+
+    rows = await _insert_files(
+        db, tpl, [payload.name], current_user.id, payload.is_public, storage, stored, size_bytes, _META_COLUMNS
     )
-    db.add(f)
-    db.commit()
-    db.refresh(f)
-    return f
+    await db.commit()
+    background_tasks.add_task(file_summary.seed, [rows[0].id])
+    with metrics.timer("json_response"):
+        return document_response(FileMetaOut.model_validate(rows[0]), "file_json", doc, status_code=201)
+
+
+@router.post("/bulk", response_model=list[FileListOut], status_code=201)
+async def create_files_bulk(
+    payload: FileBulkCreateIn,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Crea un archivo por cada nombre desde la misma plantilla, en una sola transacción.
+    Responde el listado (sin file_json) en el orden de `names`.
+    """
+    if len(payload.names) > FILE_BULK_CREATE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {FILE_BULK_CREATE_MAX} archivos por solicitud")
+
+    tpl = await _load_template(db, payload.template_id, current_user)
+    _, size_bytes, storage, stored = await _new_file_doc(db, tpl)
+
+    rows = await _insert_files(
+        db, tpl, payload.names, current_user.id, payload.is_public, storage, stored, size_bytes, _LIST_COLUMNS
+    )
+    await db.commit()
+    background_tasks.add_task(file_summary.seed, [r.id for r in rows])
+    return rows
 
 
 @router.delete("/{file_id}", status_code=204)
-def delete_file(file_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    f = db.query(File).filter(File.id == file_id).first()
+async def delete_file(file_id: str, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    f = await db.scalar(select(File).options(defer(File.file_json)).where(File.id == file_id))
     if not f:
         raise HTTPException(status_code=404, detail="File not found")
 
     if (not current_user.is_admin) and (f.owner_id != current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
 
-    db.delete(f)
-    db.commit()
+    await db.run_sync(file_summary.remove, [f.id])
+    await db.delete(f)
+    await db.commit()
+    await run_in_threadpool(export_cache.invalidate, f.id)
     return None
 
 
-def _resolve_file(db: Session, current_user, file_id: str) -> File:
+def _resolve_file(db: Session, current_user, file_id: str, load_json: bool = True) -> File:
     # intenta UUID primero
     uid = None
     try:
@@ -124,26 +337,21 @@ def _resolve_file(db: Session, current_user, file_id: str) -> File:
     except Exception:
         uid = None
 
-    q = db.query(File)
-    if uid:
-        q = q.filter(File.id == uid)
-    else:
-        q = q.filter(File.code == file_id)
+    def _query():
+        q = db.query(File)
+        if not load_json:
+            q = q.options(defer(File.file_json))
+        if uid:
+            return q.filter(File.id == uid)
+        return q.filter(File.code == file_id)
 
+    # admin ve cualquier archivo: una sola consulta, sin filtro de owner
+    q = _query()
     if not getattr(current_user, "is_admin", False):
         q = q.filter(File.owner_id == current_user.id)
 
     f = q.first()
 
-    # si es admin y no encontró, intenta sin owner filter
-    if (not f) and getattr(current_user, "is_admin", False):
-        q = db.query(File)
-        if uid:
-            q = q.filter(File.id == uid)
-        else:
-            q = q.filter(File.code == file_id)
-        f = q.first()
-
     if not f:
         raise HTTPException(status_code=404, detail="File not found")
 
@@ -153,10 +361,243 @@ def _resolve_file(db: Session, current_user, file_id: str) -> File:
     return f
 
 
+def _file_etag(f, variant: str | None = None) -> str:
+    # un ETag fuerte por representación: documento "r5", proyección "r5;fields=columns,meta",
+    # subárbol "r5;nodes=1.2;depth=1"; las variantes comprimidas suman ";gzip" (core/compression)
+    if variant:
+        return f'"r{f.revision};{quote(variant, safe=",;=.-_")}"'
+    return f'"r{f.revision}"'
+
+
+def _file_headers(f, variant: str | None = None) -> dict:
+    return {
+        "ETag": _file_etag(f, variant),
+        "Last-Modified": format_datetime(f.updated_at.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def _not_modified(
+    f, if_none_match: str | None, if_modified_since: str | None, variant: str | None = None
+) -> Response | None:
+    """
+    304 si la representación `variant` de `f` no cambió; None si hay que responderla.
+    If-None-Match manda; If-Modified-Since solo se mira si no viene ETag.
+    """
+    if if_none_match:
+        etag = _etag_matches(if_none_match, _file_etag(f, variant))
+    elif if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        etag = _file_etag(f, variant) if f.updated_at.replace(microsecond=0) <= since else None
+    else:
+        etag = None
+    if etag is None:
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**_file_headers(f, variant), "ETag": etag})
+
+
+@router.get("/nodes", response_model=list[FileNodeOut])
+async def search_nodes(
+    codigo: str | None = Query(None),
+    prioridad: str | None = Query(None),
+    tipo: str | None = Query(None),
+    template_id: UUID | None = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Nodos de los archivos visibles por código, prioridad y/o tipo, desde file_nodes
+    (sin leer documentos). Niveles y prioridad son los del último guardado procesado.
+    """
+    q = (
+        select(
+            FileNode.file_id,
+            File.code.label("file_code"),
+            FileNode.node_id,
+            FileNode.parent_id,
+            FileNode.codigo,
+            FileNode.tipo,
+            FileNode.nivel_aplicacion,
+            FileNode.nivel_importancia,
+            FileNode.prioridad,
+        )
+        .join(File, File.id == FileNode.file_id)
+    )
+    if codigo is not None:
+        q = q.where(FileNode.codigo == scoring.normalize_code(codigo.strip()))
+    if prioridad is not None:
+        q = q.where(FileNode.prioridad == prioridad)
+    if tipo is not None:
+        q = q.where(FileNode.tipo == tipo.upper())
+    if template_id is not None:
+        q = q.where(File.template_id == template_id)
+    if not current_user.is_admin:
+        q = q.where(File.owner_id == current_user.id)
+
+    q = q.order_by(FileNode.file_id, FileNode.node_id).limit(limit).offset(offset)
+    return (await db.execute(q)).all()
+
+
+@router.get("/search", response_model=list[FileSearchOut])
+async def search_files(
+    q: str = Query(..., min_length=1, max_length=200),
+    template_id: UUID | None = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Archivos visibles cuyo nombre, meta, descripciones u observaciones coinciden con `q`
+    (sintaxis de buscador: "frase exacta", -excluir, or). Usa files.search_vector y su índice GIN.
+    """
+    tsq = func.websearch_to_tsquery(
+        cast(literal(SEARCH_CONFIG), REGCONFIG), func.translate(func.lower(q), SEARCH_ACCENTS, SEARCH_PLAIN)
+    )
+    rank = func.ts_rank_cd(File.search_vector, tsq).label("rank")
+    stmt = select(File.id, File.code, File.name, File.template_id, File.updated_at, rank).where(
+        File.search_vector.op("@@")(tsq)
+    )
+    if template_id is not None:
+        stmt = stmt.where(File.template_id == template_id)
+    if not current_user.is_admin:
+        stmt = stmt.where(File.owner_id == current_user.id)
+
+    stmt = stmt.order_by(rank.desc(), File.updated_at.desc(), File.id.desc()).limit(limit).offset(offset)
+    return (await db.execute(stmt)).all()
+
+
 # Mantén UNA sola definición de get_file que delega en _resolve_file
 @router.get("/{file_id}", response_model=FileOut)
-def get_file(file_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    return _resolve_file(db, current_user, file_id)
+async def get_file(
+    file_id: str,
+    fields: str | None = Query(None, max_length=500),
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    # fields=meta,columns,scales: solo esas claves de data (ver core/file_view)
+    names = file_view.parse_fields(fields) if fields is not None else None
+    if names == []:
+        raise HTTPException(status_code=400, detail="fields no puede estar vacío")
+
+    # primero sin file_json: un 304 no lee el documento
+    f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+    variant = "fields=" + ",".join(sorted(names)) if names is not None else None
+    not_modified = _not_modified(f, if_none_match, if_modified_since, variant)
+    if not_modified is not None:
+        return not_modified
+    if names is not None:
+        return await _projected_document(db, f, names, variant)
+
+    # variante comprimida ya armada para esta revisión: tampoco se lee el documento
+    encoding = compression.negotiate(accept_encoding) if COMPRESS_ENABLED else None
+    if encoding:
+        cached = compression.cached_variant((f.id, f.revision, encoding))
+        if cached is not None:
+            return _encoded_document(cached, encoding, f)
+
+    # sobre + jsonb::text en una sola fila (mismo snapshot); el documento va tal cual
+    row = (
+        await db.execute(select(*_META_COLUMNS, File.storage, File.file_json.cast(Text)).where(File.id == f.id))
+    ).one()
+    meta = FileMetaOut.model_validate(row)
+    doc_text = row[-1]
+    if row.storage == file_store.DELTA:
+        doc_text = await _delta_document_text(db, doc_text)
+    with metrics.timer("json_response"):
+        resp = document_response(meta, "file_json", doc_text, headers=_file_headers(meta))
+
+    if encoding and len(resp.body) >= COMPRESS_MIN_BYTES:
+        data = await run_in_threadpool(_timed_compress, resp.body, encoding)
+        compression.store_variant((meta.id, meta.revision, encoding), data)
+        return _encoded_document(data, encoding, meta)
+    return resp
+
+
+async def _projected_document(db: AsyncSession, f: File, fields: list[str], variant: str) -> Response:
+    # respuesta chica: sin variantes comprimidas en cache (las comprime el middleware)
+    if f.storage == file_store.DELTA:
+        doc = await _document(db, f)
+        doc_text = await run_in_threadpool(_timed_dumps, file_view.project(doc, fields))
+    else:
+        doc_text = await db.run_sync(file_view.project_text, f.id, fields)
+    meta = FileMetaOut.model_validate(f)
+    with metrics.timer("json_response"):
+        return document_response(meta, "file_json", doc_text, headers=_file_headers(meta, variant))
+
+
+def _timed_compress(body: bytes, encoding: str) -> bytes:
+    with metrics.timer("compress"):
+        return compression.compress(body, encoding)
+
+
+def _encoded_document(data: bytes, encoding: str, f) -> Response:
+    # ya trae Content-Encoding: CompressionMiddleware la deja pasar
+    headers = {
+        **_file_headers(f),
+        "ETag": compression.encoded_etag(_file_etag(f), encoding),
+        "Content-Encoding": encoding,
+        "Vary": "Accept-Encoding",
+    }
+    return Response(content=data, media_type="application/json", headers=headers)
+
+
+def _timed_materialize(stored: dict, entry) -> str:
+    with metrics.timer("delta_materialize"):
+        return dumps_compact(file_store.materialize(stored, entry))
+
+
+def _delta_base(db: Session, stored: dict):
+    entry = file_store.load_base(db, stored.get("template"))
+    if entry is None:
+        raise HTTPException(status_code=500, detail="Falta la versión de la plantilla base del archivo")
+    return entry
+
+
+async def _delta_document_text(db: AsyncSession, stored_text: str) -> str:
+    # el delta es chico: se parsea acá; base del cache + armado y serialización en un hilo
+    stored = json.loads(stored_text)
+    entry = await db.run_sync(_delta_base, stored)
+    return await run_in_threadpool(_timed_materialize, stored, entry)
+
+
+def _load_bases(db: Session, rows) -> list:
+    # carga file_json si estaba diferido y la versión base de cada fila delta (None si es completa)
+    out = []
+    for r in rows:
+        stored = r.file_json
+        out.append(_delta_base(db, stored) if r.storage == file_store.DELTA else None)
+    return out
+
+
+def _materialize_all(rows, bases) -> list:
+    with metrics.timer("delta_materialize"):
+        return [r.file_json if b is None else file_store.materialize(r.file_json, b) for r, b in zip(rows, bases)]
+
+
+async def _documents(db: AsyncSession, rows) -> list:
+    """
+    Documentos completos de `rows` (File o filas con id, storage y file_json). AsyncSession.run_sync
+    corre en el hilo del event loop: ahí solo se lee; armar los deltas (CPU) va al pool de hilos.
+    """
+    bases = await db.run_sync(_load_bases, rows)
+    if not any(b is not None for b in bases):
+        return [r.file_json for r in rows]
+    return await run_in_threadpool(_materialize_all, rows, bases)
+
+
+async def _document(db: AsyncSession, f):
+    return (await _documents(db, [f]))[0]
 
 
 def _safe_filename(name: str) -> str:
@@ -166,371 +607,519 @@ def _safe_filename(name: str) -> str:
     return name[:120] or "export"
 
 
-def _unique_headers(columns: list[dict]) -> tuple[list[str], list[str], list[str]]:
-    """
-    Retorna (keys, headers, types) respetando el orden de columns.
-    """
-    used = set()
-    keys, headers, types = [], [], []
-    for c in columns or []:
-        k = str(c.get("key", "")).strip()
-        if not k:
-            continue
-        label = (c.get("label") or k).strip()
-        h = label or k
-        if h in used:
-            h = f"{h} ({k})"
-        used.add(h)
-        keys.append(k)
-        headers.append(h)
-        types.append(str(c.get("type", "")).lower())
-    return keys, headers, types
-
-
-def _apply_header_style(ws):
-    header_fill = PatternFill("solid", fgColor="F3F4F6")
-    header_font = Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-
-def _set_col_width(ws, col_idx: int, width: float):
-    ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-
-# (Reemplaza la función _build_file_xlsx en tu files.py por este bloque)
-def _build_file_xlsx(f: File) -> io.BytesIO:
-    file_json = f.file_json or {}
-    data = (file_json.get("data") or {}) if isinstance(file_json, dict) else {}
-    tpl = (file_json.get("template") or {}) if isinstance(file_json, dict) else {}
-
-    columns = data.get("columns") or []
-    nodes = data.get("nodes") or []
-    intro = data.get("intro") or []
-    meta = data.get("meta") or {}
-    questions = data.get("questions") or {}
-
-    wb = Workbook()
-
-    ws = wb.active
-    ws.title = "Checklist"
-
-    keys = [
-        "codigo",
-        "agrupacion_en",
-        "descripcion",
-        "observaciones",
-        "nivel_aplicacion",
-        "nivel_importancia",
-        "prioridad",
-    ]
-    headers = [
-        "codigo",
-        "agrupacion_en",
-        "descripcion",
-        "observaciones",
-        "nivel_aplicacion",
-        "nivel_importancia",
-        "prioridad",
-    ]
-    types = [""] * len(keys)
-
-    # Escribimos encabezados
-    ws.append(headers)
-    _apply_header_style(ws)
-
-    # Para cada nodo, construye un mapa plano que combine top-level + custom,
-    # y hace lookup tolerante (case-insensitive + normalizado)
-    if isinstance(nodes, list):
-        # Construimos mapas valor -> label para VI/VC a partir de data.scales
-        scales = (data.get("scales") or {}) if isinstance(data, dict) else {}
-        vi_scale = scales.get("VI") or []
-        vc_scale = scales.get("VC") or []
-
-        vi_label_by_value = {}
-        for s in vi_scale:
-            try:
-                v = float(s.get("value"))
-            except Exception:
-                continue
-            vi_label_by_value[v] = s.get("label") or ""
+def _timed_build(f, fp) -> None:
+    with metrics.timer("xlsx_build"):
+        build_file_xlsx(f, fp)
 
-        vc_label_by_value = {}
-        for s in vc_scale:
-            try:
-                v = float(s.get("value"))
-            except Exception:
-                continue
-            vc_label_by_value[v] = s.get("label") or ""
-
-        # helper para normalizar nombres de clave (quita acentos y caracteres no ascii, lower)
-        def norm_str(s):
-            if s is None:
-                return ""
-            s = str(s)
-            nk = unicodedata.normalize("NFD", s)
-            nk = nk.encode("ascii", "ignore").decode("ascii")
-            nk = re.sub(r"\s+", "", nk).lower()
-            nk = re.sub(r"[^a-z0-9_]", "", nk)  # conservamos guiones bajos por si acaso
-            return nk
-
-        # construir filas
-        # Creamos varios índices de búsqueda para cada nodo: exacto, lower, upper, normalizado
-        for r in nodes:
-            r = r or {}
-            custom = r.get("custom") or {}
-
-            # construir flat: top-level first, luego custom (custom sobrescribe)
-            flat = {}
-            if isinstance(r, dict):
-                for kk, vv in r.items():
-                    if kk == "custom":
-                        continue
-                    flat[str(kk)] = vv
-            if isinstance(custom, dict):
-                for kk, vv in custom.items():
-                    flat[str(kk)] = vv
-
-            # índices auxiliares
-            flat_exact = {str(k): v for k, v in flat.items()}
-            flat_lower = {str(k).lower(): v for k, v in flat.items()}
-            flat_upper = {str(k).upper(): v for k, v in flat.items()}
-            flat_norm = {norm_str(k): v for k, v in flat.items()}
-
-            row = []
-            for colk in keys:
-                val = None
-
-                # prepare candidates (formas a probar)
-                c0 = str(colk or "")
-                cand_list = [c0, c0.lower(), c0.upper(), norm_str(c0)]
-
-                # heurísticos adicionales: si la columna suena a 'agrup' probar variaciones
-                nk = norm_str(c0)
-                if nk and ("agrup" in nk or "agrupa" in nk or "agr" in nk):
-                    cand_list += [
-                        "agrupacion",
-                        "agrupacion_es",
-                        "agrupacion_en",
-                        "agrupación",
-                        "agrupación_es",
-                        "agrupación_en",
-                    ]
-
-                # probar candidatos en orden: exacto en flat, luego lower/upper/norm
-                for c in cand_list:
-                    if c in flat_exact:
-                        val = flat_exact[c]
-                        break
-                    if c in flat_lower:
-                        val = flat_lower[c]
-                        break
-                    if c in flat_upper:
-                        val = flat_upper[c]
-                        break
-                    if c in flat_norm:
-                        val = flat_norm[c]
-                        break
-
-                # fallback: si ninguna coincidencia, intentar usar propiedades estándar
-                if val is None:
-                    std_map = {
-                        "id": r.get("id"),
-                        "code": r.get("code") or r.get("codigo"),
-                        "title": r.get("title") or r.get("titulo") or r.get("name"),
-                        "desc": r.get("desc") or r.get("descripcion") or r.get("observaciones"),
-                        "type": r.get("type"),
-                        "vikey": r.get("viKey") or r.get("vi"),
-                        "vckey": r.get("vcKey") or r.get("vc"),
-                        "weight": r.get("weight"),
-                        "required": r.get("required"),
-                        "active": r.get("active"),
-                        "order": r.get("order"),
-                        "prioridad": r.get("prioridad"),
-                        "agrupacion_en": r.get("agrupacion_en") or r.get("title"),
-                        "observaciones": r.get("observaciones") or r.get("obs"),
-                        "nivel_aplicacion": r.get("nivel_aplicacion"),
-                        "nivel_importancia": r.get("nivel_importancia"),
-                    }
-
-                    if nk in ("codigo", "code", "cod"):
-                        val = std_map.get("code")
-                    elif "agrup" in nk:
-                        val = std_map.get("agrupacion_en")
-                    elif "desc" in nk or "descrip" in nk:
-                        val = std_map.get("desc")
-                    elif "observ" in nk:
-                        val = std_map.get("observaciones")
-                    elif "nivelaplicacion" in nk:
-                        val = std_map.get("nivel_aplicacion")
-                    elif "nivelimportancia" in nk:
-                        val = std_map.get("nivel_importancia")
-                    elif nk in ("prioridad",):
-                        val = std_map.get("prioridad")
-
-                # default a cadena vacía si todavía None
-                if val is None:
-                    val = ""
-
-                # Para nivel_aplicacion / nivel_importancia queremos label, no número
-                col_norm = norm_str(colk)
-                if col_norm in ("nivel_aplicacion", "nivelaplicacion"):
-                    try:
-                        num = float(val)
-                        if num in vc_label_by_value:
-                            val = vc_label_by_value[num]
-                    except Exception:
-                        pass
-                elif col_norm in ("nivel_importancia", "nivelimportancia"):
-                    try:
-                        num = float(val)
-                        if num in vi_label_by_value:
-                            val = vi_label_by_value[num]
-                    except Exception:
-                        pass
-
-                # serializar dict/list para que openpyxl no falle
-                if isinstance(val, (dict, list)):
-                    try:
-                        val = json.dumps(val, ensure_ascii=False)
-                    except Exception:
-                        val = str(val)
-
-                row.append(val)
-
-            # asegurar longitud
-            if len(row) != len(keys):
-                row = row[: len(keys)] + [""] * max(0, len(keys) - len(row))
-
-            ws.append(row)
-
-    ws.freeze_panes = "A2"
-    ws.auto_filter.ref = ws.dimensions
-
-    for idx, (k, h, t) in enumerate(zip(keys, headers, types), start=1):
-        width = 14
-        hlow = (h or "").lower()
-
-        if t in ("longtext",):
-            width = 90
-        elif t in ("text",):
-            width = 40
-        elif "descrip" in hlow:
-            width = 90
-        elif "observ" in hlow:
-            width = 60
-        elif "agrup" in hlow:
-            width = 30
-
-        _set_col_width(ws, idx, width)
-
-        if t in ("longtext",) or ("descrip" in hlow) or ("observ" in hlow) or ("justif" in hlow):
-            for cell in ws[get_column_letter(idx)][1:]:
-                cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-    # ----- resto de hojas (Meta, Preguntas, Intro, Columnas) se quedan igual -----
-    ws_meta = wb.create_sheet("Meta")
-    ws_meta.append(["Campo", "Valor"])
-    _apply_header_style(ws_meta)
-
-    meta_rows = {
-        "file_id": str(getattr(f, "id", "") or ""),
-        "file_code": getattr(f, "code", "") or "",
-        "file_name": getattr(f, "name", "") or "",
-        "created_at": str(getattr(f, "created_at", "") or ""),
-        "updated_at": str(getattr(f, "updated_at", "") or ""),
-        "template_id": str(tpl.get("id", "") or ""),
-        "template_code": str(tpl.get("code", "") or ""),
-        "template_version": str(tpl.get("version", "") or ""),
-    }
 
-    for k, v in meta_rows.items():
-        ws_meta.append([k, v])
+def _timed_dumps(value) -> str:
+    with metrics.timer("json_serialize"):
+        return dumps_compact(value)
+
 
-    ws_meta.append(["", ""])
+def _timed_export_key(f) -> str:
+    with metrics.timer("export_digest"):
+        return export_cache.export_key(f)
 
-    if isinstance(meta, dict):
-        for k, v in meta.items():
-            ws_meta.append([k, v])
 
-    ws_meta.column_dimensions["A"].width = 28
-    ws_meta.column_dimensions["B"].width = 100
-    for cell in ws_meta["B"][1:]:
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
+def _build_file_xlsx(f: File) -> SpooledTemporaryFile:
+    """
+    Construye el XLSX en un archivo temporal acotado: se mantiene en memoria hasta
+    XLSX_SPOOL_MAX_BYTES y a partir de ahí pasa a disco.
+    """
+    buf = SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_BYTES)
+    try:
+        _timed_build(f, buf)
+    except Exception:
+        buf.close()
+        raise
+    buf.seek(0)
+    return buf
 
-    ws_q = wb.create_sheet("Preguntas")
-    ws_q.append(["Key", "Text"])
-    _apply_header_style(ws_q)
 
-    if isinstance(questions, dict):
-        for k, v in questions.items():
-            ws_q.append([k, v])
+# entity-tags de un If-Match / If-None-Match: (W/ o "", "etiqueta"); las etiquetas pueden tener comas
+_ETAG_RE = re.compile(r'\s*(W/)?("[^"]*")\s*(?:,|$)')
 
-    ws_q.column_dimensions["A"].width = 30
-    ws_q.column_dimensions["B"].width = 110
-    for cell in ws_q["B"][1:]:
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
 
-    ws_i = wb.create_sheet("Intro")
-    ws_i.append(["Index", "Text"])
-    _apply_header_style(ws_i)
+def _etag_matches(if_none_match: str | None, etag: str) -> str | None:
+    """
+    Comparación débil (RFC 9110: W/"x" equivale a "x") y sin mirar la codificación: devuelve el
+    ETag del cliente que coincide (p. ej. "r5;gzip", el de lo que tiene en cache) o None.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for weak, tag in _ETAG_RE.findall(if_none_match):
+        if compression.strip_encoding(tag) == etag:
+            return tag
+    return None
 
-    if isinstance(intro, list):
-        for i, t in enumerate(intro, start=1):
-            ws_i.append([i, t])
 
-    ws_i.column_dimensions["A"].width = 10
-    ws_i.column_dimensions["B"].width = 110
-    for cell in ws_i["B"][1:]:
-        cell.alignment = Alignment(wrap_text=True, vertical="top")
+def _iter_chunks(buf, chunk_size: int = XLSX_CHUNK_SIZE):
+    try:
+        while True:
+            chunk = buf.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        buf.close()
 
-    ws_c = wb.create_sheet("Columnas")
-    ws_c.append(["key", "label", "type"])
-    _apply_header_style(ws_c)
 
-    for c in columns or []:
-        ws_c.append([c.get("key", ""), c.get("label", ""), c.get("type", "")])
+def _export_buffer(snap, key: str):
+    if export_cache.enabled():
+        buf = export_cache.open_entry(snap.id, key)
+        if buf is None:
+            buf = export_cache.build_entry(snap.id, key, lambda fp: _timed_build(snap, fp))
+        return buf
+    return _build_file_xlsx(snap)
 
-    ws_c.column_dimensions["A"].width = 14
-    ws_c.column_dimensions["B"].width = 70
-    ws_c.column_dimensions["C"].width = 18
 
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf
 @router.get("/{file_id}/export.xlsx")
-def export_file_xlsx(file_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    f = _resolve_file(db, current_user, file_id)
+async def export_file_xlsx(
+    file_id: str,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    f = await db.run_sync(_resolve_file, current_user, file_id)
 
     if not f.file_json:
         raise HTTPException(status_code=400, detail="File has no JSON to export")
 
-    buf = _build_file_xlsx(f)
+    # hash del documento y armado del workbook: CPU, en el pool de hilos
+    snap = export_pool.snapshot(f, await _document(db, f))
+    key = await run_in_threadpool(_timed_export_key, snap)
+    etag = f'"{key}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    buf = await run_in_threadpool(_export_buffer, snap, key)
+    size = buf.seek(0, io.SEEK_END)
+    buf.seek(0)
 
     fname = _safe_filename(f"{f.code}-{f.name}".strip("-")) + ".xlsx"
-    headers = {"Content-Disposition": f'attachment; filename="{fname}"'}
+    headers = {
+        **cache_headers,
+        "Content-Disposition": f'attachment; filename="{fname}"',
+        "Content-Length": str(size),
+    }
+
+    return StreamingResponse(_iter_chunks(buf), media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+def _resolve_files(db: Session, current_user, refs: list[str], load_json: bool = True) -> list[File]:
+    """
+    Como _resolve_file pero para varios ids/códigos en una sola consulta.
+    """
+    uids, codes = [], []
+    keys = []
+    for ref in refs:
+        try:
+            uid = UUID(ref)
+            uids.append(uid)
+            keys.append(str(uid))
+        except Exception:
+            codes.append(ref)
+            keys.append(ref)
+
+    q = db.query(File).filter(or_(File.id.in_(uids), File.code.in_(codes)))
+    if not load_json:
+        q = q.options(defer(File.file_json))
+    if not getattr(current_user, "is_admin", False):
+        q = q.filter(File.owner_id == current_user.id)
+
+    by_key = {}
+    for f in q.all():
+        by_key[str(f.id)] = f
+        by_key[f.code] = f
+
+    missing = [ref for ref, k in zip(refs, keys) if k not in by_key]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Files not found: {', '.join(missing[:20])}")
+
+    out, seen = [], set()
+    for k in keys:
+        f = by_key[k]
+        if f.id not in seen:
+            seen.add(f.id)
+            out.append(f)
+    return out
+
+
+class _ZipSink:
+    """
+    Destino no-seekable para ZipFile: acumula lo escrito hasta que se drena.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _zip_entry_name(f) -> str:
+    return _safe_filename(f"{f.code}-{f.name}".strip("-")) + ".xlsx"
+
+
+def _zip_copy_chunk(out, buf) -> bool:
+    # un bloque de la entrada del cache al ZIP (lectura de disco + CRC)
+    chunk = buf.read(XLSX_CHUNK_SIZE)
+    if chunk:
+        out.write(chunk)
+    return bool(chunk)
 
-    return StreamingResponse(
-        buf,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers,
-    )
 
-@router.patch("/{file_id}", response_model=FileOut)
-def update_file(
+async def _iter_bulk_zip(entries: list[tuple]):
+    """
+    Genera el ZIP a medida que cada workbook está listo: los hits del cache de exportaciones
+    se copian mientras el pool de procesos arma los que faltan (como máximo 2 por worker en
+    vuelo, para acotar memoria). Leer el cache y pasar cada workbook por el ZipFile (CRC) va al
+    threadpool; si el cliente corta o algo falla, se cancelan los armados que no empezaron.
+    """
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    loop = asyncio.get_running_loop()
+    pool = export_pool.get_pool()
+    misses = deque()
+    pending = {}
+
+    def _fill():
+        while misses and len(pending) < 2 * EXPORT_POOL_WORKERS:
+            snap, key = misses.popleft()
+            fut = loop.run_in_executor(pool, export_pool.build_xlsx_bytes, snap)
+            pending[fut] = ((snap, key), time.perf_counter())
+
+    try:
+        for snap, key in entries:
+            buf = None
+            if export_cache.enabled():
+                buf = await run_in_threadpool(export_cache.open_entry, snap.id, key)
+            if buf is None:
+                misses.append((snap, key))
+                _fill()
+                continue
+            with buf, zf.open(_zip_entry_name(snap), mode="w", force_zip64=True) as out:
+                while await run_in_threadpool(_zip_copy_chunk, out, buf):
+                    yield sink.drain()
+            yield sink.drain()
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                (snap, key), started = pending.pop(fut)
+                # incluye la espera en la cola del pool
+                metrics.operation_latency.observe(time.perf_counter() - started, "xlsx_build_pool")
+                data = fut.result()
+                _fill()
+
+                await run_in_threadpool(zf.writestr, _zip_entry_name(snap), data)
+                yield sink.drain()
+
+                if export_cache.enabled():
+                    await run_in_threadpool(_cache_store, snap.id, key, data)
+
+        zf.close()
+        yield sink.drain()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def _cache_store(file_id, key: str, data: bytes) -> None:
+    export_cache.build_entry(file_id, key, lambda fp: fp.write(data)).close()
+
+
+def _bulk_entries(snaps: list) -> list[tuple]:
+    # (snapshot, clave del cache de exportaciones); las entradas se abren al generar el ZIP
+    return [(snap, _timed_export_key(snap)) for snap in snaps]
+
+
+@router.post("/export.zip")
+async def export_files_zip(
+    payload: FileBulkExportIn,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    if len(payload.files) > EXPORT_BULK_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Máximo {EXPORT_BULK_MAX_FILES} archivos por exportación")
+
+    files = await db.run_sync(_resolve_files, current_user, payload.files)
+    if any(not f.file_json for f in files):
+        raise HTTPException(status_code=400, detail="File has no JSON to export")
+
+    docs = await _documents(db, files)
+    entries = await run_in_threadpool(_bulk_entries, [export_pool.snapshot(f, doc) for f, doc in zip(files, docs)])
+
+    headers = {"Content-Disposition": 'attachment; filename="export.zip"'}
+    return StreamingResponse(_iter_bulk_zip(entries), media_type="application/zip", headers=headers)
+
+
+def _timed_scores(datas: list) -> list[dict]:
+    with metrics.timer("scoring"):
+        return scoring.score_batch(datas)
+
+
+def _priority_counts(prioridades: list[str]) -> dict:
+    counts = {}
+    for p in prioridades:
+        if p:
+            counts[p] = counts.get(p, 0) + 1
+    return counts
+
+
+@router.get("/{file_id}/scores", response_model=FileScoresOut)
+async def get_file_scores(file_id: str, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    """
+    Severidad, prioridad y niveles de cada nodo calculados en el servidor
+    (mismo criterio que el editor; ver app.core.scoring).
+    """
+    f = await db.run_sync(_resolve_file, current_user, file_id)
+    data = scoring.unwrap_data(await _document(db, f))
+    res = (await run_in_threadpool(_timed_scores, [data]))[0]
+
+    nodes = data.get("nodes") if isinstance(data.get("nodes"), list) else []
+    out = []
+    for i, n in enumerate(nodes):
+        n = n if isinstance(n, dict) else {}
+        code = n.get("codigo", n.get("code"))
+        out.append(
+            {
+                "id": n.get("id"),
+                "codigo": None if code is None else str(code),
+                "severity": res["severity"][i],
+                "prioridad": res["prioridad"][i],
+                "nivel_aplicacion": res["nivel_aplicacion"][i],
+                "nivel_importancia": res["nivel_importancia"][i],
+            }
+        )
+    return {
+        "file_id": f.id,
+        "code": f.code,
+        "revision": f.revision,
+        "priorities": _priority_counts(res["prioridad"]),
+        "nodes": out,
+    }
+
+
+async def _load_documents(db: AsyncSession, ids: list) -> dict:
+    # documentos completos por id, sin hidratar File (la memoria se libera por tanda)
+    rows = (await db.execute(select(File.id, File.storage, File.file_json).where(File.id.in_(ids)))).all()
+    return dict(zip([r.id for r in rows], await _documents(db, rows)))
+
+
+@router.post("/scores", response_model=list[FileScoreSummaryOut])
+async def score_files(
+    payload: FileScoresBatchIn,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Resumen de puntajes de muchos archivos para reportes. Los documentos se leen y
+    puntúan por tandas de SCORES_CHUNK_FILES; cada tanda es una sola pasada del motor.
+    """
+    if len(payload.files) > SCORES_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {SCORES_BATCH_MAX} archivos por solicitud")
+
+    files = await db.run_sync(_resolve_files, current_user, payload.files, load_json=False)
+
+    out = []
+    for start in range(0, len(files), SCORES_CHUNK_FILES):
+        chunk = files[start : start + SCORES_CHUNK_FILES]
+        docs = await _load_documents(db, [f.id for f in chunk])
+        datas = [scoring.unwrap_data(docs[f.id]) for f in chunk]
+        results = await run_in_threadpool(_timed_scores, datas)
+        for f, res in zip(chunk, results):
+            out.append(
+                {
+                    "file_id": f.id,
+                    "code": f.code,
+                    "revision": f.revision,
+                    "nodes": len(res["severity"]),
+                    "priorities": _priority_counts(res["prioridad"]),
+                }
+            )
+    return out
+
+
+def _jpath(expr, segs: list[str]):
+    return expr.op("#>", return_type=JSONB)(literal(segs, ARRAY(Text)))
+
+
+def _patch_in_db(db: Session, f: File, ops: list[tuple]) -> bool:
+    """
+    Aplica operaciones simples (ver app.core.json_patch) con jsonb_set / #- en un solo
+    UPDATE, leyendo de la base solo los valores que se tocan para validar y calcular
+    el delta de size_bytes. Devuelve False si alguna precondición no se cumple
+    (el llamador cae entonces al camino general).
+    """
+    doc = File.file_json
+    cols = []
+    for op in ops:
+        path = op[1]
+        parent = path if op[0] == "append" else path[:-1]
+        cols += [
+            func.jsonb_typeof(_jpath(doc, parent)),
+            func.jsonb_typeof(_jpath(doc, path)),
+            _jpath(doc, path),
+            _jpath(doc, parent).in_([literal({}, JSONB), literal([], JSONB)]),
+            (_jpath(doc, parent).op("-", return_type=JSONB)(path[-1]) == literal({}, JSONB)) if path else literal(False),
+        ]
+    row = db.query(*cols).filter(File.id == f.id).with_for_update().one()
+
+    expr = doc
+    delta = 0
+    for i, op in enumerate(ops):
+        kind, path = op[0], op[1]
+        parent_type, target_type, old, parent_empty, empty_after_remove = row[i * 5 : i * 5 + 5]
+        exists = target_type is not None
+        key_size = json_size(path[-1]) + 1 if path else 0  # "clave":
+
+        if kind == "set":
+            if parent_type != "object":
+                return False
+            if exists:
+                delta += json_size(op[2]) - json_size(old)
+            else:
+                delta += key_size + json_size(op[2]) + (0 if parent_empty else 1)
+            expr = func.jsonb_set(expr, literal(path, ARRAY(Text)), literal(op[2], JSONB), True)
+        elif kind == "replace":
+            if not exists or parent_type not in ("object", "array"):
+                return False
+            delta += json_size(op[2]) - json_size(old)
+            expr = func.jsonb_set(expr, literal(path, ARRAY(Text)), literal(op[2], JSONB), False)
+        elif kind == "remove":
+            if parent_type != "object":
+                return False
+            if not exists:
+                if op[2]:
+                    return False
+                continue
+            delta -= key_size + json_size(old) + (0 if empty_after_remove else 1)
+            expr = expr.op("#-", return_type=JSONB)(literal(path, ARRAY(Text)))
+        elif kind == "append":
+            if not path or target_type != "array":
+                return False
+            delta += json_size(op[2]) + (0 if parent_empty else 1)
+            appended = _jpath(expr, path).op("||", return_type=JSONB)(func.jsonb_build_array(literal(op[2], JSONB)))
+            expr = func.jsonb_set(expr, literal(path, ARRAY(Text)), appended, False)
+        elif kind == "ensure_object":
+            if target_type != "object":
+                return False
+
+    if expr is not doc:
+        # UPDATE masivo: el ORM no maneja version_id_col acá, se sube a mano
+        db.query(File).filter(File.id == f.id).update(
+            {File.file_json: expr, File.size_bytes: File.size_bytes + delta, File.revision: File.revision + 1},
+            synchronize_session=False,
+        )
+    return True
+
+
+def _timed_patch(doc, media_type: str, patch) -> tuple[Any, int]:
+    # copia profunda + parche + tamaño: CPU sobre el documento completo
+    with metrics.timer("json_patch"):
+        try:
+            if media_type == JSON_PATCH_MEDIA_TYPE:
+                new_file_json = apply_json_patch(doc, patch)
+            else:
+                new_file_json = apply_merge_patch(doc, patch)
+        except PatchError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return new_file_json, json_size(new_file_json)
+
+
+async def _apply_patch(db: AsyncSession, f: File, media_type: str, patch) -> None:
+    if patch == [] or patch == {}:
+        # [] (JSON Patch) o {} (merge patch sobre un objeto): válidos y sin cambios
+        return
+    # jsonb_set directo solo sobre documentos completos que se siguen guardando completos
+    if f.storage == file_store.FULL and FILE_STORAGE_MODE == file_store.FULL:
+        ops = to_simple_ops(media_type, patch)
+        if ops is not None and await db.run_sync(_patch_in_db, f, ops):
+            return
+
+    # camino general: el parche se aplica en memoria, en el pool de hilos (no en el event loop)
+    current = await _document(db, f)
+    new_file_json, size_bytes = await run_in_threadpool(_timed_patch, current, media_type, patch)
+    base = await db.run_sync(file_store.base_for_write, new_file_json)
+    f.storage, f.file_json = await run_in_threadpool(file_store.encode, new_file_json, base, size_bytes)
+    f.size_bytes = size_bytes
+    db.add(f)
+
+
+_CONFLICT_DETAIL = "El archivo fue modificado por otra sesión. Recarga antes de guardar."
+
+
+def _lock_for_save(db: Session, f: File, if_match: str | None) -> None:
+    # bloquea la fila y relee la revisión: desde acá nadie más guarda este archivo
+    db.refresh(f, ["revision"], with_for_update=True)
+    if if_match is None or if_match.strip() == "*":
+        return
+    # If-Match usa comparación fuerte contra el documento completo (en cualquier codificación):
+    # un ETag débil o el de una proyección/subárbol nunca coincide
+    if _file_etag(f) not in [compression.strip_encoding(t) for weak, t in _ETAG_RE.findall(if_match) if not weak]:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=_CONFLICT_DETAIL)
+
+
+def _commit_save(db: Session) -> None:
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=_CONFLICT_DETAIL)
+
+
+async def _save_patch(db: AsyncSession, f: File, media_type: str, patch, if_match: str | None):
+    await db.run_sync(_lock_for_save, f, if_match)
+    await _apply_patch(db, f, media_type, patch)
+    await db.run_sync(_commit_save)
+    return (await db.execute(select(*_SAVE_COLUMNS).where(File.id == f.id))).one()
+
+
+@router.patch("/{file_id}", response_model=FileOut | FileSaveOut)
+async def update_file(
     file_id: str,
-    payload: dict,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    payload: Any = Body(...),
+    if_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """
-    Actualiza file.file_json (reemplaza) y recalcula size_bytes.
-    Espera payload con 'file_json' (objeto) OR 'data' (obj para poner en file_json = {'data': ...}).
+    Actualiza file.file_json según el Content-Type:
+    - application/json: reemplaza el documento. Espera 'file_json' (objeto) OR 'data'
+      (obj para poner en file_json = {'data': ...}) y responde el FileOut completo.
+    - application/json-patch+json (RFC 6902) / application/merge-patch+json (RFC 7396):
+      aplica el parche (en la base cuando se puede) y responde solo FileSaveOut.
+    Con If-Match (ETag de GET /files/{id}) responde 412 si el archivo cambió entretanto.
     """
-    f = _resolve_file(db, current_user, file_id)
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if media_type in (JSON_PATCH_MEDIA_TYPE, MERGE_PATCH_MEDIA_TYPE):
+        f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+        row = await _save_patch(db, f, media_type, payload, if_match)
+        await run_in_threadpool(export_cache.invalidate, f.id)
+        background_tasks.add_task(file_summary.refresh_file, f.id)
+        response.headers["ETag"] = _file_etag(row)
+        return FileSaveOut.model_validate(row)
+
+    f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+    await db.run_sync(_lock_for_save, f, if_match)
 
     # Determinar nuevo file_json
     new_file_json = None
@@ -543,14 +1132,153 @@ def update_file(
 
     # Guardamos
     try:
-        raw = json.dumps(new_file_json, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
-        size_bytes = len(raw)
+        doc_text = await run_in_threadpool(_timed_dumps, new_file_json)
     except Exception:
         raise HTTPException(status_code=400, detail="No se pudo serializar JSON.")
 
-    f.file_json = new_file_json
+    size_bytes = len(doc_text.encode("utf-8"))
+    base = await db.run_sync(file_store.base_for_write, new_file_json)
+    f.storage, f.file_json = await run_in_threadpool(file_store.encode, new_file_json, base, size_bytes)
     f.size_bytes = size_bytes
     db.add(f)
-    db.commit()
-    db.refresh(f)
-    return f
\ No newline at end of file
+    await db.run_sync(_commit_save)
+    await db.refresh(f, _META_FIELDS)
+    await run_in_threadpool(export_cache.invalidate, f.id)
+    background_tasks.add_task(file_summary.refresh_file, f.id)
+    meta = FileMetaOut.model_validate(f)
+    with metrics.timer("json_response"):
+        return document_response(meta, "file_json", doc_text, headers=_file_headers(meta))
+
+
+# ----- nodos individuales -----
+
+
+def _node_by_pointer(db: Session, f: File, node_id: str) -> tuple[list[str], dict] | None:
+    # solo el nodo, por su puntero en file_nodes, si el puntero sigue apuntando a ese id
+    ptr = db.scalar(select(FileNode.pointer).where(FileNode.file_id == f.id, FileNode.node_id == node_id))
+    if ptr is None:
+        return None
+    segs = parse_pointer(ptr)
+    node = db.scalar(select(_jpath(File.file_json, segs)).where(File.id == f.id))
+    if isinstance(node, dict) and file_nodes.node_key(node.get("id")) == node_id:
+        return segs, node
+    return None
+
+
+def _scan_node(doc, node_id: str) -> tuple[list[str], dict] | None:
+    nodes = scoring.unwrap_data(doc).get("nodes")
+    for i, n in enumerate(nodes if isinstance(nodes, list) else []):
+        if isinstance(n, dict) and file_nodes.node_key(n.get("id")) == node_id:
+            return file_nodes.nodes_pointer(doc) + [str(i)], n
+    return None
+
+
+async def _locate_node(db: AsyncSession, f: File, node_id: str) -> tuple[list[str], dict] | None:
+    """
+    (segmentos, nodo) del nodo con ese id. Con file_nodes se lee solo el nodo; si no,
+    se recorre el documento en el pool de hilos.
+    """
+    if f.storage == file_store.FULL:
+        found = await db.run_sync(_node_by_pointer, f, node_id)
+        if found is not None:
+            return found
+    return await run_in_threadpool(_scan_node, await _document(db, f), node_id)
+
+
+def _timed_subtree(doc, parent: str | None, depth: int) -> str:
+    with metrics.timer("subtree"):
+        return dumps_compact(file_view.subtree(doc, parent, depth))
+
+
+@router.get("/{file_id}/nodes", response_model=FileSubtreeOut)
+async def get_subtree(
+    file_id: str,
+    parent_id: str | None = Query(None, alias="parentId", max_length=200),
+    depth: int = Query(1, ge=1, le=50),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Nodos bajo el nodo de código `parentId` (sin parentId: las raíces) hasta `depth` niveles,
+    en orden del documento. Con file_nodes al día se extraen en la base por su puntero.
+    """
+    f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+    parent = scoring.normalize_code(parent_id.strip()) if parent_id and parent_id.strip() else None
+    variant = f"nodes={parent or ''};depth={depth}"
+    not_modified = _not_modified(f, if_none_match, None, variant)
+    if not_modified is not None:
+        return not_modified
+
+    nodes_text = await db.run_sync(file_view.subtree_text, f.id, parent, depth)
+    if nodes_text is None:
+        # delta o proyección vencida: se recorre el documento
+        doc = await _document(db, f)
+        nodes_text = await run_in_threadpool(_timed_subtree, doc, parent, depth)
+
+    envelope = FileSubtreeMetaOut(id=f.id, revision=f.revision, parent_id=parent, depth=depth)
+    return document_response(envelope, "nodes", nodes_text, headers=_file_headers(f, variant))
+
+
+@router.get("/{file_id}/nodes/{node_id}")
+async def get_node(
+    file_id: str, node_id: str, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)
+):
+    """
+    Un nodo de file_json por su id, sin transferir el documento.
+    """
+    f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+    found = await _locate_node(db, f, node_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return found[1]
+
+
+async def _save_node(db: AsyncSession, f: File, node_id: str, fields: dict, if_match: str | None):
+    await db.run_sync(_lock_for_save, f, if_match)
+    found = await _locate_node(db, f, node_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    segs, node = found
+
+    # merge patch a nivel de nodo: null elimina el campo
+    ops = []
+    for k, v in fields.items():
+        path = format_pointer(segs + [k])
+        if v is None:
+            if k in node:
+                ops.append({"op": "remove", "path": path})
+        else:
+            ops.append({"op": "add", "path": path, "value": v})
+    if ops:
+        await _apply_patch(db, f, JSON_PATCH_MEDIA_TYPE, ops)
+    await db.run_sync(_commit_save)
+    return (await db.execute(select(*_SAVE_COLUMNS).where(File.id == f.id))).one(), bool(ops)
+
+
+@router.patch("/{file_id}/nodes/{node_id}", response_model=FileSaveOut)
+async def update_node(
+    file_id: str,
+    node_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    fields: dict[str, Any] = Body(...),
+    if_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Cambia campos de un nodo (p. ej. {"observaciones": "..."}; null los elimina). Ubica el nodo
+    por file_nodes y escribe con jsonb_set: no lee ni reescribe el documento completo.
+    Con If-Match responde 412 si el archivo cambió entretanto.
+    """
+    if "id" in fields:
+        raise HTTPException(status_code=400, detail="No se puede cambiar el id del nodo.")
+
+    f = await db.run_sync(_resolve_file, current_user, file_id, load_json=False)
+    row, changed = await _save_node(db, f, node_id, fields, if_match)
+    if changed:
+        await run_in_threadpool(export_cache.invalidate, f.id)
+        background_tasks.add_task(file_summary.refresh_file, f.id)
+    response.headers["ETag"] = _file_etag(row)
+    return FileSaveOut.model_validate(row)
@@ -1,21 +1,74 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from uuid import UUID
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.db.session import SessionLocal, get_async_db
 from app.api.deps import get_current_user
+from app.core import file_summary
+from app.core.config import ANALYTICS_INLINE_REFRESH
 from app.models.template import Template
-from app.schemas.template import TemplateOut
+from app.schemas.template import TemplateAnalyticsOut, TemplateOut
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
 
+_LIST_COLUMNS = [getattr(Template, k) for k in TemplateOut.model_fields]
+
+
 @router.get("", response_model=list[TemplateOut])
-def list_templates(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    q = db.query(Template).filter(Template.is_active == True)
+async def list_templates(db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    # solo las columnas de TemplateOut: template_json no viaja en el listado
+    q = select(*_LIST_COLUMNS).where(Template.is_active == True)
 
     if not current_user.is_admin:
-        q = q.filter(
+        q = q.where(
             (Template.visibility.in_(["public", "shared"])) |
             (Template.owner_id == current_user.id)
         )
 
-    return q.order_by(Template.updated_at.desc()).all()
+    return (await db.execute(q.order_by(Template.updated_at.desc()))).all()
+
+
+def _refresh_summaries(template_id, owner_id) -> int:
+    # corre en el threadpool: lee documentos y puntúa (CPU), con su propia sesión
+    db = SessionLocal()
+    try:
+        return file_summary.refresh(
+            db, template_id=template_id, owner_id=owner_id, limit=ANALYTICS_INLINE_REFRESH
+        )
+    finally:
+        db.close()
+
+
+@router.get("/{template_id}/analytics", response_model=TemplateAnalyticsOut)
+async def template_analytics(
+    template_id: UUID,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Agregados de los archivos de la plantilla (todos para admin; los propios si no):
+    distribución de niveles y prioridades por código de nodo y tasa de respuesta.
+    Sale de template_node_stats / file_summaries, que se mantienen al guardar.
+    stale_files: archivos que todavía no entran (se recalculan en segundo plano).
+    """
+    row = (await db.execute(select(Template.owner_id, Template.visibility).where(Template.id == template_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Template not found")
+    if not current_user.is_admin and row.visibility not in ("public", "shared") and row.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Template not allowed")
+
+    owner_id = None if current_user.is_admin else current_user.id
+    # resúmenes faltantes o vencidos (archivos previos a la tabla, tareas perdidas): unos pocos
+    # acá; si quedan más, una pasada en segundo plano por plantilla
+    await run_in_threadpool(_refresh_summaries, template_id, owner_id)
+    stale = (await db.execute(file_summary.stale_query(template_id, owner_id))).scalar_one()
+    if stale:
+        background_tasks.add_task(file_summary.backfill, template_id)
+
+    totals = (await db.execute(file_summary.totals_query(template_id, owner_id))).one()
+    groups = (await db.execute(file_summary.stats_query(template_id, owner_id))).all()
+    return file_summary.fold(template_id, totals, groups, stale)
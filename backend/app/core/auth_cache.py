@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import AUTH_CACHE_MAX_USERS, AUTH_CACHE_TTL_SECONDS, AUTH_TOKEN_CACHE_MAX
+from app.models.user import User
+
+# Cache en proceso para get_current_user:
+# - tokens: JWT -> (user_id, exp) para no verificar la firma en cada request
+# - usuarios: user_id -> snapshot de solo lectura (no es un objeto de sesión), con TTL corto
+# Cualquier UPDATE/DELETE de un User hecho por el ORM invalida su entrada al commitear
+# (login, login con Google, cambios de admin). Con varios workers, el TTL acota lo desactualizado.
+
+_PRINCIPAL_FIELDS = (
+    "id",
+    "email",
+    "full_name",
+    "avatar_url",
+    "google_sub",
+    "provider",
+    "is_admin",
+    "is_active",
+    "created_at",
+    "updated_at",
+    "last_login_at",
+)
+
+
+class _TTLCache:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires <= now:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl: float) -> None:
+        if ttl <= 0 or self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_tokens = _TTLCache(AUTH_TOKEN_CACHE_MAX)
+_users = _TTLCache(AUTH_CACHE_MAX_USERS)
+
+
+def cached_token(token: str):
+    return _tokens.get(token)
+
+
+def store_token(token: str, user_id: UUID, exp) -> None:
+    # hasta que vence el propio token (sin exp: TTL de usuarios)
+    ttl = (exp - time.time()) if isinstance(exp, (int, float)) else AUTH_CACHE_TTL_SECONDS
+    _tokens.put(token, user_id, ttl)
+
+
+def principal(user: User) -> SimpleNamespace:
+    return SimpleNamespace(**{k: getattr(user, k) for k in _PRINCIPAL_FIELDS})
+
+
+def cached_user(user_id: UUID):
+    return _users.get(user_id)
+
+
+def store_user(p: SimpleNamespace) -> None:
+    _users.put(p.id, p, AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id) -> None:
+    _users.pop(user_id)
+
+
+def clear() -> None:
+    _tokens.clear()
+    _users.clear()
+
+
+# ----- invalidación automática -----
+# after_update corre dentro del flush (antes del commit): se anotan los ids y se
+# invalidan después del commit, así un request concurrente no vuelve a cachear la fila vieja.
+
+
+def _track(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("auth_cache_dirty", set()).add(target.id)
+    else:
+        invalidate_user(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    for user_id in session.info.pop("auth_cache_dirty", ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction) -> None:
+    session.info.pop("auth_cache_dirty", None)
+
+
+event.listen(User, "after_update", _track)
+event.listen(User, "after_delete", _track)
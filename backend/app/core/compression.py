@@ -0,0 +1,194 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import COMPRESS_CACHE_MAX_BYTES, COMPRESS_MIN_BYTES
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete no se ofrece "br"
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # opcional: sin el paquete no se ofrece "zstd"
+    zstandard = None
+
+# Compresión de respuestas negociada por Accept-Encoding (zstd > br > gzip a igual q).
+# CompressionMiddleware comprime las respuestas JSON/texto de un solo mensaje desde
+# COMPRESS_MIN_BYTES; las que ya traen Content-Encoding (p. ej. GET /files/{id}, que
+# reusa variantes cacheadas por revisión) y los streamings (XLSX/ZIP) pasan tal cual.
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+_CODECS = {}
+if zstandard is not None:
+    _CODECS["zstd"] = lambda data: zstandard.compress(data, 3)
+if brotli is not None:
+    _CODECS["br"] = lambda data: brotli.compress(data, quality=5)
+_CODECS["gzip"] = _gzip
+
+_COMPRESSIBLE = ("application/json", "text/")
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """
+    Codificación a usar según Accept-Encoding, o None para responder sin comprimir.
+    """
+    if not accept_encoding:
+        return None
+    prefs = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.lower() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        prefs[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for enc in _CODECS:
+        q = prefs.get(enc, prefs.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    # CPU: llamar fuera del event loop
+    return _CODECS[encoding](data)
+
+
+# ----- variantes comprimidas de documentos, por (file_id, revision, encoding) -----
+# La revisión cambia con cada guardado, así que una entrada nunca queda vieja: solo
+# deja de pedirse y sale por LRU.
+
+_variants: "OrderedDict[tuple, bytes]" = OrderedDict()
+_variants_bytes = 0
+_lock = threading.Lock()
+
+
+def cached_variant(key: tuple) -> bytes | None:
+    with _lock:
+        data = _variants.get(key)
+        if data is not None:
+            _variants.move_to_end(key)
+        return data
+
+
+def store_variant(key: tuple, data: bytes) -> None:
+    global _variants_bytes
+    if len(data) > COMPRESS_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        old = _variants.pop(key, None)
+        if old is not None:
+            _variants_bytes -= len(old)
+        _variants[key] = data
+        _variants_bytes += len(data)
+        while _variants and _variants_bytes > COMPRESS_CACHE_MAX_BYTES:
+            _, evicted = _variants.popitem(last=False)
+            _variants_bytes -= len(evicted)
+
+
+def clear() -> None:
+    global _variants_bytes
+    with _lock:
+        _variants.clear()
+        _variants_bytes = 0
+
+
+# sufijos de ETag por codificación (todas las que puede haber servido algún proceso)
+_ETAG_ENCODINGS = ("zstd", "br", "gzip")
+
+
+def encoded_etag(etag: str | None, encoding: str) -> str | None:
+    """
+    ETag de la variante comprimida: otra codificación es otra representación, así que un ETag
+    fuerte la lleva ("r5" -> "r5;gzip"). Los débiles quedan igual.
+    """
+    if not etag or etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]};{encoding}"'
+
+
+def strip_encoding(etag: str) -> str:
+    # ETag de la representación sin comprimir ("r5;gzip" -> "r5")
+    for encoding in _ETAG_ENCODINGS:
+        suffix = f';{encoding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    if "content-encoding" in headers:
+        return False
+    return headers.get("content-type", "").startswith(_COMPRESSIBLE)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI puro: retiene el inicio de la respuesta hasta ver el primer chunk
+    para decidir si comprime. Solo comprime cuerpos de un mensaje (no streamings).
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def _send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            first, start = start, None
+            headers = MutableHeaders(raw=list(first.get("headers", [])))
+            first["headers"] = headers.raw
+            body = message.get("body", b"")
+            if not _compressible(headers):
+                await send(first)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body") or len(body) < self.minimum_size:
+                await send(first)
+                await send(message)
+                return
+
+            data = await run_in_threadpool(compress, body, encoding)
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(data))
+            await send(first)
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, _send)
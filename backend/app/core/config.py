@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,8 +12,87 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 
 DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Pool de conexiones (por engine: hay uno sync y uno async)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# pre-ping: "always" (SELECT 1 en cada checkout), "idle" (solo si la conexión estuvo
+# ociosa más de DB_POOL_PING_IDLE_SECONDS) o "never"
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PING_IDLE_SECONDS", "30"))
+# timeouts por sesión de Postgres en milisegundos (0 = sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "5000"))
+
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me")
 JWT_ALG = "HS256"
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "10080"))
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+
+# Exportación XLSX: hasta este tamaño el archivo se arma en memoria, luego se vuelca a disco
+XLSX_SPOOL_MAX_BYTES = int(os.getenv("XLSX_SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+XLSX_CHUNK_SIZE = int(os.getenv("XLSX_CHUNK_SIZE", str(64 * 1024)))
+
+# Cache de exportaciones en disco (EXPORT_CACHE_MAX_BYTES=0 lo deshabilita)
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "catty-export-cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+EXPORT_CACHE_MAX_AGE_SECONDS = int(os.getenv("EXPORT_CACHE_MAX_AGE_SECONDS", str(24 * 3600)))
+
+# Procesos para exportaciones en lote (por defecto, uno por core)
+EXPORT_POOL_WORKERS = int(os.getenv("EXPORT_POOL_WORKERS", str(os.cpu_count() or 2)))
+EXPORT_BULK_MAX_FILES = int(os.getenv("EXPORT_BULK_MAX_FILES", "200"))
+
+# Alta masiva de archivos desde una plantilla (POST /files/bulk)
+FILE_BULK_CREATE_MAX = int(os.getenv("FILE_BULK_CREATE_MAX", "500"))
+
+# Puntajes en lote (POST /files/scores): máximo de archivos por llamada y por pasada del motor
+SCORES_BATCH_MAX = int(os.getenv("SCORES_BATCH_MAX", "5000"))
+SCORES_CHUNK_FILES = int(os.getenv("SCORES_CHUNK_FILES", "200"))
+# analíticas: resúmenes vencidos que se recalculan en el request; el resto, en segundo plano
+ANALYTICS_INLINE_REFRESH = int(os.getenv("ANALYTICS_INLINE_REFRESH", "20"))
+
+# Almacenamiento de documentos: "full" guarda el file_json completo; "delta" guarda solo
+# los cambios contra la versión de la plantilla. Si el delta supera FILE_DELTA_MAX_RATIO
+# del documento completo, esa fila se guarda completa.
+FILE_STORAGE_MODE = os.getenv("FILE_STORAGE_MODE", "full")
+FILE_DELTA_MAX_RATIO = float(os.getenv("FILE_DELTA_MAX_RATIO", "0.5"))
+
+# Cola de exportaciones asíncronas (tabla export_jobs + pool de procesos local)
+EXPORT_JOBS_ENABLED = os.getenv("EXPORT_JOBS_ENABLED", "1") == "1"
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", os.path.join(tempfile.gettempdir(), "catty-export-jobs"))
+EXPORT_JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL_SECONDS", str(6 * 3600)))
+# un job "running" sin latido (heartbeat_at) en EXPORT_JOB_STALE_SECONDS se da por perdido y se reencola
+EXPORT_JOB_HEARTBEAT_SECONDS = float(os.getenv("EXPORT_JOB_HEARTBEAT_SECONDS", "30"))
+EXPORT_JOB_STALE_SECONDS = int(os.getenv("EXPORT_JOB_STALE_SECONDS", str(5 * 60)))
+EXPORT_JOB_POLL_SECONDS = float(os.getenv("EXPORT_JOB_POLL_SECONDS", "2"))
+
+# Cache en proceso de usuarios autenticados y tokens ya verificados (0 deshabilita cada uno)
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_MAX_USERS = int(os.getenv("AUTH_CACHE_MAX_USERS", "10000"))
+AUTH_TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "10000"))
+
+# Instrumentación de SQL: se loguean las sentencias que superan DB_SLOW_QUERY_MS (0 = ninguna)
+# y los requests con más de DB_QUERY_WARN_COUNT consultas (posible N+1).
+# DB_QUERY_DEBUG=1 agrega X-DB-Queries / X-DB-Time-Ms a cada respuesta.
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_QUERY_WARN_COUNT = int(os.getenv("DB_QUERY_WARN_COUNT", "20"))
+DB_QUERY_DEBUG = os.getenv("DB_QUERY_DEBUG", "0") == "1"
+
+# Cache en proceso de plantillas ya desenvueltas y serializadas (por id + versión)
+TEMPLATE_CACHE_MAX_BYTES = int(os.getenv("TEMPLATE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "128"))
+
+# Compresión de respuestas (zstd/br/gzip según Accept-Encoding) desde COMPRESS_MIN_BYTES;
+# las variantes comprimidas de GET /files/{id} se cachean por revisión
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_CACHE_MAX_BYTES = int(os.getenv("COMPRESS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Contraseñas: costo de bcrypt (los hashes con otro costo se rehacen en el próximo login) y
+# pool de procesos propio para register/login. Con PASSWORD_POOL_MAX_PENDING operaciones
+# en curso o en cola, las nuevas reciben 503 en vez de esperar.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", str(8 * PASSWORD_POOL_WORKERS)))
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from app.core.config import (
+    EXPORT_CACHE_DIR,
+    EXPORT_CACHE_MAX_AGE_SECONDS,
+    EXPORT_CACHE_MAX_BYTES,
+)
+from app.core.xlsx_export import EXPORTER_VERSION
+
+# Cache en disco de exportaciones, direccionado por contenido.
+# Cada entrada se llama "<file_id>-<digest>.xlsx": el digest cubre todo lo que
+# termina dentro del XLSX, y el prefijo permite invalidar por archivo.
+
+_SUFFIX = ".xlsx"
+_evict_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return EXPORT_CACHE_MAX_BYTES > 0
+
+
+def export_key(f) -> str:
+    """
+    Digest sha256 del documento + versión de plantilla + versión del exportador
+    + los campos del archivo que se escriben en la hoja Meta.
+    """
+    file_json = f.file_json or {}
+    tpl = (file_json.get("template") or {}) if isinstance(file_json, dict) else {}
+    tpl_version = tpl.get("version", "") if isinstance(tpl, dict) else ""
+
+    h = hashlib.sha256()
+    for part in (
+        EXPORTER_VERSION,
+        tpl_version,
+        getattr(f, "id", ""),
+        getattr(f, "code", ""),
+        getattr(f, "name", ""),
+        getattr(f, "created_at", ""),
+        getattr(f, "updated_at", ""),
+    ):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    h.update(
+        json.dumps(file_json, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    )
+    return h.hexdigest()
+
+
+def _entry_path(file_id, key: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, f"{file_id}-{key}{_SUFFIX}")
+
+
+def open_entry(file_id, key: str):
+    """
+    Devuelve la entrada abierta en modo lectura o None si no existe / expiró.
+    Un hit renueva el mtime, que es lo que usa la política LRU.
+    """
+    path = _entry_path(file_id, key)
+    try:
+        st = os.stat(path)
+        if time.time() - st.st_mtime > EXPORT_CACHE_MAX_AGE_SECONDS:
+            os.remove(path)
+            return None
+        fp = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return fp
+
+
+def build_entry(file_id, key: str, build):
+    """
+    Ejecuta build(fp) sobre un temporal del directorio de cache, lo publica de
+    forma atómica y devuelve la entrada abierta para lectura.
+    """
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as tmp:
+            build(tmp)
+        path = _entry_path(file_id, key)
+        os.replace(tmp_path, path)
+        # abrimos antes de desalojar: aunque la entrada se borre, el fd sigue siendo válido
+        fp = open(path, "rb")
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    evict()
+    return fp
+
+
+def invalidate(file_id) -> None:
+    prefix = f"{file_id}-"
+    try:
+        names = os.listdir(EXPORT_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and name.endswith(_SUFFIX):
+            try:
+                os.remove(os.path.join(EXPORT_CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+def evict() -> None:
+    """
+    Borra entradas más viejas que EXPORT_CACHE_MAX_AGE_SECONDS y luego las menos
+    usadas recientemente hasta quedar bajo EXPORT_CACHE_MAX_BYTES.
+    """
+    if not _evict_lock.acquire(blocking=False):
+        return  # ya hay otro hilo desalojando
+    try:
+        now = time.time()
+        entries = []
+        with os.scandir(EXPORT_CACHE_DIR) as it:
+            for e in it:
+                if not e.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+
+        total = 0
+        keep = []
+        for mtime, size, path in entries:
+            if now - mtime > EXPORT_CACHE_MAX_AGE_SECONDS:
+                _remove(path)
+            else:
+                keep.append((mtime, size, path))
+                total += size
+
+        keep.sort()  # más antiguo (menos usado) primero
+        for mtime, size, path in keep:
+            if total <= EXPORT_CACHE_MAX_BYTES:
+                break
+            _remove(path)
+            total -= size
+    except OSError:
+        pass
+    finally:
+        _evict_lock.release()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
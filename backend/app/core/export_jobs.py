@@ -0,0 +1,254 @@
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, update
+
+from app.core.config import (
+    EXPORT_JOBS_DIR,
+    EXPORT_JOB_HEARTBEAT_SECONDS,
+    EXPORT_JOB_POLL_SECONDS,
+    EXPORT_JOB_STALE_SECONDS,
+    EXPORT_JOB_TTL_SECONDS,
+    EXPORT_POOL_WORKERS,
+)
+from app.core import export_pool, file_store
+from app.core.xlsx_export import build_file_xlsx
+from app.db.session import SessionLocal
+from app.models.export_job import ExportJob
+from app.models.file import File
+
+# Cola de exportaciones sin broker externo: la tabla export_jobs es la cola.
+# Cada proceso web corre un dispatcher que reclama jobs con FOR UPDATE SKIP LOCKED
+# (así varios workers de uvicorn no toman el mismo) y los ejecuta en el pool de
+# procesos de export_pool. El proceso hijo actualiza el progreso directamente en la tabla y,
+# desde un hilo aparte, heartbeat_at durante todo el job: un job "running" sin latido reciente
+# quedó de un proceso caído.
+
+log = logging.getLogger(__name__)
+
+_stop = threading.Event()
+_wake = threading.Event()
+_thread: threading.Thread | None = None
+_slots = threading.BoundedSemaphore(EXPORT_POOL_WORKERS)
+
+# cada cuánto (en fracción del total) el worker escribe el progreso en la base
+_PROGRESS_STEP = 0.05
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(db, f: File, owner_id) -> ExportJob:
+    job = ExportJob(file_id=f.id, owner_id=owner_id, status="queued", progress=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wake.set()
+    return job
+
+
+def _beat(job_id) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == "running")
+            .values(heartbeat_at=_now())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _start_heartbeat(job_id) -> threading.Event:
+    """
+    Renueva heartbeat_at cada EXPORT_JOB_HEARTBEAT_SECONDS (con su propia sesión) hasta que se
+    setee el Event devuelto: también late mientras se carga el documento o se guarda el libro.
+    """
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(EXPORT_JOB_HEARTBEAT_SECONDS):
+            try:
+                _beat(job_id)
+            except Exception:
+                log.warning("export job %s: heartbeat failed", job_id, exc_info=True)
+
+    threading.Thread(target=_loop, name="export-job-heartbeat", daemon=True).start()
+    return stop
+
+
+def run_job(job_id) -> None:
+    """
+    Corre en un proceso del pool: arma el XLSX del job y deja el artefacto en EXPORT_JOBS_DIR.
+    """
+    db = SessionLocal()
+    heartbeat = _start_heartbeat(job_id)
+    try:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if not job or job.status != "running":
+            return
+        f = db.query(File).filter(File.id == job.file_id).first()
+        if not f or not f.file_json:
+            job.status = "failed"
+            job.error = "File not found" if not f else "File has no JSON to export"
+            job.finished_at = _now()
+            db.commit()
+            return
+
+        last = [0.0]
+
+        def _progress(frac: float):
+            if frac - last[0] < _PROGRESS_STEP:
+                return
+            last[0] = frac
+            job.progress = min(99, int(frac * 100))
+            db.commit()
+
+        os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_JOBS_DIR, f"{job.id}.xlsx")
+        fd, tmp_path = tempfile.mkstemp(dir=EXPORT_JOBS_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w+b") as tmp:
+                build_file_xlsx(export_pool.snapshot(f, file_store.document(db, f)), tmp, progress=_progress)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        job.status = "done"
+        job.progress = 100
+        job.artifact_path = path
+        job.size_bytes = os.path.getsize(path)
+        job.finished_at = _now()
+        job.expires_at = job.finished_at + timedelta(seconds=EXPORT_JOB_TTL_SECONDS)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _mark_failed(db, job_id, str(e) or e.__class__.__name__)
+    finally:
+        heartbeat.set()
+        db.close()
+
+
+def _mark_failed(db, job_id, error: str) -> None:
+    job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+    if job and job.status == "running":
+        job.status = "failed"
+        job.error = error[:500]
+        job.finished_at = _now()
+        db.commit()
+
+
+def _claim_next(db):
+    job = (
+        db.query(ExportJob)
+        .filter(ExportJob.status == "queued")
+        .order_by(ExportJob.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not job:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.started_at = job.heartbeat_at = _now()
+    db.commit()
+    return job.id
+
+
+def _housekeeping(db) -> None:
+    now = _now()
+
+    # artefactos vencidos
+    expired = (
+        db.query(ExportJob)
+        .filter(ExportJob.status == "done", ExportJob.expires_at < now)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in expired:
+        if job.artifact_path:
+            try:
+                os.remove(job.artifact_path)
+            except OSError:
+                pass
+        job.status = "expired"
+        job.artifact_path = None
+    db.commit()
+
+    # jobs que quedaron "running" porque se cayó el proceso que los tenía: sin latido reciente
+    # (uno largo pero vivo renueva heartbeat_at desde su hilo de latido)
+    stale = now - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    (
+        db.query(ExportJob)
+        .filter(ExportJob.status == "running", func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < stale)
+        .update({ExportJob.status: "queued", ExportJob.progress: 0}, synchronize_session=False)
+    )
+    db.commit()
+
+
+def _on_done(job_id, fut) -> None:
+    _slots.release()
+    _wake.set()
+    exc = fut.exception()
+    if exc is None:
+        return
+    # el proceso hijo murió (p. ej. BrokenProcessPool) sin poder marcar el job
+    log.warning("export job %s crashed: %r", job_id, exc)
+    db = SessionLocal()
+    try:
+        _mark_failed(db, job_id, str(exc) or exc.__class__.__name__)
+    finally:
+        db.close()
+
+
+def _loop() -> None:
+    last_housekeeping = 0.0
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            if _now().timestamp() - last_housekeeping > 60:
+                _housekeeping(db)
+                last_housekeeping = _now().timestamp()
+
+            while not _stop.is_set() and _slots.acquire(blocking=False):
+                job_id = _claim_next(db)
+                if job_id is None:
+                    _slots.release()
+                    break
+                fut = export_pool.get_pool().submit(run_job, job_id)
+                fut.add_done_callback(lambda fut, job_id=job_id: _on_done(job_id, fut))
+        except Exception:
+            log.exception("export job dispatcher error")
+            db.rollback()
+        finally:
+            db.close()
+
+        _wake.wait(EXPORT_JOB_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_dispatcher() -> None:
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="export-jobs", daemon=True)
+    _thread.start()
+
+
+def stop_dispatcher() -> None:
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
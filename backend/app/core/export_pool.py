@@ -0,0 +1,55 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from app.core.config import EXPORT_POOL_WORKERS
+from app.core.xlsx_export import build_file_xlsx
+
+# Pool de procesos para armar workbooks fuera de los hilos de la API.
+# Se usa "spawn" para no heredar conexiones ni hilos del proceso web.
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXPORT_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def snapshot(f, file_json=None) -> SimpleNamespace:
+    """
+    Copia serializable (pickle) de lo que build_file_xlsx necesita de un File.
+    `file_json` es el documento completo si la fila está guardada como delta.
+    """
+    return SimpleNamespace(
+        id=f.id,
+        code=f.code,
+        name=f.name,
+        created_at=f.created_at,
+        updated_at=f.updated_at,
+        file_json=f.file_json if file_json is None else file_json,
+    )
+
+
+def build_xlsx_bytes(snap) -> bytes:
+    # corre dentro del proceso worker
+    buf = io.BytesIO()
+    build_file_xlsx(snap, buf)
+    return buf.getvalue()
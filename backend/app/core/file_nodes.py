@@ -0,0 +1,122 @@
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from app.core import scoring
+from app.core.json_patch import format_pointer
+from app.core.json_response import dumps_compact
+
+# Tabla file_nodes: una fila por nodo con los campos estables (código, padre, tipo) y lo que
+# calcula app.core.scoring (niveles y prioridad), más el JSON Pointer del nodo en file_json.
+#
+# Se sincroniza junto con file_summaries (ver core/file_summary, mismo lock y misma revisión):
+# las filas nuevas se comparan con las guardadas en la base y solo se escriben las que cambiaron
+# (ON CONFLICT ... WHERE IS DISTINCT FROM); las de nodos que ya no están se borran.
+# Es eventual: lo hace la tarea en segundo plano que corre después de que el guardado commitea,
+# así que un rato puede reflejar una revisión anterior. Quien la lee no confía a ciegas: la
+# búsqueda de un nodo verifica el id en el puntero y el subárbol exige la revisión actual
+# (si no, recorren el documento).
+# Los nodos sin "id" (o con id repetido) no tienen fila: no se pueden direccionar.
+
+_COLUMNS = "node_id text, pointer text, parent_id text, codigo text, tipo text, " \
+    "nivel_aplicacion double precision, nivel_importancia double precision, prioridad text"
+
+_FIELDS = ("pointer", "parent_id", "codigo", "tipo", "nivel_aplicacion", "nivel_importancia", "prioridad")
+
+_UPSERT = f"""
+gone AS (
+    DELETE FROM file_nodes t
+    WHERE t.file_id = ANY(:ids)
+      AND NOT EXISTS (SELECT 1 FROM new WHERE new.file_id = t.file_id AND new.node_id = t.node_id)
+)
+INSERT INTO file_nodes AS t (file_id, node_id, {", ".join(_FIELDS)})
+SELECT file_id, node_id, {", ".join(_FIELDS)} FROM new
+ON CONFLICT (file_id, node_id) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in _FIELDS)}
+WHERE ({", ".join(f"t.{c}" for c in _FIELDS)}) IS DISTINCT FROM ({", ".join(f"excluded.{c}" for c in _FIELDS)})
+"""
+
+_IDS = bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True)))
+
+# :nodes = [{file_id, node_id, pointer, ...}] de varios archivos
+_SYNC_SQL = text(
+    f"""
+WITH new AS (
+    SELECT * FROM jsonb_to_recordset(CAST(:nodes AS jsonb)) AS r(file_id uuid, {_COLUMNS})
+),
+{_UPSERT}
+"""
+).bindparams(_IDS)
+
+# los mismos :nodes para todos los archivos de :ids (altas desde una plantilla)
+_SYNC_SHARED_SQL = text(
+    f"""
+WITH new AS (
+    SELECT f.id AS file_id, r.*
+    FROM unnest(:ids) AS f(id) CROSS JOIN jsonb_to_recordset(CAST(:nodes AS jsonb)) AS r({_COLUMNS})
+),
+{_UPSERT}
+"""
+).bindparams(_IDS)
+
+_DELETE_SQL = text("DELETE FROM file_nodes WHERE file_id = ANY(:ids)").bindparams(_IDS)
+
+
+def node_key(value) -> str | None:
+    # "id" del nodo como texto; los objetos/arrays no sirven de id
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return value if isinstance(value, str) else dumps_compact(value)
+
+
+def nodes_pointer(doc) -> list[str]:
+    # segmentos hasta el array de nodos: ["data", "nodes"] en un documento normal
+    return scoring.data_path(doc) + ["nodes"]
+
+
+def build(doc, res: dict) -> list[dict]:
+    """
+    Filas de file_nodes (sin file_id) para `doc`, con el resultado de scoring.score_batch.
+    """
+    nodes = scoring.unwrap_data(doc).get("nodes")
+    if not isinstance(nodes, list):
+        return []
+    prefix = format_pointer(nodes_pointer(doc))
+    out, seen = [], set()
+    for i, n in enumerate(nodes):
+        key = node_key(n.get("id")) if isinstance(n, dict) else None
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        out.append(
+            {
+                "node_id": key,
+                "pointer": f"{prefix}/{i}",
+                "parent_id": res["parent"][i],
+                "codigo": res["codigo"][i],
+                "tipo": res["tipo"][i],
+                "nivel_aplicacion": res["nivel_aplicacion"][i],
+                "nivel_importancia": res["nivel_importancia"][i],
+                "prioridad": res["prioridad"][i] or None,
+            }
+        )
+    return out
+
+
+def sync(db: Session, by_file: dict) -> None:
+    """
+    Deja file_nodes de cada archivo igual a by_file[file_id] (filas de build). No hace commit.
+    """
+    if not by_file:
+        return
+    nodes = [{"file_id": str(fid), **row} for fid, rows in by_file.items() for row in rows]
+    db.execute(_SYNC_SQL, {"ids": list(by_file), "nodes": dumps_compact(nodes)})
+
+
+def sync_shared(db: Session, file_ids: list, rows: list[dict]) -> None:
+    if file_ids:
+        db.execute(_SYNC_SHARED_SQL, {"ids": list(file_ids), "nodes": dumps_compact(rows)})
+
+
+def delete(db: Session, file_ids: list) -> None:
+    if file_ids:
+        db.execute(_DELETE_SQL, {"ids": list(file_ids)})
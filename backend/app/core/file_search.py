@@ -0,0 +1,70 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.json_response import dumps_compact
+
+# Búsqueda de texto (GET /files/search) sobre files.search_vector: configuración "spanish" y sin
+# tildes. lower() + translate() no necesitan la extensión unaccent; la búsqueda pliega el texto
+# buscado de la misma forma.
+#
+# La columna la escribe la app, no Postgres: sale del documento materializado (un archivo en
+# storage "delta" casi no tiene texto propio en file_json) y se calcula en la misma tarea en
+# segundo plano que file_summaries (ver core/file_summary), así que tokenizar el documento no
+# cuesta en cada guardado. Un archivo recién guardado aparece en la búsqueda cuando termina esa tarea.
+SEARCH_CONFIG = "spanish"
+SEARCH_ACCENTS = "áàâäãéèêëíìîïóòôöõúùûüñç"
+SEARCH_PLAIN = "aaaaaeeeeiiiiooooouuuunc"
+
+# textos bajo estas claves, en cualquier nivel del documento: meta (B), descripción (C) y
+# observaciones (D) de los nodos; el nombre del archivo pesa A
+_FIELDS = ("meta", "descripcion", "observaciones")
+_WEIGHTS = ("B", "C", "D")
+
+
+def _part(expr: str, weight: str) -> str:
+    return (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+        f"translate(lower({expr}), '{SEARCH_ACCENTS}', '{SEARCH_PLAIN}')), '{weight}')"
+    )
+
+
+_VECTOR = " || ".join([_part("f.name", "A")] + [_part(f"coalesce(r.{k}, '')", w) for k, w in zip(_FIELDS, _WEIGHTS)])
+
+# :rows = [{id, revision, meta, descripcion, observaciones}]; solo si el archivo sigue en esa revisión
+_SYNC_SQL = text(
+    f"""
+UPDATE files f SET search_vector = {_VECTOR}
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+    id uuid, revision bigint, {", ".join(f"{k} text" for k in _FIELDS)}
+)
+WHERE f.id = r.id AND f.revision = r.revision
+"""
+)
+
+
+def texts(doc) -> dict:
+    """
+    Textos (strings) de `doc` bajo cada clave de _FIELDS, en orden del documento.
+    """
+    out = {k: [] for k in _FIELDS}
+    stack = [(doc, ())]
+    while stack:
+        value, inside = stack.pop()
+        if isinstance(value, str):
+            for k in inside:
+                out[k].append(value)
+        elif isinstance(value, dict):
+            for k, v in reversed(value.items()):
+                stack.append((v, inside + (k,) if k in out and k not in inside else inside))
+        elif isinstance(value, list):
+            stack.extend((v, inside) for v in reversed(value))
+    return {k: "\n".join(v) for k, v in out.items()}
+
+
+def sync(db: Session, rows: list[dict]) -> None:
+    """
+    Escribe search_vector de cada archivo (no hace commit). Cada fila lleva id, revision y lo de texts().
+    """
+    if not rows:
+        return
+    db.execute(_SYNC_SQL, {"rows": dumps_compact([{**r, "id": str(r["id"])} for r in rows])})
@@ -0,0 +1,221 @@
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core import template_cache
+from app.core.config import FILE_DELTA_MAX_RATIO, FILE_STORAGE_MODE
+from app.core.json_patch import json_equal, json_size
+from app.models.template import Template
+from app.models.template_version import TemplateVersion
+
+# Almacenamiento de file_json como delta contra la versión de la plantilla.
+#
+# Una fila con storage="delta" guarda {"template": <cabecera>, "delta": <nodo>}; el documento
+# es apply_delta({"template": <cabecera>, "data": <plantilla desenvuelta>}, <nodo>). La base
+# es siempre template_versions, la copia inmutable de cada versión (cacheada en template_cache
+# con snapshot=True), nunca templates.template_json: puede cambiar sin subir la versión.
+#
+# Nodos del delta:
+#   {"=": valor}                          reemplaza el valor completo
+#   {"o": {clave: nodo}, "d": [claves]}   objeto: claves cambiadas/nuevas y eliminadas
+#   {"a": {"índice": nodo}, "n": largo}   array: posiciones cambiadas y largo final (si cambió)
+#
+# La API no se entera: lectura, exportación y parches trabajan sobre el documento completo.
+
+FULL = "full"
+DELTA = "delta"
+
+_EMPTY = {"o": {}}
+
+
+def _same_scalar(a, b) -> bool:
+    # atajo de json_equal para hojas (strings, números, null): true/false no son 1/0
+    return a == b and (a.__class__ is bool) == (b.__class__ is bool)
+
+
+_CONTAINERS = (dict, list)
+
+
+def diff(base, target):
+    """
+    Nodo que lleva `base` a `target`, o None si son iguales según json_equal
+    (1 -> true es un cambio). Recorre todo: == en Python confunde true con 1.
+    """
+    if base is target:
+        return None
+    if isinstance(base, dict) and isinstance(target, dict):
+        changed = {}
+        for k, v in target.items():
+            if k not in base:
+                changed[k] = {"=": v}
+                continue
+            b = base[k]
+            if b is v or (not isinstance(v, _CONTAINERS) and _same_scalar(b, v)):
+                continue
+            d = diff(b, v)
+            if d is not None:
+                changed[k] = d
+        removed = [k for k in base if k not in target]
+        if not changed and not removed:
+            return None
+        node = {"o": changed}
+        if removed:
+            node["d"] = removed
+        return node
+    if isinstance(base, list) and isinstance(target, list):
+        changed = {}
+        for i in range(min(len(base), len(target))):
+            b, v = base[i], target[i]
+            if b is v or (not isinstance(v, _CONTAINERS) and _same_scalar(b, v)):
+                continue
+            d = diff(b, v)
+            if d is not None:
+                changed[str(i)] = d
+        for i in range(len(base), len(target)):
+            changed[str(i)] = {"=": target[i]}
+        if not changed and len(target) == len(base):
+            return None
+        node = {"a": changed}
+        if len(target) != len(base):
+            node["n"] = len(target)
+        return node
+    return None if json_equal(base, target) else {"=": target}
+
+
+def apply_delta(base, node):
+    """
+    Documento = base + delta. Copia solo lo que el delta toca: el resto se comparte
+    con `base` (que viene del cache), así que el resultado no se debe mutar en el lugar.
+    """
+    if "=" in node:
+        return node["="]
+    if "o" in node:
+        out = dict(base) if isinstance(base, dict) else {}
+        for k in node.get("d", ()):
+            out.pop(k, None)
+        for k, d in node["o"].items():
+            out[k] = apply_delta(out.get(k), d)
+        return out
+    if "a" in node:
+        out = list(base) if isinstance(base, list) else []
+        n = node.get("n", len(out))
+        del out[n:]
+        out.extend([None] * (n - len(out)))
+        for i, d in node["a"].items():
+            i = int(i)
+            out[i] = apply_delta(out[i], d)
+        return out
+    raise ValueError("Nodo de delta inválido")
+
+
+def _template_key(header):
+    # (template_id, version) de la cabecera "template" del documento, o None
+    if not isinstance(header, dict):
+        return None
+    try:
+        version = header["version"]
+        if isinstance(version, bool) or not isinstance(version, int):
+            return None
+        return UUID(str(header["id"])), version
+    except (KeyError, ValueError):
+        return None
+
+
+def load_base(db: Session, header) -> template_cache.TemplateEntry | None:
+    """
+    Plantilla desenvuelta de la versión que indica `header`, según template_versions (o el cache
+    de lo ya leído de ahí). None si no hay copia de esa versión.
+    """
+    key = _template_key(header)
+    if key is None:
+        return None
+    entry = template_cache.get(*key, snapshot=True)
+    if entry is not None:
+        return entry
+    tj = snapshot_json(db, *key)
+    if tj is None:
+        return None
+    return template_cache.put(*key, tj, snapshot=True)
+
+
+def snapshot_json(db: Session, template_id, version):
+    return db.scalar(
+        select(TemplateVersion.template_json).where(
+            TemplateVersion.template_id == template_id, TemplateVersion.version == version
+        )
+    )
+
+
+def ensure_snapshot(db: Session, template_id, version) -> bool:
+    """
+    Copia la versión actual de la plantilla a template_versions si no está (INSERT ... SELECT en
+    la base, el JSON no pasa por acá). Se consulta siempre: la copia va en la transacción de `db`
+    y puede no llegar a confirmarse. False si no hay copia y la plantilla ya no está en esa versión.
+    """
+    exists = (
+        select(TemplateVersion.version)
+        .where(TemplateVersion.template_id == template_id, TemplateVersion.version == version)
+        .exists()
+    )
+    src = select(Template.id, Template.version, Template.template_json).where(
+        Template.id == template_id, Template.version == version, ~exists
+    )
+    db.execute(
+        pg_insert(TemplateVersion)
+        .from_select(["template_id", "version", "template_json"], src)
+        .on_conflict_do_nothing()
+    )
+    found = db.scalar(
+        select(TemplateVersion.version).where(
+            TemplateVersion.template_id == template_id, TemplateVersion.version == version
+        )
+    )
+    return found is not None
+
+
+def materialize(stored: dict, entry: template_cache.TemplateEntry) -> dict:
+    header = stored["template"]
+    return apply_delta({"template": header, "data": entry.data}, stored.get("delta") or _EMPTY)
+
+
+def document(db: Session, f):
+    """
+    file_json completo de `f` (File o fila con id, storage y file_json), sea cual sea su storage.
+    """
+    if f.storage != DELTA:
+        return f.file_json
+    entry = load_base(db, f.file_json.get("template"))
+    if entry is None:
+        raise LookupError(f"Falta la versión base de la plantilla del archivo {f.id}")
+    return materialize(f.file_json, entry)
+
+
+def base_for_write(db: Session, doc) -> template_cache.TemplateEntry | None:
+    """
+    Base contra la que guardar `doc` como delta, o None si va completo
+    (modo "full", documento sin cabecera de plantilla o versión ya no disponible).
+    """
+    if FILE_STORAGE_MODE != DELTA or not isinstance(doc, dict):
+        return None
+    key = _template_key(doc.get("template"))
+    if key is None:
+        return None
+    if not ensure_snapshot(db, *key):
+        return None
+    return load_base(db, doc["template"])
+
+
+def encode(doc, entry: template_cache.TemplateEntry | None, size_bytes: int) -> tuple[str, object]:
+    """
+    (storage, file_json a guardar) para `doc`. CPU: recorre el documento completo.
+    """
+    if entry is None:
+        return FULL, doc
+    header = doc["template"]
+    node = diff({"template": header, "data": entry.data}, doc) or _EMPTY
+    stored = {"template": header, "delta": node}
+    if json_size(stored) > FILE_DELTA_MAX_RATIO * size_bytes:
+        return FULL, doc
+    return DELTA, stored
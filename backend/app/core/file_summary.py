@@ -0,0 +1,455 @@
+import logging
+import re
+import threading
+
+from sqlalchemy import BigInteger, bindparam, cast, func, or_, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from app.core import file_nodes, file_search, file_store, metrics, scoring
+from app.core.config import SCORES_CHUNK_FILES
+from app.core.json_response import dumps_compact
+from app.db.session import SessionLocal
+from app.models.file import File
+from app.models.file_summary import FileSummary
+from app.models.template_node_stat import TemplateNodeStat
+
+# Analíticas por plantilla sin leer file_json.
+#
+# file_summaries: por archivo, lo que calcula app.core.scoring para cada nodo (niveles,
+# prioridad, si el ÍTEM está respondido) y la revisión del archivo con la que se calculó.
+# template_node_stats: cuántos nodos hay por (plantilla, dueño, código, valores). Se mantiene
+# en la misma sentencia que escribe file_summaries: jsonb_array_elements sobre el resumen
+# viejo resta y sobre el nuevo suma. Consultar analíticas es sumar unas pocas filas.
+#
+# file_nodes (ver core/file_nodes) se sincroniza en la misma transacción que el resumen (no la
+# del guardado), con los mismos puntajes, y files.search_vector (ver core/file_search) con el
+# mismo documento materializado.
+#
+# Se escribe después de cada alta/guardado (tarea en segundo plano). Antes de consultar se
+# recalculan unos pocos resúmenes faltantes o vencidos y el resto queda a una pasada en segundo
+# plano (una por plantilla), así que un guardado por fuera de la API o una tarea perdida se
+# corrigen solos sin que la consulta cargue con todos los documentos.
+
+log = logging.getLogger(__name__)
+
+_backfilling: set = set()
+_backfill_lock = threading.Lock()
+
+# Un advisory lock por archivo serializa a quienes escriben su resumen: la sentencia siguiente
+# ve el resumen que efectivamente está guardado y resta exactamente eso.
+_LOCK_SQL = text(
+    """
+    SELECT pg_advisory_xact_lock(k)
+    FROM (SELECT DISTINCT hashtextextended(id::text, 0) AS k FROM unnest(:ids) AS id ORDER BY 1) AS l
+    """
+).bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+# filas ordenadas por clave: dos transacciones toman los locks de template_node_stats en el mismo orden
+_STATS_UPSERT = """
+INSERT INTO template_node_stats AS t
+    (template_id, owner_id, codigo, item, respondido, nivel_aplicacion, nivel_importancia, prioridad, n)
+SELECT template_id, owner_id,
+       coalesce(v->>'codigo', ''), (v->>'item')::boolean, (v->>'respondido')::boolean,
+       coalesce(v->>'nivel_aplicacion', ''), coalesce(v->>'nivel_importancia', ''), coalesce(v->>'prioridad', ''),
+       sum(sign)
+FROM contrib
+GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
+HAVING sum(sign) <> 0
+ORDER BY 1, 2, 3, 4, 5, 6, 7, 8
+ON CONFLICT (template_id, owner_id, codigo, item, respondido, nivel_aplicacion, nivel_importancia, prioridad)
+DO UPDATE SET n = t.n + excluded.n
+"""
+
+# :rows = [{file_id, template_id, owner_id, revision, node_count, item_count, answered_count, nodes}]
+# (sin nodes = :shared). Solo se escriben las filas con revisión más nueva que la guardada.
+_SAVE_SQL = text(
+    f"""
+WITH new AS (
+    SELECT r.file_id, r.template_id, r.owner_id, r.revision, r.node_count, r.item_count, r.answered_count,
+           coalesce(r.nodes, CAST(:shared AS jsonb)) AS nodes
+    FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+        file_id uuid, template_id uuid, owner_id uuid, revision bigint,
+        node_count integer, item_count integer, answered_count integer, nodes jsonb
+    )
+),
+old AS (
+    SELECT s.template_id, s.owner_id, s.nodes
+    FROM file_summaries s JOIN new ON new.file_id = s.file_id
+    WHERE s.revision < new.revision
+),
+changed AS (
+    SELECT new.* FROM new LEFT JOIN file_summaries s ON s.file_id = new.file_id
+    WHERE s.file_id IS NULL OR s.revision < new.revision
+),
+saved AS (
+    INSERT INTO file_summaries AS s
+        (file_id, template_id, owner_id, revision, node_count, item_count, answered_count, nodes, updated_at)
+    SELECT file_id, template_id, owner_id, revision, node_count, item_count, answered_count, nodes, now()
+    FROM changed
+    ON CONFLICT (file_id) DO UPDATE SET
+        template_id = excluded.template_id, owner_id = excluded.owner_id, revision = excluded.revision,
+        node_count = excluded.node_count, item_count = excluded.item_count,
+        answered_count = excluded.answered_count, nodes = excluded.nodes, updated_at = now()
+),
+contrib AS (
+    SELECT o.template_id, o.owner_id, e.value AS v, -1 AS sign FROM old o, jsonb_array_elements(o.nodes) e
+    UNION ALL
+    SELECT c.template_id, c.owner_id, e.value, 1 FROM changed c, jsonb_array_elements(c.nodes) e
+)
+{_STATS_UPSERT}
+"""
+)
+
+_REMOVE_SQL = text(
+    f"""
+WITH gone AS (
+    DELETE FROM file_summaries WHERE file_id = ANY(:ids) RETURNING template_id, owner_id, nodes
+),
+contrib AS (
+    SELECT g.template_id, g.owner_id, e.value AS v, -1 AS sign FROM gone g, jsonb_array_elements(g.nodes) e
+)
+{_STATS_UPSERT}
+"""
+).bindparams(bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+
+def build(res: dict) -> dict:
+    """
+    Columnas de file_summaries a partir del resultado de scoring.score_batch para un documento.
+    """
+    nodes = [
+        {
+            "codigo": codigo,
+            "item": item,
+            "respondido": respondido,
+            "nivel_aplicacion": None if na is None else str(na),
+            "nivel_importancia": None if ni is None else str(ni),
+            "prioridad": prioridad or None,
+        }
+        for codigo, item, respondido, na, ni, prioridad in zip(
+            res["codigo"],
+            res["item"],
+            res["respondido"],
+            res["nivel_aplicacion"],
+            res["nivel_importancia"],
+            res["prioridad"],
+        )
+    ]
+    return {
+        "node_count": len(nodes),
+        "item_count": sum(res["item"]),
+        "answered_count": sum(res["respondido"]),
+        "nodes": nodes,
+    }
+
+
+def save(db: Session, rows: list[dict], shared: tuple | None = None) -> None:
+    """
+    Escribe resúmenes, ajusta template_node_stats y sincroniza file_nodes en la transacción
+    de `db` (no hace commit). Cada fila lleva file_id, template_id, owner_id, revision, lo de
+    build() y "file_nodes" (filas de file_nodes.build); sin esas dos listas se usa
+    `shared` = (nodes, file_nodes), común a todas las filas.
+    """
+    if not rows:
+        return
+    db.execute(_LOCK_SQL, {"ids": [r["file_id"] for r in rows]})
+    # con el lock tomado: lo ya guardado con una revisión igual o más nueva no se toca
+    current = dict(
+        db.execute(
+            select(FileSummary.file_id, FileSummary.revision).where(FileSummary.file_id.in_([r["file_id"] for r in rows]))
+        ).all()
+    )
+    rows = [r for r in rows if current.get(r["file_id"], 0) < r["revision"]]
+    if not rows:
+        return
+
+    payload, projection = [], {}
+    for r in rows:
+        r = dict(r)
+        projection[r["file_id"]] = r.pop("file_nodes", None)
+        payload.append(
+            {**r, "file_id": str(r["file_id"]), "template_id": str(r["template_id"]), "owner_id": str(r["owner_id"])}
+        )
+    db.execute(
+        _SAVE_SQL,
+        {"rows": dumps_compact(payload), "shared": None if shared is None else dumps_compact(shared[0])},
+    )
+    if shared is None:
+        file_nodes.sync(db, projection)
+    else:
+        file_nodes.sync_shared(db, list(projection), shared[1])
+
+
+def remove(db: Session, file_ids: list) -> None:
+    """
+    Borra los resúmenes y resta su aporte (no hace commit). Llamar antes de borrar los archivos.
+    """
+    if file_ids:
+        db.execute(_LOCK_SQL, {"ids": list(file_ids)})
+        db.execute(_REMOVE_SQL, {"ids": list(file_ids)})
+        file_nodes.delete(db, file_ids)
+
+
+def _stale(q, template_id=None, owner_id=None):
+    # archivos sin resumen o con resumen de otra revisión
+    q = q.outerjoin(FileSummary, FileSummary.file_id == File.id).where(
+        or_(FileSummary.file_id.is_(None), FileSummary.revision != File.revision)
+    )
+    if template_id is not None:
+        q = q.where(File.template_id == template_id)
+    if owner_id is not None:
+        q = q.where(File.owner_id == owner_id)
+    return q
+
+
+def refresh(db: Session, file_ids=None, template_id=None, owner_id=None, limit: int | None = None) -> int:
+    """
+    Recalcula los resúmenes faltantes o vencidos (de `file_ids`, o de los archivos de
+    `template_id` / `owner_id`; a lo sumo `limit`, los editados más recientemente primero)
+    por tandas de SCORES_CHUNK_FILES, y poda los de archivos que ya no existen.
+    Devuelve cuántos recalculó.
+    """
+    q = _stale(select(File.id), template_id, owner_id)
+    orphans = select(FileSummary.file_id).outerjoin(File, File.id == FileSummary.file_id).where(File.id.is_(None))
+    if file_ids is not None:
+        q = q.where(File.id.in_(list(file_ids)))
+        orphans = orphans.where(FileSummary.file_id.in_(list(file_ids)))
+    if template_id is not None:
+        orphans = orphans.where(FileSummary.template_id == template_id)
+    if owner_id is not None:
+        orphans = orphans.where(FileSummary.owner_id == owner_id)
+    if limit is not None:
+        q = q.order_by(File.updated_at.desc()).limit(limit)
+
+    gone = db.scalars(orphans).all()
+    if gone:
+        remove(db, gone)
+        db.commit()
+
+    ids = db.scalars(q).all()
+    for start in range(0, len(ids), SCORES_CHUNK_FILES):
+        chunk = ids[start : start + SCORES_CHUNK_FILES]
+        rows = db.execute(
+            select(File.id, File.template_id, File.owner_id, File.revision, File.storage, File.file_json).where(
+                File.id.in_(chunk)
+            )
+        ).all()
+        found, docs = [], []
+        for r in rows:
+            try:
+                docs.append(file_store.document(db, r))
+                found.append(r)
+            except LookupError:
+                log.warning("file %s: template base missing, summary skipped", r.id)
+        with metrics.timer("scoring"):
+            results = scoring.score_batch([scoring.unwrap_data(d) for d in docs])
+        with metrics.timer("search_texts"):
+            search = [{"id": r.id, "revision": r.revision, **file_search.texts(d)} for r, d in zip(found, docs)]
+
+        save(
+            db,
+            [
+                {
+                    "file_id": r.id,
+                    "template_id": r.template_id,
+                    "owner_id": r.owner_id,
+                    "revision": r.revision,
+                    **build(res),
+                    "file_nodes": file_nodes.build(doc, res),
+                }
+                for r, doc, res in zip(found, docs, results)
+            ],
+        )
+        file_search.sync(db, search)
+        db.commit()
+    return len(ids)
+
+
+def refresh_file(file_id) -> None:
+    """
+    Tarea en segundo plano después de guardar: su propia sesión y sin propagar errores
+    (si falla, la analítica lo recalcula al consultarse).
+    """
+    db = SessionLocal()
+    try:
+        refresh(db, file_ids=[file_id])
+    except Exception:
+        log.exception("file %s: summary refresh failed", file_id)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def backfill(template_id) -> None:
+    """
+    Tarea en segundo plano: recalcula todos los resúmenes vencidos de la plantilla. Una sola
+    a la vez por plantilla; si ya hay una corriendo, no hace nada.
+    """
+    with _backfill_lock:
+        if template_id in _backfilling:
+            return
+        _backfilling.add(template_id)
+    db = SessionLocal()
+    try:
+        refresh(db, template_id=template_id)
+    except Exception:
+        log.exception("template %s: summary backfill failed", template_id)
+        db.rollback()
+    finally:
+        db.close()
+        with _backfill_lock:
+            _backfilling.discard(template_id)
+
+
+def seed(file_ids: list) -> None:
+    """
+    Tarea en segundo plano después de un alta: los archivos se crearon con el mismo documento,
+    así que se puntúa el primero y sus nodos viajan una sola vez para todos.
+    """
+    db = SessionLocal()
+    try:
+        first = db.execute(
+            select(File.id, File.template_id, File.owner_id, File.revision, File.storage, File.file_json).where(
+                File.id == file_ids[0]
+            )
+        ).first()
+        if first is None:
+            return
+        if first.revision != 1:
+            # ya lo editaron: se calcula cada uno
+            refresh(db, file_ids=file_ids)
+            return
+
+        doc = file_store.document(db, first)
+        with metrics.timer("scoring"):
+            res = scoring.score_data(scoring.unwrap_data(doc))
+        summary = build(res)
+        nodes = summary.pop("nodes")
+        # revisión 1: si alguno ya se guardó, su resumen es más nuevo y no se toca
+        rows = [
+            {"file_id": fid, "template_id": first.template_id, "owner_id": first.owner_id, "revision": 1, **summary}
+            for fid in file_ids
+        ]
+        save(db, rows, shared=(nodes, file_nodes.build(doc, res)))
+        with metrics.timer("search_texts"):
+            search = file_search.texts(doc)
+        file_search.sync(db, [{"id": fid, "revision": 1, **search} for fid in file_ids])
+        db.commit()
+    except Exception:
+        log.exception("file %s: summary seed failed", file_ids[0])
+        db.rollback()
+    finally:
+        db.close()
+
+
+# ----- consulta -----
+
+
+def _code_key(code):
+    # 1.2 < 1.10; los códigos no numéricos al final
+    if not code:
+        return (2, ())
+    parts = [p for p in re.split(r"[.\s]+", code) if p]
+    if all(p.isdigit() for p in parts):
+        return (0, tuple(int(p) for p in parts))
+    return (1, tuple(parts))
+
+
+def _level_key(v: str):
+    try:
+        return (0, float(v))
+    except ValueError:
+        return (1, v)
+
+
+def _avg(dist: dict):
+    total = n = 0
+    for k, c in dist.items():
+        try:
+            total += float(k) * c
+        except ValueError:
+            continue
+        n += c
+    return round(total / n, 4) if n else None
+
+
+def stats_query(template_id, owner_id=None):
+    t = TemplateNodeStat
+    keys = (t.codigo, t.item, t.respondido, t.nivel_aplicacion, t.nivel_importancia, t.prioridad)
+    q = select(*keys, cast(func.sum(t.n), BigInteger).label("n")).where(t.template_id == template_id)
+    if owner_id is not None:
+        q = q.where(t.owner_id == owner_id)
+    return q.group_by(*keys).having(func.sum(t.n) > 0)
+
+
+def totals_query(template_id, owner_id=None):
+    s = FileSummary
+    q = select(
+        func.count().label("files"),
+        func.coalesce(func.sum(s.item_count), 0).label("items"),
+        func.coalesce(func.sum(s.answered_count), 0).label("answered"),
+        func.count().filter(s.answered_count >= s.item_count).label("complete_files"),
+        func.max(s.updated_at).label("refreshed_at"),
+    ).where(s.template_id == template_id)
+    if owner_id is not None:
+        q = q.where(s.owner_id == owner_id)
+    return q
+
+
+def stale_query(template_id, owner_id=None):
+    # cuántos archivos de la plantilla todavía no entran (o entran desactualizados) en las analíticas
+    return _stale(select(func.count()).select_from(File), template_id, owner_id)
+
+
+def fold(template_id, totals, groups, stale_files: int = 0) -> dict:
+    """
+    Respuesta de analíticas a partir de las filas de totals_query / stats_query.
+    """
+    priorities = {}
+    by_code = {}
+    for codigo, item, respondido, na, ni, prioridad, n in groups:
+        node = by_code.get(codigo)
+        if node is None:
+            node = by_code[codigo] = {
+                "codigo": codigo or None,
+                "item": item,
+                "count": 0,
+                "respondidos": 0,
+                "nivel_aplicacion": {},
+                "nivel_importancia": {},
+                "priorities": {},
+            }
+        node["count"] += n
+        if respondido:
+            node["respondidos"] += n
+        if na:
+            node["nivel_aplicacion"][na] = node["nivel_aplicacion"].get(na, 0) + n
+        if ni:
+            node["nivel_importancia"][ni] = node["nivel_importancia"].get(ni, 0) + n
+        if prioridad:
+            node["priorities"][prioridad] = node["priorities"].get(prioridad, 0) + n
+            priorities[prioridad] = priorities.get(prioridad, 0) + n
+
+    nodes = []
+    for code in sorted(by_code, key=_code_key):
+        node = by_code[code]
+        for field in ("nivel_aplicacion", "nivel_importancia"):
+            dist = node[field]
+            node[field] = {k: dist[k] for k in sorted(dist, key=_level_key)}
+            node[f"{field}_avg"] = _avg(dist)
+        node["completion_rate"] = round(node["respondidos"] / node["count"], 4) if node["item"] else None
+        nodes.append(node)
+
+    return {
+        "template_id": template_id,
+        "files": totals.files,
+        "complete_files": totals.complete_files,
+        "items": totals.items,
+        "answered": totals.answered,
+        "completion_rate": round(totals.answered / totals.items, 4) if totals.items else None,
+        "priorities": priorities,
+        "refreshed_at": totals.refreshed_at,
+        "stale_files": stale_files,
+        "nodes": nodes,
+    }
@@ -0,0 +1,161 @@
+from sqlalchemy import Text, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.core import scoring
+from app.core.file_store import FULL
+
+# Lecturas parciales de file_json para el primer render del editor:
+#   - proyección: solo algunas claves de data (meta, columns, scales...), con la misma forma
+#     de documento ({"template": ..., "data": {...}}) para que el cliente la lea igual;
+#   - subárbol: los hijos de un nodo (o las raíces) hasta `depth` niveles.
+# En storage "full" se arman en la base y solo viaja lo pedido; un delta se materializa acá.
+
+# claves desde file_json hasta data, igual que scoring.data_path (hasta 3 capas de "data")
+_DATA_PATH = """
+CASE
+    WHEN jsonb_typeof(d -> 'data') IS DISTINCT FROM 'object' THEN 0
+    WHEN jsonb_typeof(d #> '{data,data}') IS DISTINCT FROM 'object' THEN 1
+    WHEN jsonb_typeof(d #> '{data,data,data}') IS DISTINCT FROM 'object' THEN 2
+    ELSE 3
+END
+"""
+
+_PROJECT_SQL = text(
+    f"""
+WITH f AS (SELECT file_json AS d FROM files WHERE id = :id),
+p AS (SELECT d, {_DATA_PATH} AS k FROM f),
+pj AS (
+    SELECT d, k, (
+        SELECT coalesce(jsonb_object_agg(e.key, e.value), '{{}}'::jsonb)
+        FROM jsonb_each(d #> array_fill('data'::text, ARRAY[k])) AS e
+        WHERE e.key = ANY(:fields)
+    ) AS v
+    FROM p
+)
+SELECT (
+    CASE k
+        WHEN 0 THEN v
+        WHEN 1 THEN jsonb_build_object('data', v)
+        WHEN 2 THEN jsonb_build_object('data', jsonb_build_object('data', v))
+        ELSE jsonb_build_object('data', jsonb_build_object('data', jsonb_build_object('data', v)))
+    END
+    || CASE WHEN k > 0 AND d ? 'template' THEN jsonb_build_object('template', d -> 'template') ELSE '{{}}'::jsonb END
+)::text
+FROM pj
+"""
+).bindparams(bindparam("fields", type_=ARRAY(Text)))
+
+# raíces: sin padre o con un padre que no existe (como en scoring)
+_ROOTS = """
+    n.parent_id IS NULL
+    OR NOT EXISTS (SELECT 1 FROM file_nodes p WHERE p.file_id = :id AND p.codigo = n.parent_id)
+"""
+
+
+def _subtree_sql(start: str):
+    # Sale de file_nodes (índice file_id, parent_id) y toma los nodos de file_json por su puntero.
+    # Sin filas si la proyección no sirve: storage delta, file_nodes de otra revisión o nodos
+    # sin fila (sin "id" o con id repetido); en ese caso se usa subtree().
+    return text(
+        f"""
+WITH RECURSIVE
+doc AS (
+    SELECT f.file_json
+    FROM files f JOIN file_summaries s ON s.file_id = f.id AND s.revision = f.revision
+    WHERE f.id = :id AND f.storage = '{FULL}'
+      AND s.node_count = (SELECT count(*) FROM file_nodes WHERE file_id = :id)
+),
+tree AS (
+    SELECT n.codigo, n.pointer, 1 AS depth
+    FROM file_nodes n
+    WHERE n.file_id = :id AND ({start})
+    UNION ALL
+    SELECT c.codigo, c.pointer, t.depth + 1
+    FROM tree t JOIN file_nodes c ON c.file_id = :id AND c.parent_id = t.codigo
+    WHERE t.depth < :depth
+),
+picked AS (
+    SELECT DISTINCT substring(pointer from '/[0-9]+$') AS i, regexp_replace(pointer, '/[0-9]+$', '') AS arr
+    FROM tree
+)
+-- una sola pasada por el array de nodos: cada #> sobre file_json lo volvería a destostar entero
+SELECT coalesce(
+    (
+        SELECT jsonb_agg(e.value ORDER BY e.i)
+        FROM jsonb_array_elements(
+            doc.file_json #> (SELECT string_to_array(substr(min(arr), 2), '/') FROM picked)
+        ) WITH ORDINALITY AS e(value, i)
+        WHERE e.i - 1 IN (SELECT substr(i, 2)::bigint FROM picked)
+    ),
+    '[]'::jsonb
+)::text
+FROM doc
+"""
+    )
+
+
+_CHILDREN_SQL = _subtree_sql("n.parent_id = :parent")
+_ROOTS_SQL = _subtree_sql(_ROOTS)
+
+
+def parse_fields(raw: str) -> list[str]:
+    # "meta, columns,scales" -> ["meta", "columns", "scales"] (sin repetidos)
+    return list(dict.fromkeys(s.strip() for s in raw.split(",") if s.strip()))
+
+
+def project_text(db: Session, file_id, fields: list[str]) -> str:
+    """
+    file_json (storage "full") con solo las claves `fields` de data, como texto JSON.
+    """
+    return db.execute(_PROJECT_SQL, {"id": file_id, "fields": fields}).scalar_one()
+
+
+def project(doc, fields: list[str]) -> dict:
+    """
+    Lo mismo que project_text sobre un documento ya cargado (p. ej. un delta materializado).
+    """
+    path = scoring.data_path(doc)
+    data = scoring.unwrap_data(doc)
+    out = {k: v for k, v in data.items() if k in fields}
+    for key in reversed(path):
+        out = {key: out}
+    if path and isinstance(doc, dict) and "template" in doc:
+        out["template"] = doc["template"]
+    return out
+
+
+def subtree_text(db: Session, file_id, parent: str | None, depth: int) -> str | None:
+    """
+    Nodos (array JSON, en orden del documento) bajo `parent` (código normalizado; None = raíces)
+    hasta `depth` niveles, o None si hay que recorrer el documento con subtree().
+    """
+    if parent is None:
+        return db.execute(_ROOTS_SQL, {"id": file_id, "depth": depth}).scalar()
+    return db.execute(_CHILDREN_SQL, {"id": file_id, "parent": parent, "depth": depth}).scalar()
+
+
+def subtree(doc, parent: str | None, depth: int) -> list:
+    """
+    Lo mismo que subtree_text recorriendo el documento, con los códigos y padres de scoring.
+    """
+    data = scoring.unwrap_data(doc)
+    nodes = data.get("nodes")
+    if not isinstance(nodes, list):
+        return []
+    res = scoring.score_data(data)
+    codes, parents = res["codigo"], res["parent"]
+    if parent is None:
+        known = {c for c in codes if c}
+        level = {i for i, p in enumerate(parents) if p is None or p not in known}
+    else:
+        level = {i for i, p in enumerate(parents) if p == parent}
+
+    picked = set(level)
+    for _ in range(depth - 1):
+        found = {codes[i] for i in level if codes[i]}
+        level = {i for i, p in enumerate(parents) if p in found and i not in picked}
+        if not level:
+            break
+        picked |= level
+    return [nodes[i] for i in sorted(picked)]
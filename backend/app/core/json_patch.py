@@ -0,0 +1,258 @@
+import copy
+
+from app.core.json_response import dumps_compact
+
+# JSON Patch (RFC 6902) y JSON Merge Patch (RFC 7396) sobre documentos file_json.
+#
+# apply_json_patch / apply_merge_patch aplican el parche en memoria (camino general).
+# to_simple_ops traduce un parche a operaciones "simples" que se pueden aplicar en
+# Postgres con jsonb_set / #- sin leer el documento completo; devuelve None cuando
+# el parche necesita el camino general (test/move/copy, rutas dependientes entre sí, etc.).
+
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_pointer(ptr) -> list[str]:
+    """
+    JSON Pointer (RFC 6901) -> lista de segmentos.
+    """
+    if not isinstance(ptr, str):
+        raise PatchError("path debe ser string")
+    if ptr == "":
+        return []
+    if not ptr.startswith("/"):
+        raise PatchError(f"JSON Pointer inválido: {ptr!r}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in ptr[1:].split("/")]
+
+
+def format_pointer(segs: list[str]) -> str:
+    # inversa de parse_pointer
+    return "".join("/" + str(s).replace("~", "~0").replace("/", "~1") for s in segs)
+
+
+def json_equal(a, b) -> bool:
+    """
+    Igualdad de valores JSON (RFC 6902, 4.6): como ==, salvo que true/false no son 1/0
+    (en Python True == 1 == 1.0). Objetos y arrays se comparan recursivamente.
+    """
+    if a is b:
+        return True
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(json_equal(v, b[k]) for k, v in a.items())
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(map(json_equal, a, b))
+    if isinstance(b, (dict, list)):
+        return False
+    return a == b
+
+
+def _array_index(arr: list, seg: str, allow_end: bool = False) -> int:
+    if allow_end and seg == "-":
+        return len(arr)
+    if not seg.isdigit() or (len(seg) > 1 and seg.startswith("0")):
+        raise PatchError(f"Índice de array inválido: {seg!r}")
+    idx = int(seg)
+    if idx > len(arr) or (idx == len(arr) and not allow_end):
+        raise PatchError(f"Índice fuera de rango: {seg}")
+    return idx
+
+
+def _resolve(doc, segs: list[str]):
+    cur = doc
+    for seg in segs:
+        if isinstance(cur, dict):
+            if seg not in cur:
+                raise PatchError(f"Ruta inexistente: /{'/'.join(segs)}")
+            cur = cur[seg]
+        elif isinstance(cur, list):
+            cur = cur[_array_index(cur, seg)]
+        else:
+            raise PatchError(f"Ruta inexistente: /{'/'.join(segs)}")
+    return cur
+
+
+def _add(doc, segs, value):
+    if not segs:
+        return value
+    parent = _resolve(doc, segs[:-1])
+    last = segs[-1]
+    if isinstance(parent, dict):
+        parent[last] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, last, allow_end=True), value)
+    else:
+        raise PatchError(f"No se puede agregar en /{'/'.join(segs)}")
+    return doc
+
+
+def _remove(doc, segs):
+    if not segs:
+        raise PatchError("No se puede eliminar la raíz")
+    parent = _resolve(doc, segs[:-1])
+    last = segs[-1]
+    if isinstance(parent, dict):
+        if last not in parent:
+            raise PatchError(f"Ruta inexistente: /{'/'.join(segs)}")
+        return parent.pop(last)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, last))
+    raise PatchError(f"Ruta inexistente: /{'/'.join(segs)}")
+
+
+def apply_json_patch(doc, ops):
+    """
+    Aplica un JSON Patch sobre una copia de `doc` y la devuelve.
+    """
+    if not isinstance(ops, list):
+        raise PatchError("JSON Patch debe ser una lista de operaciones")
+
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if not isinstance(op, dict) or "op" not in op or "path" not in op:
+            raise PatchError("Operación inválida")
+        kind = op["op"]
+        segs = parse_pointer(op["path"])
+
+        if kind == "add":
+            doc = _add(doc, segs, copy.deepcopy(_value(op)))
+        elif kind == "remove":
+            _remove(doc, segs)
+        elif kind == "replace":
+            _resolve(doc, segs)
+            if segs:
+                _remove(doc, segs)
+            doc = _add(doc, segs, copy.deepcopy(_value(op)))
+        elif kind in ("move", "copy"):
+            src = parse_pointer(op.get("from"))
+            if kind == "move":
+                if segs[: len(src)] == src and segs != src:
+                    raise PatchError("No se puede mover un nodo dentro de sí mismo")
+                value = _remove(doc, src) if src else doc
+            else:
+                value = copy.deepcopy(_resolve(doc, src))
+            doc = _add(doc, segs, value)
+        elif kind == "test":
+            if not json_equal(_resolve(doc, segs), _value(op)):
+                raise PatchError(f"test falló en {op['path']}")
+        else:
+            raise PatchError(f"Operación desconocida: {kind!r}")
+    return doc
+
+
+def _value(op):
+    if "value" not in op:
+        raise PatchError(f"Falta 'value' en {op.get('op')}")
+    return op["value"]
+
+
+def apply_merge_patch(target, patch):
+    """
+    RFC 7396: objetos se mezclan recursivamente, null elimina, todo lo demás reemplaza.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    out = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = apply_merge_patch(out.get(k), v)
+    return out
+
+
+# ----- Operaciones simples (aplicables en la base) -----
+#
+# ("set", path, value)       agrega/reemplaza un miembro; el padre debe ser objeto
+# ("replace", path, value)   reemplaza un valor existente (padre objeto o array)
+# ("remove", path, strict)   elimina un miembro de un objeto; strict=True exige que exista
+# ("append", path, value)    agrega al final del array en `path`
+# ("ensure_object", path)    el valor en `path` ya debe ser un objeto (no escribe nada)
+
+
+def _pg_safe(segs: list[str]) -> bool:
+    # Postgres lee "01" como índice 1 y "-1" como el último elemento; el camino general
+    # (_array_index) los rechaza, así que esas rutas no van por jsonb_set
+    return not any((s.startswith("-") and s != "-") or (len(s) > 1 and s[0] == "0" and s.isdigit()) for s in segs)
+
+
+def _json_patch_to_simple(ops):
+    out = []
+    for op in ops:
+        if not isinstance(op, dict):
+            return None
+        kind = op.get("op")
+        try:
+            segs = parse_pointer(op.get("path"))
+        except PatchError:
+            return None
+        if not segs or not _pg_safe(segs) or (kind in ("add", "replace") and "value" not in op):
+            return None
+        if kind == "add":
+            if segs[-1] == "-":
+                out.append(("append", segs[:-1], op["value"]))
+            else:
+                out.append(("set", segs, op["value"]))
+        elif kind == "replace":
+            out.append(("replace", segs, op["value"]))
+        elif kind == "remove":
+            out.append(("remove", segs, True))
+        else:
+            return None
+    return out
+
+
+def _merge_patch_to_simple(patch, prefix=None):
+    prefix = prefix or []
+    out = []
+    for k, v in patch.items():
+        path = prefix + [str(k)]
+        if v is None:
+            out.append(("remove", path, False))
+        elif isinstance(v, dict):
+            if not v:
+                out.append(("ensure_object", path))
+            else:
+                out.extend(_merge_patch_to_simple(v, path))
+        else:
+            out.append(("set", path, v))
+    return out
+
+
+def _op_path(op) -> list[str]:
+    return op[1] + ["-"] if op[0] == "append" else op[1]
+
+
+def _independent(ops) -> bool:
+    # Si ninguna ruta es prefijo de otra, el orden no importa y las
+    # precondiciones se pueden comprobar contra el documento original.
+    paths = sorted(tuple(_op_path(op)) for op in ops)
+    for a, b in zip(paths, paths[1:]):
+        if b[: len(a)] == a:
+            return False
+    return True
+
+
+def to_simple_ops(media_type: str, patch):
+    if media_type == JSON_PATCH_MEDIA_TYPE:
+        if not isinstance(patch, list):
+            return None
+        ops = _json_patch_to_simple(patch)
+    else:
+        if not isinstance(patch, dict):
+            return None
+        ops = _merge_patch_to_simple(patch)
+    if ops is None or not _independent(ops):
+        return None
+    return ops
+
+
+def json_size(value) -> int:
+    # mismo formato que el cálculo de size_bytes de create_file/update_file
+    return len(dumps_compact(value).encode("utf-8"))
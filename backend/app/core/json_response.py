@@ -0,0 +1,36 @@
+import json
+
+from fastapi import Response
+from pydantic import BaseModel
+
+# Respuestas con documentos grandes (file_json): el sobre se valida con Pydantic y
+# el documento se pega como texto JSON ya hecho (el jsonb::text de Postgres o el
+# dump que ya se calculó para size_bytes), sin validarlo ni re-serializarlo nodo por nodo.
+
+
+def dumps_compact(value) -> str:
+    # mismo formato que size_bytes
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def document_response(
+    envelope: BaseModel,
+    field: str,
+    doc: str | bytes,
+    status_code: int = 200,
+    headers: dict | None = None,
+) -> Response:
+    """
+    Serializa `envelope` y agrega `field` con el JSON crudo `doc` como último miembro.
+    """
+    if isinstance(doc, str):
+        doc = doc.encode("utf-8")
+    head = envelope.model_dump_json()
+    sep = "," if head != "{}" else ""
+    body = b"".join([f"{head[:-1]}{sep}{json.dumps(field)}:".encode("utf-8"), doc, b"}"])
+    return Response(
+        content=body,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.routing import Match
+
+from app.core.config import DB_QUERY_DEBUG, DB_QUERY_WARN_COUNT
+from app.db import query_stats
+
+# Métricas en proceso con exposición en formato de texto de Prometheus (GET /metrics).
+# Sin dependencias: contadores, gauges e histogramas con etiquetas, protegidos por un lock.
+# Con varios workers de uvicorn cada proceso expone las suyas.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_registry = []
+
+log = logging.getLogger(__name__)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = state[0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        for k, (counts, total, acc) in items:
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                le = 'le="%s"' % _fmt(b)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, k, le)} {cum}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, k, le)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, k)} {_fmt(acc)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, k)} {total}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----- métricas HTTP -----
+
+http_requests = Counter("http_requests_total", "Requests atendidos", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Latencia del request completo", ("method", "route"))
+http_response_size = Histogram(
+    "http_response_size_bytes", "Tamaño del cuerpo de la respuesta", ("method", "route"), buckets=SIZE_BUCKETS
+)
+http_in_flight = Gauge("http_requests_in_progress", "Requests en curso", ("method", "route"))
+db_queries = Histogram(
+    "db_queries_per_request", "Consultas SQL por request", ("method", "route"), buckets=COUNT_BUCKETS
+)
+db_time = Histogram("db_time_per_request_seconds", "Tiempo en la base por request", ("method", "route"))
+
+# ----- operaciones costosas (armado de XLSX, serialización JSON, ...) -----
+
+operation_latency = Histogram("app_operation_duration_seconds", "Duración de operaciones internas", ("operation",))
+
+# ----- hash de contraseñas (core/password_pool) -----
+
+password_pool_pending = Gauge("password_pool_pending", "Hashes de contraseña en curso o en cola")
+password_pool_rejected = Counter("password_pool_rejected_total", "Hashes rechazados con el pool lleno (503)")
+
+
+@contextmanager
+def timer(operation: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        operation_latency.observe(time.perf_counter() - start, operation)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (no envuelve el body como BaseHTTPMiddleware): mide hasta
+    que se envía el último chunk, así las respuestas en streaming cuentan completas.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    def _route_label(self, scope) -> str:
+        # plantilla de la ruta (/files/{file_id}), no el path real: cardinalidad acotada.
+        # Se resuelve antes de despachar para poder etiquetar el in-flight.
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_label(scope)
+        http_in_flight.inc(method, route)
+        start = time.perf_counter()
+        status = [500]
+        size = [0]
+        qs_token = query_stats.begin()
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if DB_QUERY_DEBUG:
+                    # lo consultado hasta que sale la respuesta (no incluye el resto de un streaming)
+                    qs = query_stats.current()
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-queries", str(qs.count).encode()),
+                        (b"x-db-time-ms", f"{qs.seconds * 1000:.2f}".encode()),
+                    ]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec(method, route)
+            http_requests.inc(method, route, str(status[0]))
+            http_latency.observe(elapsed, method, route)
+            http_response_size.observe(size[0], method, route)
+
+            qs = query_stats.end(qs_token)
+            db_queries.observe(qs.count, method, route)
+            db_time.observe(qs.seconds, method, route)
+            if DB_QUERY_WARN_COUNT and qs.count > DB_QUERY_WARN_COUNT:
+                log.warning("%s %s ran %d queries (%.1f ms in DB)", method, route, qs.count, qs.seconds * 1000)
@@ -0,0 +1,84 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core import metrics
+from app.core.config import PASSWORD_POOL_MAX_PENDING, PASSWORD_POOL_WORKERS
+
+# Pool de procesos solo para bcrypt (register/login): una ráfaga de logins no ocupa los hilos
+# de la API ni compite con las exportaciones. La cola es acotada: con PASSWORD_POOL_MAX_PENDING
+# operaciones en curso o esperando, run() levanta PoolSaturated sin encolar (la ruta responde 503).
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _release(_fut) -> None:
+    # callback del future: corre aunque el request que esperaba se haya cancelado
+    global _pending
+    with _pool_lock:
+        _pending -= 1
+    metrics.password_pool_pending.dec()
+
+
+async def run(fn, *args):
+    """
+    fn(*args) en el pool (fn de nivel de módulo, ver core/security). PoolSaturated si la cola está llena.
+    """
+    global _pending
+    with _pool_lock:
+        if _pending >= PASSWORD_POOL_MAX_PENDING:
+            metrics.password_pool_rejected.inc()
+            raise PoolSaturated()
+        _pending += 1
+    metrics.password_pool_pending.inc()
+
+    pool = get_pool()
+    try:
+        try:
+            fut = pool.submit(fn, *args)
+        except BaseException:
+            _release(None)
+            raise
+        fut.add_done_callback(_release)
+        with metrics.timer("password_hash"):
+            return await asyncio.wrap_future(fut)
+    except BrokenProcessPool:
+        # se murió un worker: ese pool no sirve más, el próximo run() arma otro
+        _discard(pool)
+        raise PoolSaturated()
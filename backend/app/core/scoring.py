@@ -0,0 +1,465 @@
+import math
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+# Motor de puntajes del lado del servidor, con el mismo criterio que FileDetail.jsx
+# (computeSeverityPercent, classifyPriority, computeLevelsForExport):
+#
+#   severidad = VI × (VC_max − VC) / (VI_max × (VC_max − VC_min)) × 100, redondeada y acotada a 0..100
+#   prioridad = primer nivel de priorityLevels con min <= severidad <= max
+#   ÍTEM: nivel_aplicacion = valor VC, nivel_importancia = valor VI
+#   Agrupación/nivel: mínimo VC / máximo VI de sus ÍTEMS hijos directos o, si no tiene,
+#   de los ÍTEMS alcanzables a través de sub-agrupaciones.
+#
+# Lo único por nodo en Python es leer el JSON; la aritmética, la clasificación y el
+# roll-up del árbol (parentId) se hacen con arrays de NumPy sobre todos los nodos de
+# todos los archivos del lote a la vez.
+
+ITEM, GROUP, LEVEL = "ITEM", "GROUP", "LEVEL"
+
+DEFAULT_SCALES = {
+    "VI": [
+        {"key": "VI_5", "label": "Muy importante / Crítico", "value": 5},
+        {"key": "VI_4", "label": "Importante", "value": 4},
+        {"key": "VI_3", "label": "Neutro", "value": 3},
+        {"key": "VI_2", "label": "Poco importante", "value": 2},
+        {"key": "VI_1", "label": "No importante", "value": 1},
+    ],
+    "VC": [
+        {"key": "VC_1", "label": "Aplica", "value": 3},
+        {"key": "VC_05", "label": "Parcialmente", "value": 2},
+        {"key": "VC_0", "label": "No aplica", "value": 1},
+    ],
+}
+
+DEFAULT_PRIORITY_LEVELS = [
+    {"id": "low", "name": "Baja/Nula", "min": 0, "max": 33},
+    {"id": "medium", "name": "Alta", "min": 33, "max": 66},
+    {"id": "high", "name": "Máxima", "min": 66, "max": 100},
+]
+
+_CODE_FIELDS = ("code", "codigo", "código")
+_TYPE_FIELDS = ("type", "tipo", "kind")
+_PARENT_FIELDS = ("parentId", "parent_id", "padre", "padreId", "id_padre", "parent")
+_VI_FIELDS = ("viKey", "vi", "vi_key", "nivel_importancia", "importancia")
+_VC_FIELDS = ("vcKey", "vc", "vc_key", "aplica")
+
+_CODE_RX = (re.compile(r"^code$"), re.compile(r"codigo"))
+_TYPE_RX = (re.compile(r"^type$"), re.compile(r"^tipo$"), re.compile(r"kind"))
+_PARENT_RX = (re.compile(r"parent"), re.compile(r"padre"))
+_VI_KEY_RX = re.compile(r"VI_\d+", re.I)
+_VC_KEY_RX = re.compile(r"VC_\d+|VC_0?5", re.I)
+
+# tope de niveles del árbol para el roll-up (corta ciclos en parentId)
+_MAX_DEPTH = 256
+
+
+# ----- lectura del JSON (mismas reglas que el adaptador del editor) -----
+
+
+@lru_cache(maxsize=4096)
+def _norm_field(k) -> str:
+    s = unicodedata.normalize("NFD", str(k))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return re.sub(r"\s+", "_", s.lower())
+
+
+def _any_key(keys: tuple, candidates: tuple):
+    # getAny: primera clave presente (aunque valga null); después, por nombre normalizado
+    for k in candidates:
+        if k in keys:
+            return k
+    want = {_norm_field(k) for k in candidates}
+    for k in keys:
+        if _norm_field(k) in want:
+            return k
+    return None
+
+
+def _regex_key(keys: tuple, patterns: tuple):
+    # getByRegex
+    for rx in patterns:
+        for k in keys:
+            if rx.search(_norm_field(k)):
+                return k
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _node_plan(keys: tuple) -> tuple:
+    """
+    De qué claves del nodo sale cada campo, por layout de claves (los nodos de un
+    documento comparten unos pocos layouts): (clave getAny, clave getByRegex) por campo.
+    """
+    return (
+        (_any_key(keys, _CODE_FIELDS), _regex_key(keys, _CODE_RX)),
+        (_any_key(keys, _TYPE_FIELDS), _regex_key(keys, _TYPE_RX)),
+        (_any_key(keys, _PARENT_FIELDS), _regex_key(keys, _PARENT_RX)),
+        _any_key(keys, _VI_FIELDS),
+        _any_key(keys, _VC_FIELDS),
+    )
+
+
+def _read(n: dict, field: tuple):
+    # getAny(...) ?? getByRegex(...)
+    k, rx = field
+    v = n[k] if k is not None else None
+    if v is None and rx is not None:
+        v = n[rx]
+    return v
+
+
+def _js_falsy(value) -> bool:
+    # [] y {} son verdaderos en JS
+    return value is None or value is False or (isinstance(value, (str, int, float)) and not value) or (
+        isinstance(value, float) and math.isnan(value)
+    )
+
+
+def _js_or(*values):
+    # `a || b || c` de JS
+    for v in values[:-1]:
+        if not _js_falsy(v):
+            return v
+    return values[-1]
+
+
+def _js_number(value) -> float:
+    # Number(value) de JS (NaN si no es convertible)
+    if value is None or value is False:
+        return 0.0
+    if value is True:
+        return 1.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        s = value.strip()
+        if not s:
+            return 0.0
+        try:
+            return float(s)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def _js_string(value) -> str:
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def normalize_code(code) -> str:
+    return " ".join(_js_string(code).split()).rstrip(".")
+
+
+def _coerce_type(raw, code: str) -> str:
+    t = _js_string(raw).strip().upper()
+    if t in ("LEVEL", "NIVEL", "N"):
+        return LEVEL
+    if t in ("GROUP", "GRUPO", "AGRUPACION", "AGRUPACIÓN", "G"):
+        return GROUP
+    if t in ("ITEM", "ITEMS", "I", "A", "CRITERIO", "PREGUNTA"):
+        return ITEM
+    depth = len([p for p in code.split(".") if p]) if code else 0
+    return LEVEL if depth == 1 else ITEM
+
+
+def _coerce_vi_key(vi_keys: set, raw) -> str:
+    s = _js_string(raw).strip()
+    if not s:
+        return "VI_3"
+    if _VI_KEY_RX.fullmatch(s):
+        return s.upper()
+    n = _js_number(raw)
+    if math.isfinite(n):
+        k = f"VI_{max(1, min(5, math.floor(n + 0.5)))}"
+        return k if k in vi_keys else "VI_3"
+    return "VI_3"
+
+
+def _coerce_vc_key(raw) -> str:
+    s = _js_string(raw).strip()
+    if not s:
+        return "VC_1"
+    if _VC_KEY_RX.fullmatch(s):
+        return s.upper()
+    n = _js_number(raw)
+    if n == 1:
+        return "VC_1"
+    if n == 0.5:
+        return "VC_05"
+    if n == 0:
+        return "VC_0"
+    return "VC_1"
+
+
+def _hashable(value) -> bool:
+    return value is None or isinstance(value, (str, int, float))
+
+
+def _scale_list(value) -> list:
+    return [s for s in value if isinstance(s, dict)] if isinstance(value, list) else []
+
+
+def data_path(doc) -> list[str]:
+    # claves desde file_json hasta lo que devuelve unwrap_data (hasta 3 capas de "data")
+    p, path = doc, []
+    for _ in range(3):
+        if isinstance(p, dict) and isinstance(p.get("data"), dict):
+            p = p["data"]
+            path.append("data")
+        else:
+            break
+    return path
+
+
+def unwrap_data(doc):
+    # file_json -> data (hasta 3 capas de "data", como el editor)
+    p = doc
+    for _ in data_path(doc):
+        p = p["data"]
+    return p if isinstance(p, dict) else {}
+
+
+def _priority_levels(data: dict) -> list[tuple]:
+    raw = _js_or(data.get("priorityLevels"), data.get("priority_levels"), data.get("priorities"), None)
+    if not isinstance(raw, list):
+        raw = DEFAULT_PRIORITY_LEVELS
+    out = []
+    for idx, p in enumerate(raw):
+        p = p if isinstance(p, dict) else {}
+        name = _js_or(p.get("name"), p.get("label"), f"Nivel {idx + 1}")
+        lo = p.get("min")
+        hi = p.get("max")
+        out.append((str(name), _js_number(0 if lo is None else lo), _js_number(100 if hi is None else hi)))
+    return out
+
+
+class _Batch:
+    """
+    Columnas planas de todos los nodos del lote + parámetros por archivo.
+    """
+
+    def __init__(self):
+        self.offsets = [0]
+        self.parent = []
+        self.is_item = []
+        self.codes = []
+        self.types = []
+        self.parent_codes = []
+        self.answered = []
+        self.vi_sev, self.vc_sev = [], []
+        self.vi_lvl, self.vc_lvl = [], []
+        self.file_params = []  # (vi_max, vc_max, vc_min)
+        self.levels = []  # por archivo: [(name, min, max)]
+
+    def add(self, data: dict) -> None:
+        base = self.offsets[-1]
+        nodes = data.get("nodes")
+        if not isinstance(nodes, list):
+            nodes = []
+
+        scales = _js_or(data.get("scales"), data.get("escalas"), DEFAULT_SCALES)
+        scales = scales if isinstance(scales, dict) else {}
+        vi_list = _scale_list(_js_or(scales.get("VI"), DEFAULT_SCALES["VI"]))
+        vc_list = _scale_list(_js_or(scales.get("VC"), DEFAULT_SCALES["VC"]))
+
+        # severidad: el primer valor de la escala con esa clave, tal cual (debe ser número)
+        vi_first, vc_first = {}, {}
+        for target, lst in ((vi_first, _scale_list(scales.get("VI"))), (vc_first, _scale_list(scales.get("VC")))):
+            for s in lst:
+                v = s.get("value")
+                target.setdefault(s.get("key"), float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else math.nan)
+        # niveles: Number(value) de la última entrada con esa clave
+        vi_num = {s.get("key"): _js_number(s.get("value")) for s in vi_list}
+        vc_num = {s.get("key"): _js_number(s.get("value")) for s in vc_list}
+        vi_keys = {s.get("key") for s in _scale_list(scales.get("VI"))}
+
+        vi_vals = [v for v in (_js_number(s.get("value")) for s in vi_list) if math.isfinite(v)]
+        vc_vals = [v for v in (_js_number(s.get("value")) for s in vc_list) if math.isfinite(v)]
+        self.file_params.append(
+            (
+                max(vi_vals) if vi_vals else math.nan,
+                max(vc_vals) if vc_vals else math.nan,
+                min(vc_vals) if vc_vals else math.nan,
+            )
+        )
+        self.levels.append(_priority_levels(data))
+
+        # valores de VI/VC por valor crudo del nodo (se repiten mucho): (sev, nivel)
+        vi_memo, vc_memo = {}, {}
+        is_item = self.is_item
+        codes, parents = [], []
+        for n in nodes:
+            n = n if isinstance(n, dict) else {}
+            code_f, type_f, parent_f, vi_k, vc_k = _node_plan(tuple(n))
+
+            code = normalize_code(_js_string(_read(n, code_f)).strip())
+            raw_parent = _read(n, parent_f)
+            if isinstance(raw_parent, bool) or not isinstance(raw_parent, (str, int, float)) or raw_parent == "":
+                raw_parent = None
+            codes.append(code or None)
+            parents.append(None if raw_parent is None else normalize_code(raw_parent))
+            self.types.append(_coerce_type(_read(n, type_f), code))
+            is_item.append(self.types[-1] == ITEM)
+
+            vi_raw = n[vi_k] if vi_k is not None else None
+            vi = vi_memo.get(vi_raw) if _hashable(vi_raw) else None
+            if vi is None:
+                key = _coerce_vi_key(vi_keys, vi_raw)
+                # clave ausente: Number(null) = 0 en el editor
+                vi = (vi_first.get(key, math.nan), vi_num.get(key, 0.0))
+                if _hashable(vi_raw):
+                    vi_memo[vi_raw] = vi
+            vc_raw = n[vc_k] if vc_k is not None else None
+            # respondido: ÍTEM con VC elegido (sin valor el editor asume VC_1)
+            self.answered.append(is_item[-1] and _js_string(vc_raw).strip() != "")
+            vc = vc_memo.get(vc_raw) if _hashable(vc_raw) else None
+            if vc is None:
+                key = _coerce_vc_key(vc_raw)
+                vc = (vc_first.get(key, math.nan), vc_num.get(key, 0.0))
+                if _hashable(vc_raw):
+                    vc_memo[vc_raw] = vc
+
+            self.vi_sev.append(vi[0])
+            self.vi_lvl.append(vi[1])
+            self.vc_sev.append(vc[0])
+            self.vc_lvl.append(vc[1])
+
+        # parentId es el código del padre; si no existe, el nodo cuelga de la raíz (parent None)
+        by_code = {c: base + i for i, c in enumerate(codes) if c}
+        self.parent.extend(by_code.get(p, -1) if p else -1 for p in parents)
+        self.codes.extend(codes)
+        self.parent_codes.extend(p if p in by_code else None for p in parents)
+        self.offsets.append(base + len(nodes))
+
+
+def _severity(b: _Batch, fidx: np.ndarray) -> np.ndarray:
+    params = np.array(b.file_params, dtype=float).reshape(-1, 3)
+    vi_max, vc_max, vc_min = params[fidx, 0], params[fidx, 1], params[fidx, 2]
+    vi = np.array(b.vi_sev, dtype=float)
+    vc = np.array(b.vc_sev, dtype=float)
+
+    denom = vi_max * (vc_max - vc_min)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raw = vi * (vc_max - vc) / denom * 100
+        ok = np.isfinite(vi) & np.isfinite(vc) & (denom > 0) & np.isfinite(raw)
+    # Math.round de JS: mitades hacia +inf
+    sev = np.clip(np.floor(np.where(ok, raw, 0) + 0.5), 0, 100)
+    return sev.astype(np.int64)
+
+
+def _priorities(b: _Batch, fidx: np.ndarray, sev: np.ndarray) -> np.ndarray:
+    width = max((len(lv) for lv in b.levels), default=0)
+    names = np.full(len(sev), "", dtype=object)
+    if width == 0 or len(sev) == 0:
+        return names
+    lo = np.full((len(b.levels), width), np.nan)
+    hi = np.full((len(b.levels), width), np.nan)
+    table = np.full((len(b.levels), width), "", dtype=object)
+    for i, lv in enumerate(b.levels):
+        for j, (name, a, z) in enumerate(lv):
+            lo[i, j], hi[i, j], table[i, j] = a, z, name
+
+    s = sev[:, None].astype(float)
+    hit = (s >= lo[fidx]) & (s <= hi[fidx])
+    first = hit.argmax(axis=1)
+    found = hit[np.arange(len(sev)), first]
+    names[found] = table[fidx[found], first[found]]
+    return names
+
+
+def _rollup(b: _Batch) -> tuple[np.ndarray, np.ndarray]:
+    n = len(b.parent)
+    parent = np.array(b.parent, dtype=np.int64)
+    is_item = np.array(b.is_item, dtype=bool)
+    app = np.array(b.vc_lvl, dtype=float)
+    imp = np.array(b.vi_lvl, dtype=float)
+    app[~np.isfinite(app)] = np.nan
+    imp[~np.isfinite(imp)] = np.nan
+
+    # agregados de los ÍTEMS hijos directos; un ÍTEM sin nivel aporta 0 (Number(null)
+    # en el editor). NaN = sin ÍTEMS, que fmin/fmax ignoran.
+    direct = is_item & (parent >= 0)
+    d_app = np.full(n, np.nan)
+    d_imp = np.full(n, np.nan)
+    np.fmin.at(d_app, parent[direct], np.nan_to_num(app[direct], nan=0.0))
+    np.fmax.at(d_imp, parent[direct], np.nan_to_num(imp[direct], nan=0.0))
+    has_direct = np.bincount(parent[direct], minlength=n)[:n] > 0
+
+    # profundidad de cada nodo para subir de las hojas a la raíz
+    depth = np.zeros(n, dtype=np.int64)
+    up = parent.copy()
+    for _ in range(_MAX_DEPTH):
+        active = up >= 0
+        if not active.any():
+            break
+        depth[active] += 1
+        up[active] = parent[up[active]]
+
+    # alcanzables: ÍTEMS directos + lo alcanzable desde cada sub-agrupación
+    r_app, r_imp = d_app.copy(), d_imp.copy()
+    for d in range(int(depth.max(initial=0)), 0, -1):
+        sel = ~is_item & (depth == d) & (parent >= 0)
+        if sel.any():
+            np.fmin.at(r_app, parent[sel], r_app[sel])
+            np.fmax.at(r_imp, parent[sel], r_imp[sel])
+
+    group_app = np.where(has_direct, d_app, r_app)
+    group_imp = np.where(has_direct, d_imp, r_imp)
+    return np.where(is_item, app, group_app), np.where(is_item, imp, group_imp)
+
+
+def _level_value(v: float):
+    if math.isnan(v):
+        return None
+    return int(v) if v.is_integer() else v
+
+
+def score_batch(datas: list[dict]) -> list[dict]:
+    """
+    Puntajes de varios documentos (ya desenvueltos: data con nodes/scales/priorityLevels)
+    en una sola pasada vectorizada. Por documento devuelve columnas alineadas con data["nodes"]:
+    severity, prioridad, nivel_aplicacion, nivel_importancia, y además codigo y parent
+    (normalizados), tipo, item (es ÍTEM) y respondido (ÍTEM con VC elegido).
+    """
+    b = _Batch()
+    for data in datas:
+        b.add(data if isinstance(data, dict) else {})
+
+    counts = np.diff(np.array(b.offsets, dtype=np.int64))
+    fidx = np.repeat(np.arange(len(datas)), counts)
+
+    sev = _severity(b, fidx)
+    prio = _priorities(b, fidx, sev)
+    app, imp = _rollup(b)
+
+    sev_l, prio_l, app_l, imp_l = sev.tolist(), prio.tolist(), app.tolist(), imp.tolist()
+    out = []
+    for a, z in zip(b.offsets, b.offsets[1:]):
+        out.append(
+            {
+                "severity": sev_l[a:z],
+                "prioridad": prio_l[a:z],
+                "nivel_aplicacion": [_level_value(v) for v in app_l[a:z]],
+                "nivel_importancia": [_level_value(v) for v in imp_l[a:z]],
+                "codigo": b.codes[a:z],
+                "parent": b.parent_codes[a:z],
+                "tipo": b.types[a:z],
+                "item": b.is_item[a:z],
+                "respondido": b.answered[a:z],
+            }
+        )
+    return out
+
+
+def score_data(data: dict) -> dict:
+    return score_batch([data])[0]
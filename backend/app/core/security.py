@@ -1,9 +1,19 @@
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from passlib.context import CryptContext
-from app.core.config import JWT_SECRET, JWT_ALG, JWT_EXPIRE_MINUTES
+from app.core.config import BCRYPT_ROUNDS, JWT_SECRET, JWT_ALG, JWT_EXPIRE_MINUTES
 
-_pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max = costo actual: un hash con otro costo "necesita actualizarse" (ver verify_and_update)
+_pwd = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# hash_password / verify_password / verify_and_update son CPU pura: las rutas las corren
+# en core/password_pool
 
 def hash_password(password: str) -> str:
     return _pwd.hash(password)
@@ -11,6 +21,10 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return _pwd.verify(password, password_hash)
 
+def verify_and_update(password: str, password_hash: str) -> tuple[bool, str | None]:
+    # (válida, hash nuevo si el guardado usa otros parámetros)
+    return _pwd.verify_and_update(password, password_hash)
+
 def create_access_token(subject: str) -> str:
     now = datetime.now(timezone.utc)
     exp = now + timedelta(minutes=JWT_EXPIRE_MINUTES)
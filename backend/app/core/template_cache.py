@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import TEMPLATE_CACHE_MAX_BYTES, TEMPLATE_CACHE_MAX_ENTRIES
+from app.core.json_response import dumps_compact
+from app.models.template import Template
+
+# Cache de plantillas por (template_id, version): la estructura ya desenvuelta (data de
+# file_json), su JSON compacto en UTF-8 y el largo. Crear un archivo pasa a ser concatenar
+# bytes en vez de deepcopy + json.dumps. LRU acotado por bytes y por cantidad de entradas.
+# Un UPDATE/DELETE de Template por el ORM invalida sus entradas al commitear.
+#
+# snapshot=True: entradas leídas de template_versions (la copia inmutable, base de los deltas;
+# ver core/file_store). Van aparte de las de templates.template_json: si la plantilla cambia sin
+# subir la versión, un delta se arma igual con el cache frío o caliente.
+
+
+@dataclass(frozen=True)
+class TemplateEntry:
+    data: Any  # compartida entre requests: no mutar
+    data_bytes: bytes
+    size: int
+
+
+_entries: "OrderedDict[tuple, TemplateEntry]" = OrderedDict()
+_bytes = 0
+_lock = threading.Lock()
+
+
+def unwrap_template_json(tj):
+    if not isinstance(tj, dict):
+        return {}
+
+    if "template" in tj and "data" in tj and isinstance(tj["data"], dict):
+        return tj["data"]
+
+    if "data" in tj and isinstance(tj["data"], dict) and (
+        "columns" in tj["data"] or "nodes" in tj["data"] or "meta" in tj["data"]
+    ):
+        return tj["data"]
+
+    # Caso ideal: ya viene plano (ui/meta/columns/nodes)
+    return tj
+
+
+def get(template_id, version, snapshot: bool = False) -> TemplateEntry | None:
+    key = (template_id, version, snapshot)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+        return entry
+
+
+def put(template_id, version, template_json, snapshot: bool = False) -> TemplateEntry:
+    """
+    Desenvuelve y serializa `template_json` (CPU: llamar fuera del event loop) y lo cachea.
+    """
+    global _bytes
+    data = unwrap_template_json(template_json)
+    data_bytes = dumps_compact(data).encode("utf-8")
+    entry = TemplateEntry(data=data, data_bytes=data_bytes, size=len(data_bytes))
+
+    if entry.size > TEMPLATE_CACHE_MAX_BYTES:
+        return entry
+
+    key = (template_id, version, snapshot)
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _bytes -= old.size
+        _entries[key] = entry
+        _bytes += entry.size
+        while _entries and (_bytes > TEMPLATE_CACHE_MAX_BYTES or len(_entries) > TEMPLATE_CACHE_MAX_ENTRIES):
+            _, evicted = _entries.popitem(last=False)
+            _bytes -= evicted.size
+    return entry
+
+
+def invalidate(template_id) -> None:
+    global _bytes
+    with _lock:
+        # las copias de template_versions no cambian
+        for key in [k for k in _entries if k[0] == template_id and not k[2]]:
+            _bytes -= _entries.pop(key).size
+
+
+def clear() -> None:
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+
+# ----- invalidación automática (mismo esquema que auth_cache) -----
+
+
+def _track(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("template_cache_dirty", set()).add(target.id)
+    else:
+        invalidate(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    for template_id in session.info.pop("template_cache_dirty", ()):
+        invalidate(template_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction) -> None:
+    session.info.pop("template_cache_dirty", None)
+
+
+event.listen(Template, "after_update", _track)
+event.listen(Template, "after_delete", _track)
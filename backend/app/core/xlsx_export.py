@@ -0,0 +1,407 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+
+from app.core import scoring
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Subir cuando cambie el contenido/estilo del XLSX generado (invalida el cache de exportaciones)
+EXPORTER_VERSION = "3"
+
+_HEADER_FILL = PatternFill("solid", fgColor="F3F4F6")
+_HEADER_FONT = Font(bold=True)
+_WRAP_TOP = Alignment(wrap_text=True, vertical="top")
+
+PROGRESS_EVERY = 500
+
+CHECKLIST_KEYS = [
+    "codigo",
+    "agrupacion_en",
+    "descripcion",
+    "observaciones",
+    "nivel_aplicacion",
+    "nivel_importancia",
+    "prioridad",
+]
+
+
+def _header_row(ws, headers):
+    row = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = _HEADER_FONT
+        cell.fill = _HEADER_FILL
+        cell.alignment = _WRAP_TOP
+        row.append(cell)
+    return row
+
+
+def _wrapped(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.alignment = _WRAP_TOP
+    return cell
+
+
+def _set_widths(ws, widths: dict):
+    # en modo write-only las dimensiones deben fijarse antes de escribir filas
+    for col, width in widths.items():
+        ws.column_dimensions[col].width = width
+
+
+# helper para normalizar nombres de clave (quita acentos y caracteres no ascii, lower)
+def norm_str(s):
+    if s is None:
+        return ""
+    s = str(s)
+    nk = unicodedata.normalize("NFD", s)
+    nk = nk.encode("ascii", "ignore").decode("ascii")
+    nk = re.sub(r"\s+", "", nk).lower()
+    nk = re.sub(r"[^a-z0-9_]", "", nk)  # conservamos guiones bajos por si acaso
+    return nk
+
+
+def _label_by_value(scale) -> dict:
+    out = {}
+    for s in scale or []:
+        try:
+            v = float(s.get("value"))
+        except Exception:
+            continue
+        out[v] = s.get("label") or ""
+    return out
+
+
+# ----- Plan de columnas compilado -----
+#
+# Los nodos de un mismo archivo (y de una misma versión de plantilla) comparten el
+# mismo layout de claves, así que los lookups tolerantes (exacto/lower/upper/normalizado)
+# y los fallbacks se resuelven una sola vez por layout. Cada fila queda reducida a
+# lecturas directas de campos + lookup de labels de escala.
+
+_TOP = 0
+_CUSTOM = 1
+
+_AGRUP_CANDIDATES = [
+    "agrupacion",
+    "agrupacion_es",
+    "agrupacion_en",
+    "agrupación",
+    "agrupación_es",
+    "agrupación_en",
+]
+
+PLAN_CACHE_MAX_TEMPLATES = 64
+PLAN_CACHE_MAX_LAYOUTS = 32
+
+_plan_cache: OrderedDict = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def _column_candidates(colk) -> list[str]:
+    c0 = str(colk or "")
+    cand_list = [c0, c0.lower(), c0.upper(), norm_str(c0)]
+
+    # heurísticos adicionales: si la columna suena a 'agrup' probar variaciones
+    nk = norm_str(c0)
+    if nk and ("agrup" in nk or "agrupa" in nk or "agr" in nk):
+        cand_list += _AGRUP_CANDIDATES
+    return cand_list
+
+
+def _column_fallback(colk) -> tuple:
+    """
+    Propiedades estándar del nodo a probar (en orden, primera truthy) cuando
+    la columna no se encontró en el nodo o su valor es None.
+    """
+    nk = norm_str(str(colk or ""))
+    if nk in ("codigo", "code", "cod"):
+        return ("code", "codigo")
+    if "agrup" in nk:
+        return ("agrupacion_en", "title")
+    if "desc" in nk or "descrip" in nk:
+        return ("desc", "descripcion", "observaciones")
+    if "observ" in nk:
+        return ("observaciones", "obs")
+    if "nivelaplicacion" in nk:
+        return ("nivel_aplicacion",)
+    if "nivelimportancia" in nk:
+        return ("nivel_importancia",)
+    if nk in ("prioridad",):
+        return ("prioridad",)
+    return ()
+
+
+def _column_scale(colk):
+    # Para nivel_aplicacion / nivel_importancia queremos label, no número
+    col_norm = norm_str(colk)
+    if col_norm in ("nivel_aplicacion", "nivelaplicacion"):
+        return "VC"
+    if col_norm in ("nivel_importancia", "nivelimportancia"):
+        return "VI"
+    return None
+
+
+def _score_field(colk):
+    # columnas que salen del motor de puntajes y no de lo guardado en el nodo
+    nk = norm_str(str(colk or ""))
+    if "nivelaplicacion" in nk:
+        return "nivel_aplicacion"
+    if "nivelimportancia" in nk:
+        return "nivel_importancia"
+    if nk == "prioridad":
+        return "prioridad"
+    return None
+
+
+def _node_layout(r: dict) -> tuple:
+    custom = r.get("custom") or {}
+    return tuple(r), (tuple(custom) if isinstance(custom, dict) else ())
+
+
+def _compile_plan(keys: tuple, layout: tuple) -> list[tuple]:
+    top_keys, custom_keys = layout
+
+    # flat: top-level first, luego custom (custom sobrescribe y conserva la posición)
+    flat = {}
+    for kk in top_keys:
+        if kk == "custom":
+            continue
+        flat[str(kk)] = (_TOP, kk)
+    for kk in custom_keys:
+        flat[str(kk)] = (_CUSTOM, kk)
+
+    # índices auxiliares: ante colisiones gana la última clave, igual que un dict por comprensión
+    flat_lower = {k.lower(): v for k, v in flat.items()}
+    flat_upper = {k.upper(): v for k, v in flat.items()}
+    flat_norm = {norm_str(k): v for k, v in flat.items()}
+
+    plan = []
+    for colk in keys:
+        src = None
+        for c in _column_candidates(colk):
+            src = flat.get(c) or flat_lower.get(c) or flat_upper.get(c) or flat_norm.get(c)
+            if src:
+                break
+        plan.append((src, _column_fallback(colk), _column_scale(colk)))
+    return plan
+
+
+def _plans_for(tpl_key) -> dict:
+    with _plan_lock:
+        plans = _plan_cache.get(tpl_key)
+        if plans is None:
+            plans = _plan_cache[tpl_key] = {}
+            while len(_plan_cache) > PLAN_CACHE_MAX_TEMPLATES:
+                _plan_cache.popitem(last=False)
+        else:
+            _plan_cache.move_to_end(tpl_key)
+        return plans
+
+
+def _get_plan(plans: dict, keys: tuple, layout: tuple) -> list[tuple]:
+    ck = (keys, layout)
+    plan = plans.get(ck)
+    if plan is None:
+        plan = _compile_plan(keys, layout)
+        if len(plans) >= PLAN_CACHE_MAX_LAYOUTS:
+            plans.clear()
+        plans[ck] = plan
+    return plan
+
+
+def iter_checklist_rows(data: dict, keys: list[str], tpl_key=None, scores: dict | None = None):
+    """
+    Genera las filas de la hoja Checklist (una por nodo) sin materializarlas todas.
+    El mapeo nodo -> columnas se compila por layout de claves y se cachea por
+    (template id, version) en `tpl_key`.
+    Con `scores` (scoring.score_data(data)) nivel_aplicacion / nivel_importancia /
+    prioridad salen de lo calculado en vez de lo guardado en el nodo.
+    """
+    nodes = data.get("nodes") or []
+    if not isinstance(nodes, list):
+        return
+
+    # Construimos mapas valor -> label para VI/VC a partir de data.scales
+    scales = data.get("scales") or {}
+    labels = {
+        "VI": _label_by_value(scales.get("VI")),
+        "VC": _label_by_value(scales.get("VC")),
+    }
+
+    keys = tuple(keys)
+    plans = _plans_for(tpl_key)
+    last_layout, plan = None, None
+    computed = [scores[f] if scores and f else None for f in map(_score_field, keys)]
+
+    for idx, r in enumerate(nodes):
+        r = r or {}
+        layout = _node_layout(r)
+        if layout != last_layout:
+            plan = _get_plan(plans, keys, layout)
+            last_layout = layout
+
+        row = []
+        for (src, fallback, scale), col in zip(plan, computed):
+            val = None
+            if col is not None:
+                val = col[idx]
+            elif src is not None:
+                where, kk = src
+                val = r[kk] if where == _TOP else r["custom"][kk]
+
+            if val is None and col is None:
+                for fk in fallback:
+                    val = r.get(fk)
+                    if val:
+                        break
+
+            # default a cadena vacía si todavía None
+            if val is None:
+                val = ""
+
+            if scale is not None:
+                try:
+                    num = float(val)
+                    if num in labels[scale]:
+                        val = labels[scale][num]
+                except Exception:
+                    pass
+
+            # serializar dict/list para que openpyxl no falle
+            if isinstance(val, (dict, list)):
+                try:
+                    val = json.dumps(val, ensure_ascii=False)
+                except Exception:
+                    val = str(val)
+
+            row.append(val)
+
+        yield row
+
+
+def _checklist_widths(headers, types) -> tuple[dict, list[bool]]:
+    widths, wrap = {}, []
+    for idx, (h, t) in enumerate(zip(headers, types), start=1):
+        width = 14
+        hlow = (h or "").lower()
+
+        if t in ("longtext",):
+            width = 90
+        elif t in ("text",):
+            width = 40
+        elif "descrip" in hlow:
+            width = 90
+        elif "observ" in hlow:
+            width = 60
+        elif "agrup" in hlow:
+            width = 30
+
+        widths[get_column_letter(idx)] = width
+        wrap.append(t in ("longtext",) or ("descrip" in hlow) or ("observ" in hlow) or ("justif" in hlow))
+    return widths, wrap
+
+
+def _write_two_col_sheet(wb, title, headers, rows, widths):
+    ws = wb.create_sheet(title)
+    _set_widths(ws, widths)
+    ws.append(_header_row(ws, headers))
+    for a, b in rows:
+        ws.append([a, _wrapped(ws, b)])
+    return ws
+
+
+def build_file_xlsx(f, fp, progress=None) -> None:
+    """
+    Escribe el XLSX de un archivo en `fp` (ruta o file-like con seek) usando un
+    workbook write-only: las filas se serializan a medida que se generan, así que
+    la memoria no crece con el número de nodos.
+
+    `f` solo necesita los atributos id, code, name, created_at, updated_at y file_json.
+    `progress`, si se pasa, recibe la fracción (0..1) de nodos escritos cada PROGRESS_EVERY filas.
+    """
+    file_json = f.file_json or {}
+    data = (file_json.get("data") or {}) if isinstance(file_json, dict) else {}
+    tpl = (file_json.get("template") or {}) if isinstance(file_json, dict) else {}
+    if not isinstance(data, dict):
+        data = {}
+
+    columns = data.get("columns") or []
+    intro = data.get("intro") or []
+    meta = data.get("meta") or {}
+    questions = data.get("questions") or {}
+
+    wb = Workbook(write_only=True)
+
+    # ----- Checklist -----
+    ws = wb.create_sheet("Checklist")
+
+    keys = list(CHECKLIST_KEYS)
+    headers = list(CHECKLIST_KEYS)
+    types = [""] * len(keys)
+
+    widths, wrap = _checklist_widths(headers, types)
+    _set_widths(ws, widths)
+    ws.freeze_panes = "A2"
+
+    ws.append(_header_row(ws, headers))
+    n_rows = 1
+    wrap_idx = [i for i, w in enumerate(wrap) if w]
+    tpl_key = (str(tpl.get("id", "") or ""), str(tpl.get("version", "") or ""))
+    nodes = data.get("nodes")
+    total = len(nodes) if isinstance(nodes, list) else 0
+    scores = scoring.score_data(data) if isinstance(nodes, list) else None
+    for row in iter_checklist_rows(data, keys, tpl_key, scores):
+        for i in wrap_idx:
+            row[i] = _wrapped(ws, row[i])
+        ws.append(row)
+        n_rows += 1
+        if progress is not None and (n_rows - 1) % PROGRESS_EVERY == 0:
+            progress((n_rows - 1) / total)
+
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(keys))}{n_rows}"
+
+    # ----- Meta -----
+    meta_rows = {
+        "file_id": str(getattr(f, "id", "") or ""),
+        "file_code": getattr(f, "code", "") or "",
+        "file_name": getattr(f, "name", "") or "",
+        "created_at": str(getattr(f, "created_at", "") or ""),
+        "updated_at": str(getattr(f, "updated_at", "") or ""),
+        "template_id": str(tpl.get("id", "") or ""),
+        "template_code": str(tpl.get("code", "") or ""),
+        "template_version": str(tpl.get("version", "") or ""),
+    }
+
+    def _meta_rows():
+        yield from meta_rows.items()
+        yield "", ""
+        if isinstance(meta, dict):
+            yield from meta.items()
+
+    _write_two_col_sheet(wb, "Meta", ["Campo", "Valor"], _meta_rows(), {"A": 28, "B": 100})
+
+    # ----- Preguntas -----
+    q_rows = questions.items() if isinstance(questions, dict) else []
+    _write_two_col_sheet(wb, "Preguntas", ["Key", "Text"], q_rows, {"A": 30, "B": 110})
+
+    # ----- Intro -----
+    i_rows = enumerate(intro, start=1) if isinstance(intro, list) else []
+    _write_two_col_sheet(wb, "Intro", ["Index", "Text"], i_rows, {"A": 10, "B": 110})
+
+    # ----- Columnas -----
+    ws_c = wb.create_sheet("Columnas")
+    _set_widths(ws_c, {"A": 14, "B": 70, "C": 18})
+    ws_c.append(_header_row(ws_c, ["key", "label", "type"]))
+    for c in columns or []:
+        ws_c.append([c.get("key", ""), c.get("label", ""), c.get("type", "")])
+
+    wb.save(fp)
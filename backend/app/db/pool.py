@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import (
+    DB_LOCK_TIMEOUT_MS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PING_IDLE_SECONDS,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+
+# Configuración e instrumentación del pool de conexiones.
+# Cada engine usa su propia subclase del pool con un PoolStats de clase (Pool.recreate()
+# instancia self.__class__, así las métricas sobreviven a un dispose()).
+
+_RECENT = 1024
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.invalidations = 0
+        self._latency = deque(maxlen=_RECENT)
+
+    def record_checkout(self, elapsed: float, waited: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._latency.append(elapsed)
+            if waited:
+                self.waits += 1
+                self.wait_total += elapsed
+                self.wait_max = max(self.wait_max, elapsed)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latency)
+            out = {
+                "checkouts": self.checkouts,
+                "waited": self.waits,
+                "wait_ms_avg": round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "timeouts": self.timeouts,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "invalidations": self.invalidations,
+            }
+        out["checkout_ms"] = {
+            "samples": len(lat),
+            "p50": round(lat[len(lat) // 2] * 1000, 3) if lat else 0.0,
+            "p95": round(lat[int(len(lat) * 0.95)] * 1000, 3) if lat else 0.0,
+            "max": round(lat[-1] * 1000, 3) if lat else 0.0,
+        }
+        return out
+
+
+def _instrumented(base):
+    class _Pool(base):
+        stats = PoolStats()
+
+        def connect(self):
+            # si no queda conexión libre ni overflow disponible, el checkout va a esperar
+            waited = self.checkedout() >= self.size() + max(self._max_overflow, 0)
+            start = time.perf_counter()
+            try:
+                conn = super().connect()
+            except PoolTimeoutError:
+                self.stats.incr("timeouts")
+                raise
+            self.stats.record_checkout(time.perf_counter() - start, waited)
+            return conn
+
+    _Pool.__name__ = f"Instrumented{base.__name__}"
+    return _Pool
+
+
+def install(engine) -> None:
+    """
+    Listeners del pool del engine (sync, o el sync_engine de un AsyncEngine).
+    Pool.recreate() conserva el dispatch, así que sobreviven a un dispose().
+    """
+    pool = engine.pool
+    stats = pool.stats
+
+    @event.listens_for(pool, "invalidate")
+    def _invalidate(dbapi_conn, record, exc):
+        stats.incr("invalidations")
+
+    if DB_POOL_PRE_PING != "idle":
+        return
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_conn, record):
+        record.info["checkin_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        last = record.info.get("checkin_at")
+        if last is None or time.monotonic() - last < DB_POOL_PING_IDLE_SECONDS:
+            return
+        stats.incr("pings")
+        try:
+            cur = dbapi_conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+        except Exception:
+            # el pool descarta la conexión y reintenta con una nueva
+            stats.incr("ping_failures")
+            raise DisconnectionError()
+
+
+def _connect_args() -> dict:
+    opts = []
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        opts.append(f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+    if DB_LOCK_TIMEOUT_MS > 0:
+        opts.append(f"-c lock_timeout={DB_LOCK_TIMEOUT_MS}")
+    return {"options": " ".join(opts)} if opts else {}
+
+
+def engine_options(is_async: bool = False) -> dict:
+    """
+    kwargs para create_engine / create_async_engine según config.py.
+    """
+    return {
+        "poolclass": _instrumented(AsyncAdaptedQueuePool if is_async else QueuePool),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING == "always",
+        "connect_args": _connect_args(),
+    }
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    out = {
+        "pool_class": pool.__class__.__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pre_ping": DB_POOL_PRE_PING,
+    }
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        out.update(stats.snapshot())
+    return out
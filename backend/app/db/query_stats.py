@@ -0,0 +1,70 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+from app.core.config import DB_SLOW_QUERY_MS
+
+# Conteo de consultas y tiempo en la base por request.
+# El middleware de métricas abre un QueryStats en un ContextVar; los eventos del engine
+# lo actualizan (el contexto llega a run_in_threadpool y a los greenlets de SQLAlchemy async).
+# Fuera de un request (dispatcher de exportaciones, seed) solo aplica el log de consultas lentas.
+
+log = logging.getLogger("app.db.slow")
+
+_PARAMS_MAX = 500
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def begin():
+    return _current.set(QueryStats())
+
+
+def end(token) -> QueryStats:
+    stats = _current.get()
+    _current.reset(token)
+    return stats
+
+
+def current() -> QueryStats | None:
+    return _current.get()
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+    if DB_SLOW_QUERY_MS > 0 and elapsed * 1000 >= DB_SLOW_QUERY_MS:
+        params = repr(parameters)
+        if len(params) > _PARAMS_MAX:
+            params = params[:_PARAMS_MAX] + "..."
+        log.warning(
+            "slow query %.1f ms%s: %s | params=%s",
+            elapsed * 1000,
+            " (executemany)" if executemany else "",
+            " ".join(statement.split()),
+            params,
+        )
+
+
+def install(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
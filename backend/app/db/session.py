@@ -1,11 +1,24 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import DATABASE_URL
+from app.db import pool, query_stats
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# tamaño del pool, pre-ping y timeouts: ver app.db.pool / config.py
+engine = create_engine(DATABASE_URL, **pool.engine_options())
+pool.install(engine)
+query_stats.install(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor async (psycopg async, misma URL) para las rutas async def.
+# expire_on_commit=False: en async no se puede recargar un atributo vencido de forma implícita.
+async_engine = create_async_engine(DATABASE_URL, **pool.engine_options(is_async=True))
+pool.install(async_engine.sync_engine)
+query_stats.install(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,3 +27,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
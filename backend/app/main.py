@@ -1,10 +1,23 @@
-from fastapi import FastAPI
+import asyncio
+import sys
+
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
-from app.db.session import engine, SessionLocal
+from app.db.session import engine, async_engine, SessionLocal
+from app.db.pool import pool_status
+from app.api.deps import get_current_user
 from app.api.router import api_router
 from app.db.seed import ensure_base_template
 from app.api.routes import admin 
+from app.core.export_pool import shutdown_pool
+from app.core import compression, export_jobs, metrics, password_pool
+from app.core.config import COMPRESS_ENABLED, EXPORT_JOBS_ENABLED
+
+# psycopg async no funciona con el ProactorEventLoop por defecto de Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 app = FastAPI(title="Catty MVP API")
 
@@ -19,17 +32,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# dentro de las métricas: http_response_size_bytes mide lo que sale comprimido
+if COMPRESS_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+app.add_middleware(metrics.MetricsMiddleware, router=app.router)
+
 
 app.include_router(api_router)
 app.include_router(admin.router)
 
 
+@app.on_event("startup")
+def _start_export_jobs():
+    if EXPORT_JOBS_ENABLED:
+        export_jobs.start_dispatcher()
+
+
+@app.on_event("shutdown")
+async def _shutdown_export_pool():
+    export_jobs.stop_dispatcher()
+    shutdown_pool()
+    password_pool.shutdown_pool()
+    await async_engine.dispose()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/db-check")
 def db_check():
     with engine.connect() as conn:
         dbname = conn.execute(text("SELECT current_database()")).scalar_one()
     return {"db": dbname}
+
+@app.get("/db-pool")
+def db_pool(current_user=Depends(get_current_user)):
+    # estado en vivo de los pools de este proceso (solo admin)
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes permisos de administrador")
+    return {
+        "sync": pool_status(engine),
+        "async": pool_status(async_engine.sync_engine),
+    }
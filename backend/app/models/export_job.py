@@ -0,0 +1,33 @@
+import uuid
+from sqlalchemy import Column, Text, Integer, BigInteger, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    file_id = Column(UUID(as_uuid=True), nullable=False)
+    owner_id = Column(UUID(as_uuid=True), nullable=False)
+
+    # queued | running | done | failed | expired
+    status = Column(Text, nullable=False, default="queued")
+    progress = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    artifact_path = Column(Text, nullable=True)
+    size_bytes = Column(BigInteger, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    # lo renueva el worker mientras corre (ver core/export_jobs)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_export_jobs_status_created_at", "status", "created_at"),
+    )
@@ -1,6 +1,7 @@
 import uuid
-from sqlalchemy import Column, Text, Boolean, BigInteger, DateTime
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, Text, Boolean, BigInteger, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.db.session import Base
 
@@ -22,8 +23,26 @@ class File(Base):
     share_enabled = Column(Boolean, nullable=False, default=True)
 
     file_json = Column(JSONB, nullable=False)
+    # full: file_json es el documento; delta: {"template": {...}, "delta": ...} (ver core/file_store)
+    storage = Column(Text, nullable=False, default="full", server_default="full")
     size_bytes = Column(BigInteger, nullable=False, default=0)
 
     last_opened_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    # sube en cada guardado; es el ETag del documento (If-Match / If-None-Match)
+    revision = Column(BigInteger, nullable=False, default=1, server_default="1")
+
+    # la escribe core/file_search con el resumen del archivo; diferida para no traerla con el archivo
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+    __table_args__ = (
+        # listado paginado por keyset: owner_id = ? ORDER BY updated_at DESC, id DESC
+        Index("ix_files_owner_updated_at", owner_id, updated_at.desc(), id.desc()),
+        Index("ix_files_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    # el flush del ORM hace UPDATE ... WHERE revision = <leída> y la incrementa;
+    # si otro guardado ganó la carrera levanta StaleDataError
+    __mapper_args__ = {"version_id_col": revision}
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Text, Float, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.session import Base
+
+
+class FileNode(Base):
+    # proyección relacional de los nodos de file_json (ver core/file_nodes); file_json sigue
+    # siendo la fuente de verdad
+    __tablename__ = "file_nodes"
+
+    file_id = Column(UUID(as_uuid=True), primary_key=True)
+    # "id" del nodo como texto (los ids numéricos, en JSON: 5 -> "5")
+    node_id = Column(Text, primary_key=True)
+
+    # JSON Pointer del nodo dentro de file_json (/data/nodes/17): editar un nodo no exige leer el documento
+    pointer = Column(Text, nullable=False)
+
+    parent_id = Column(Text, nullable=True)
+    codigo = Column(Text, nullable=True)
+    tipo = Column(Text, nullable=False)
+    nivel_aplicacion = Column(Float, nullable=True)
+    nivel_importancia = Column(Float, nullable=True)
+    prioridad = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # hijos de un nodo: file_id = ? AND parent_id = ?
+        Index("ix_file_nodes_file_parent", file_id, parent_id),
+        # búsquedas entre archivos por código o prioridad
+        Index("ix_file_nodes_codigo", codigo),
+        Index("ix_file_nodes_prioridad", prioridad),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class FileSummary(Base):
+    # puntajes por nodo de cada archivo, para agregar en SQL sin leer file_json (ver core/file_summary)
+    __tablename__ = "file_summaries"
+
+    # sin FK a propósito: al borrar un archivo hay que restar su aporte de template_node_stats,
+    # así que la fila se borra desde file_summary.remove (o la poda al consultar analíticas)
+    file_id = Column(UUID(as_uuid=True), primary_key=True)
+    template_id = Column(UUID(as_uuid=True), nullable=False)
+    owner_id = Column(UUID(as_uuid=True), nullable=False)
+    # revisión del archivo con la que se calculó; si difiere de files.revision está vencido
+    revision = Column(BigInteger, nullable=False)
+
+    node_count = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    answered_count = Column(Integer, nullable=False, default=0)
+
+    # [{"codigo", "item", "respondido", "nivel_aplicacion", "nivel_importancia", "prioridad"}]
+    nodes = Column(JSONB, nullable=False)
+
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("ix_file_summaries_template_owner", template_id, owner_id),)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Text, Boolean, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.session import Base
+
+
+class TemplateNodeStat(Base):
+    # conteo de nodos por combinación de valores, por plantilla y dueño; se mantiene sumando
+    # y restando al escribir file_summaries (ver core/file_summary). "" = sin valor.
+    __tablename__ = "template_node_stats"
+
+    template_id = Column(UUID(as_uuid=True), primary_key=True)
+    owner_id = Column(UUID(as_uuid=True), primary_key=True)
+    codigo = Column(Text, primary_key=True)
+    item = Column(Boolean, primary_key=True)
+    respondido = Column(Boolean, primary_key=True)
+    nivel_aplicacion = Column(Text, primary_key=True)
+    nivel_importancia = Column(Text, primary_key=True)
+    prioridad = Column(Text, primary_key=True)
+
+    n = Column(BigInteger, nullable=False, default=0)
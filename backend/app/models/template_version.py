@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class TemplateVersion(Base):
+    # copia inmutable de template_json por versión: base de los archivos guardados como delta
+    __tablename__ = "template_versions"
+
+    template_id = Column(UUID(as_uuid=True), primary_key=True)
+    version = Column(Integer, primary_key=True)
+
+    template_json = Column(JSONB, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
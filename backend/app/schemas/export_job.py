@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from uuid import UUID
+from datetime import datetime
+from typing import Optional
+
+
+class ExportJobCreateIn(BaseModel):
+    # id (UUID) o código del archivo
+    file_id: str
+
+
+class ExportJobOut(BaseModel):
+    id: UUID
+    file_id: UUID
+    status: str
+    progress: int
+    error: Optional[str] = None
+    size_bytes: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,13 +1,19 @@
 from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
-from typing import Optional, Any, Dict
+from typing import Annotated, Optional, Any, Dict
 
 class FileCreateIn(BaseModel):
     name: str = Field(min_length=1, max_length=120)
     template_id: UUID
     is_public: bool = False
 
+class FileBulkCreateIn(BaseModel):
+    # un archivo por nombre, todos desde la misma plantilla
+    template_id: UUID
+    names: list[Annotated[str, Field(min_length=1, max_length=120)]] = Field(min_length=1)
+    is_public: bool = False
+
 class FileListOut(BaseModel):
     id: UUID
     code: str
@@ -19,7 +25,13 @@ class FileListOut(BaseModel):
     class Config:
         from_attributes = True
 
-class FileOut(BaseModel):
+class FilePageOut(BaseModel):
+    items: list[FileListOut]
+    # cursor opaco para pedir la página siguiente (None = no hay más)
+    next_cursor: Optional[str] = None
+
+class FileMetaOut(BaseModel):
+    # FileOut sin el documento: las rutas lo validan y pegan file_json ya serializado
     id: UUID
     code: str
     name: str
@@ -29,8 +41,8 @@ class FileOut(BaseModel):
     share_token: str
     share_enabled: bool
 
-    file_json: Any
     size_bytes: int
+    revision: int
     last_opened_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
@@ -38,6 +50,88 @@ class FileOut(BaseModel):
     class Config:
         from_attributes = True
 
+class FileOut(FileMetaOut):
+    file_json: Any
+
+class FileSubtreeMetaOut(BaseModel):
+    # GET /files/{id}/nodes sin los nodos: la ruta pega el array ya serializado
+    id: UUID
+    revision: int
+    parent_id: Optional[str] = None
+    depth: int
+
+class FileSubtreeOut(FileSubtreeMetaOut):
+    nodes: list[Any]
+
+class FileSaveOut(BaseModel):
+    # respuesta de PATCH con JSON Patch / merge patch (sin el documento)
+    id: UUID
+    code: str
+    size_bytes: int
+    revision: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class FileUpdateIn(BaseModel):
     file_json: Dict[str, Any] | None = None
-    data: Dict[str, Any] | None = None
\ No newline at end of file
+    data: Dict[str, Any] | None = None
+
+class FileBulkExportIn(BaseModel):
+    # ids (UUID) o códigos (F-XXXXXX), mezclados
+    files: list[str] = Field(min_length=1)
+
+class NodeScoreOut(BaseModel):
+    id: Any = None
+    codigo: Optional[str] = None
+    severity: int
+    prioridad: str
+    nivel_aplicacion: Optional[float] = None
+    nivel_importancia: Optional[float] = None
+
+class FileScoresOut(BaseModel):
+    file_id: UUID
+    code: str
+    revision: int
+    # nodos por prioridad (sin los que no caen en ningún nivel)
+    priorities: Dict[str, int]
+    nodes: list[NodeScoreOut]
+
+class FileScoresBatchIn(BaseModel):
+    # ids (UUID) o códigos (F-XXXXXX), mezclados
+    files: list[str] = Field(min_length=1)
+
+class FileScoreSummaryOut(BaseModel):
+    file_id: UUID
+    code: str
+    revision: int
+    nodes: int
+    priorities: Dict[str, int]
+
+class FileNodeOut(BaseModel):
+    # fila de file_nodes (GET /files/nodes)
+    file_id: UUID
+    file_code: str
+    node_id: str
+    parent_id: Optional[str] = None
+    codigo: Optional[str] = None
+    tipo: str
+    nivel_aplicacion: Optional[float] = None
+    nivel_importancia: Optional[float] = None
+    prioridad: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class FileSearchOut(BaseModel):
+    # resultado de GET /files/search, de mayor a menor rank
+    id: UUID
+    code: str
+    name: str
+    template_id: UUID
+    updated_at: datetime
+    rank: float
+
+    class Config:
+        from_attributes = True
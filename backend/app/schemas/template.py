@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -18,3 +18,31 @@ class TemplateOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class NodeAnalyticsOut(BaseModel):
+    codigo: Optional[str] = None
+    item: bool
+    count: int
+    respondidos: int
+    completion_rate: Optional[float] = None
+    # valor del nivel -> cantidad de archivos
+    nivel_aplicacion: Dict[str, int]
+    nivel_importancia: Dict[str, int]
+    nivel_aplicacion_avg: Optional[float] = None
+    nivel_importancia_avg: Optional[float] = None
+    priorities: Dict[str, int]
+
+
+class TemplateAnalyticsOut(BaseModel):
+    template_id: UUID
+    files: int
+    complete_files: int
+    items: int
+    answered: int
+    completion_rate: Optional[float] = None
+    priorities: Dict[str, int]
+    refreshed_at: Optional[datetime] = None
+    # archivos cuyo resumen se sigue recalculando en segundo plano (no cuentan todavía)
+    stale_files: int = 0
+    nodes: list[NodeAnalyticsOut]
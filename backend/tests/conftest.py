@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture
+def db():
+    # base de datos de DB_* (ver core/config); sin base, las pruebas que la usan se saltean
+    from app.db.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1"))
+    except OperationalError:
+        session.close()
+        pytest.skip("sin base de datos")
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
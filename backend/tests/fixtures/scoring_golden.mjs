@@ -0,0 +1,49 @@
+// Genera scoring_golden.json con las funciones puras del editor (src/pages/FileDetail.jsx).
+// Uso (desde la raíz del repo): node backend/tests/fixtures/scoring_golden.mjs
+import { readFileSync, writeFileSync } from "node:fs";
+import { dirname, join } from "node:path";
+import { fileURLToPath } from "node:url";
+
+const here = dirname(fileURLToPath(import.meta.url));
+const src = readFileSync(join(here, "../../../src/pages/FileDetail.jsx"), "utf8");
+
+// desde las constantes hasta editedToOriginal, sin el componente TreeNode (JSX)
+const start = src.indexOf("const TYPES =");
+const end = src.indexOf("/** Helpers escalas");
+const body = src
+  .slice(start, end)
+  .replace(/const TreeNode = memo\([\s\S]*?\n\}\);\n/, "");
+const editor = new Function(
+  `${body}\nreturn { adaptEditorPayload, normalizeNodeIds, editedToOriginal, computeSeverityPercent, DEFAULT_SCALES, DEFAULT_PRIORITY_LEVELS };`,
+)();
+
+// mismo flujo que el useEffect de carga + la exportación del editor
+function score(doc) {
+  const { scales, nodes, priorityLevels: prios } = editor.adaptEditorPayload(doc, editor.DEFAULT_SCALES);
+  const levels =
+    Array.isArray(prios) && prios.length
+      ? prios.map((p, idx) => ({
+          id: p.id || p.key || `prio_${idx}`,
+          name: p.name || p.label || `Nivel ${idx + 1}`,
+          min: Number(p.min ?? 0),
+          max: Number(p.max ?? 100),
+        }))
+      : editor.DEFAULT_PRIORITY_LEVELS;
+  let counter = 1;
+  const normalized = nodes.map((n) => editor.normalizeNodeIds(n, () => counter++));
+  const edited = { scales: scales || editor.DEFAULT_SCALES, priorityLevels: levels, nodes: normalized };
+  const out = editor.editedToOriginal(edited).nodes;
+  return {
+    codigo: out.map((n) => n.codigo),
+    parent: out.map((n) => n.parent),
+    severity: normalized.map((n) => editor.computeSeverityPercent(edited.scales, n.viKey, n.vcKey)),
+    prioridad: out.map((n) => n.prioridad),
+    nivel_aplicacion: out.map((n) => n.nivel_aplicacion),
+    nivel_importancia: out.map((n) => n.nivel_importancia),
+  };
+}
+
+const target = join(here, "scoring_golden.json");
+const golden = JSON.parse(readFileSync(target, "utf8"));
+for (const c of golden) c.expected = score(c.doc);
+writeFileSync(target, JSON.stringify(golden, null, 2) + "\n");
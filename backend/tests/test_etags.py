@@ -0,0 +1,27 @@
+from app.api.routes.files import _etag_matches, _file_etag
+from app.core.compression import encoded_etag, strip_encoding
+
+
+class _F:
+    revision = 5
+
+
+def test_each_representation_has_its_own_etag():
+    tags = {
+        _file_etag(_F()),
+        _file_etag(_F(), "fields=columns,meta"),
+        _file_etag(_F(), "nodes=;depth=1"),
+        encoded_etag(_file_etag(_F()), "gzip"),
+    }
+    assert tags == {'"r5"', '"r5;fields=columns,meta"', '"r5;nodes=;depth=1"', '"r5;gzip"'}
+    assert strip_encoding('"r5;fields=columns,meta;br"') == '"r5;fields=columns,meta"'
+    assert encoded_etag('W/"r5"', "gzip") == 'W/"r5"'
+    assert '"' not in _file_etag(_F(), 'nodes=a"b c')[1:-1]
+
+
+def test_if_none_match_with_commas_and_encodings():
+    proj = _file_etag(_F(), "fields=columns,meta")
+    assert _etag_matches(f'"x", {proj}', proj) == proj
+    assert _etag_matches('W/"r5;fields=columns,meta;gzip"', proj) == '"r5;fields=columns,meta;gzip"'
+    assert _etag_matches(proj, '"r5"') is None
+    assert _etag_matches('"r5"', proj) is None
@@ -0,0 +1,60 @@
+import time
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from app.core import export_jobs
+from app.models.export_job import ExportJob
+
+
+@pytest.fixture
+def jobs(db):
+    ExportJob.__table__.create(db.get_bind(), checkfirst=True)
+    created = []
+
+    def make(**kw):
+        job = ExportJob(file_id=uuid.uuid4(), owner_id=uuid.uuid4(), status="running", **kw)
+        db.add(job)
+        db.commit()
+        created.append(job.id)
+        return job.id
+
+    yield make
+    db.query(ExportJob).filter(ExportJob.id.in_(created)).delete(synchronize_session=False)
+    db.commit()
+
+
+def test_housekeeping_requeues_only_jobs_without_recent_heartbeat(db, jobs):
+    now = export_jobs._now()
+    started = now - timedelta(hours=2)
+    live = jobs(started_at=started, heartbeat_at=now - timedelta(seconds=5))
+    stale = jobs(started_at=started, heartbeat_at=now - timedelta(hours=1))
+    legacy = jobs(started_at=started)
+
+    export_jobs._housekeeping(db)
+    db.expire_all()
+
+    assert db.get(ExportJob, live).status == "running"
+    assert db.get(ExportJob, stale).status == "queued"
+    assert db.get(ExportJob, legacy).status == "queued"
+
+
+def test_heartbeat_beats_while_the_job_reports_nothing(db, jobs, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_JOB_HEARTBEAT_SECONDS", 0.05)
+    old = export_jobs._now() - timedelta(hours=1)
+    job_id = jobs(started_at=old, heartbeat_at=old)
+
+    stop = export_jobs._start_heartbeat(job_id)
+    try:
+        time.sleep(0.5)  # un paso largo sin progreso (carga del documento, wb.save...)
+    finally:
+        stop.set()
+    time.sleep(0.1)  # un latido en curso termina de escribir
+    db.expire_all()
+    beat = db.get(ExportJob, job_id).heartbeat_at
+    assert beat > old + timedelta(minutes=59)
+
+    time.sleep(0.2)
+    db.expire_all()
+    assert db.get(ExportJob, job_id).heartbeat_at == beat
@@ -0,0 +1,23 @@
+from app.core.file_search import texts
+
+
+def test_texts_under_each_key_at_any_depth():
+    doc = {
+        "template": {"id": "t", "version": 1},
+        "data": {
+            "meta": {"titulo": "Auditoría", "n": 3, "extra": ["a", {"b": "c"}]},
+            "nodes": [
+                {"id": 1, "descripcion": "Uno", "observaciones": None},
+                {"id": 2, "descripcion": {"meta": "anidado"}, "observaciones": "tubería\nrota"},
+            ],
+        },
+    }
+    out = texts(doc)
+    assert out["meta"] == "Auditoría\na\nc\nanidado"
+    assert out["descripcion"] == "Uno\nanidado"
+    assert out["observaciones"] == "tubería\nrota"
+
+
+def test_texts_without_matches():
+    assert texts({"data": {"nodes": []}}) == {"meta": "", "descripcion": "", "observaciones": ""}
+    assert texts("meta") == {"meta": "", "descripcion": "", "observaciones": ""}
@@ -0,0 +1,68 @@
+from app.core.file_store import apply_delta, diff
+
+
+def _round_trip(base, target):
+    node = diff(base, target)
+    return apply_delta(base, node or {"o": {}})
+
+
+def test_bool_vs_number_is_a_change():
+    base = {"aplica": 1, "respondido": 0, "nodes": [{"id": 1, "ok": True}, {"id": 2, "ok": 1}]}
+    target = {"aplica": True, "respondido": False, "nodes": [{"id": 1, "ok": 1}, {"id": 2, "ok": True}]}
+
+    assert diff({"aplica": 1}, {"aplica": True}) == {"o": {"aplica": {"=": True}}}
+    assert diff([0], [False]) == {"a": {"0": {"=": False}}}
+
+    out = _round_trip(base, target)
+    assert out["aplica"] is True
+    assert out["respondido"] is False
+    assert out["nodes"][0]["ok"] == 1 and out["nodes"][0]["ok"] is not True
+    assert out["nodes"][1]["ok"] is True
+
+
+def test_equal_documents_have_no_delta():
+    doc = {"a": [1, 2.5, None, "x", {"b": True}], "c": {"d": False}}
+    assert diff(doc, {"a": [1, 2.5, None, "x", {"b": True}], "c": {"d": False}}) is None
+    assert diff({"n": 1}, {"n": 1.0}) is None
+
+
+def test_round_trip_structure_changes():
+    base = {"keep": 1, "drop": 2, "arr": [1, 2, 3], "obj": {"x": 1}}
+    target = {"keep": 1, "arr": [1, True], "obj": {"x": 1, "y": [0]}, "new": False}
+    assert _round_trip(base, target) == target
+    assert _round_trip(target, base) == base
+
+
+class _Snapshots:
+    # sesión mínima: db.scalar(...) devuelve la copia de template_versions
+    def __init__(self, template_json):
+        self.template_json = template_json
+
+    def scalar(self, stmt):
+        assert "template_versions" in str(stmt)
+        return self.template_json
+
+
+def test_delta_base_ignores_live_template_in_cache():
+    import uuid
+
+    from app.core import file_store, template_cache
+
+    tid = uuid.uuid4()
+    header = {"id": str(tid), "code": "T", "version": 1}
+    snapshot = {"meta": {"titulo": "v1"}, "nodes": [{"id": 1, "descripcion": "a"}, {"id": 2, "descripcion": "b"}]}
+    # la plantilla cambió sin subir la versión; el alta en modo full cacheó el JSON vivo
+    live = {"meta": {"titulo": "editada"}, "nodes": [{"id": 1, "descripcion": "z"}]}
+    db = _Snapshots(snapshot)
+
+    template_cache.clear()
+    template_cache.put(tid, 1, live)
+    doc = {"template": header, "data": {**snapshot, "meta": {"titulo": "propio"}}}
+    storage, stored = file_store.encode(doc, file_store.load_base(db, header), 10**9)
+    assert storage == file_store.DELTA
+    warm = file_store.materialize(stored, file_store.load_base(db, header))
+
+    template_cache.clear()
+    cold = file_store.materialize(stored, file_store.load_base(db, header))
+    assert warm == cold == doc
+    template_cache.clear()
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from app.core.json_patch import (
+    JSON_PATCH_MEDIA_TYPE,
+    MERGE_PATCH_MEDIA_TYPE,
+    PatchError,
+    apply_json_patch,
+    to_simple_ops,
+)
+
+
+@pytest.mark.parametrize("path", ["/nodes/01", "/nodes/-1"])
+def test_indexes_rejected_by_general_path_skip_fast_path(path):
+    ops = [{"op": "replace", "path": path, "value": 1}]
+    assert to_simple_ops(JSON_PATCH_MEDIA_TYPE, ops) is None
+    with pytest.raises(PatchError):
+        apply_json_patch({"nodes": [0, 1, 2]}, ops)
+
+
+def test_test_op_is_type_strict():
+    with pytest.raises(PatchError):
+        apply_json_patch({"a": 1}, [{"op": "test", "path": "/a", "value": True}])
+    with pytest.raises(PatchError):
+        apply_json_patch({"a": [0]}, [{"op": "test", "path": "/a", "value": [False]}])
+    assert apply_json_patch({"a": 1}, [{"op": "test", "path": "/a", "value": 1}]) == {"a": 1}
+
+
+@pytest.mark.parametrize(("media_type", "patch"), [(JSON_PATCH_MEDIA_TYPE, []), (MERGE_PATCH_MEDIA_TYPE, {})])
+def test_empty_patch_is_a_noop(media_type, patch):
+    from app.api.routes.files import _apply_patch
+
+    assert to_simple_ops(media_type, patch) == []
+    # sin tocar la base ni el archivo
+    assert asyncio.run(_apply_patch(None, None, media_type, patch)) is None
@@ -0,0 +1,32 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.core.scoring import normalize_code, score_batch, score_data, unwrap_data
+
+# resultados del editor (FileDetail.jsx); se regeneran con fixtures/scoring_golden.mjs
+_GOLDEN = json.loads((Path(__file__).parent / "fixtures" / "scoring_golden.json").read_text("utf-8"))
+
+
+def _normalized(codes):
+    # el servidor devuelve códigos normalizados; el editor, tal cual vienen
+    return [normalize_code(c) or None if c is not None else None for c in codes]
+
+
+@pytest.mark.parametrize("case", _GOLDEN, ids=[c["name"] for c in _GOLDEN])
+def test_matches_editor(case):
+    got = score_data(unwrap_data(case["doc"]))
+    want = case["expected"]
+
+    assert got["codigo"] == _normalized(want["codigo"])
+    assert got["parent"] == _normalized(want["parent"])
+    for key in ("severity", "prioridad", "nivel_aplicacion", "nivel_importancia"):
+        assert got[key] == want[key], key
+
+
+def test_batch_keeps_per_file_scales_and_levels():
+    datas = [unwrap_data(c["doc"]) for c in _GOLDEN]
+    for case, got in zip(_GOLDEN, score_batch(datas)):
+        for key in ("severity", "prioridad", "nivel_aplicacion", "nivel_importancia"):
+            assert got[key] == case["expected"][key], (case["name"], key)
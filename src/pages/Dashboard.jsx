@@ -41,6 +41,9 @@ function ExcelIcon({ className }) {
   );
 }
 
+// Tamaño de página del listado (GET /files pagina por cursor)
+const PAGE_SIZE = 50;
+
 export default function Dashboard() {
   const navigate = useNavigate();
   const { user, token, setAuth } = useContext(AuthContext);
@@ -48,6 +51,8 @@ export default function Dashboard() {
   const [q, setQ] = useState("");
   const [files, setFiles] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [toast, setToast] = useState("");
   const [busyDeleteId, setBusyDeleteId] = useState("");
 
@@ -63,16 +68,35 @@ export default function Dashboard() {
   const load = async () => {
     setLoading(true);
     try {
-      const data = await listFiles(token);
+      const data = await listFiles(token, { limit: PAGE_SIZE });
       setFiles(Array.isArray(data) ? data : data?.items || []);
+      setNextCursor(data?.next_cursor || null);
     } catch {
       setFiles([]);
+      setNextCursor(null);
       showToast("No se pudo cargar archivos.");
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const data = await listFiles(token, {
+        cursor: nextCursor,
+        limit: PAGE_SIZE,
+      });
+      setFiles((prev) => [...prev, ...(data?.items || [])]);
+      setNextCursor(data?.next_cursor || null);
+    } catch {
+      showToast("No se pudieron cargar más archivos.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     load();
     // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -257,7 +281,10 @@ export default function Dashboard() {
         <section className={styles.statsRow}>
           <div className={styles.statCard}>
             <div className={styles.statLabel}>Archivos</div>
-            <div className={styles.statValue}>{files.length}</div>
+            <div className={styles.statValue}>
+              {files.length}
+              {nextCursor ? "+" : ""}
+            </div>
           </div>
 
           <div className={styles.statCardWide}>
@@ -362,6 +389,19 @@ export default function Dashboard() {
               })}
             </div>
           )}
+
+          {!loading && nextCursor && (
+            <div className={styles.loadMore}>
+              <button
+                type="button"
+                className={styles.secondaryBtn}
+                onClick={loadMore}
+                disabled={loadingMore}
+              >
+                {loadingMore ? "Cargando…" : "Cargar más"}
+              </button>
+            </div>
+          )}
         </section>
       </main>
     </div>
@@ -10,8 +10,14 @@ import {
 import { useNavigate, useParams } from "react-router-dom";
 import styles from "../styles/FileDetail.module.css";
 import { AuthContext } from "../context/AuthContext";
-import { getFile, updateFile, downloadFileXlsx } from "../services/files";
+import {
+  getFile,
+  updateFile,
+  patchFile,
+  downloadFileXlsx,
+} from "../services/files";
 import { downloadJSON } from "../utils/export";
+import { diffJsonPatch } from "../utils/jsonPatch";
 
 const TYPES = { LEVEL: "LEVEL", GROUP: "GROUP", ITEM: "ITEM" };
 
@@ -1524,16 +1530,60 @@ export default function FileDetail() {
         { preserveScales: !!originalHadScales },
       );
 
+      const canPatch =
+        rawFileJson &&
+        typeof rawFileJson === "object" &&
+        file?.file_json &&
+        typeof file.file_json === "object";
+
+      if (canPatch) {
+        // Solo mandamos lo que cambió (JSON Patch) en vez del documento completo
+        const nextFileJson = hasDataLayer
+          ? { ...rawFileJson, data: dataObj }
+          : dataObj;
+        const ops = hasDataLayer
+          ? diffJsonPatch(rawFileJson.data, dataObj, "/data")
+          : diffJsonPatch(rawFileJson, dataObj);
+
+        let saved = null;
+        if (ops.length) {
+          try {
+            saved = await patchFile(fileId, ops, token, file?.revision);
+          } catch (e) {
+            if (e.status === 412) throw e;
+            console.warn("patch failed, sending full document", e);
+          }
+        }
+
+        if (saved || !ops.length) {
+          setFile((prev) => ({
+            ...prev,
+            ...(saved || {}),
+            file_json: nextFileJson,
+          }));
+          setDirty(false);
+          setStatus("ok", "Guardado.");
+          return;
+        }
+      }
+
       const payload = {
         file_json: hasDataLayer ? { data: dataObj } : dataObj,
       };
 
-      const updated = await updateFile(fileId, payload, token);
+      const updated = await updateFile(fileId, payload, token, file?.revision);
       setFile(updated);
       setDirty(false);
       setStatus("ok", "Guardado.");
     } catch (e) {
       console.error("save error", e);
+      if (e.status === 412) {
+        setStatus(
+          "bad",
+          "Otra sesión guardó este archivo. Recarga la página antes de guardar (tus cambios no se guardaron).",
+        );
+        return;
+      }
       setStatus("bad", "No se pudo guardar (revisa consola).");
     } finally {
       setSaving(false);
@@ -20,7 +20,7 @@ export async function apiFetch(
   const isFormData =
     typeof FormData !== "undefined" && body instanceof FormData;
 
-  if (hasBody && !isFormData) {
+  if (hasBody && !isFormData && !headers["Content-Type"]) {
     headers["Content-Type"] = "application/json";
   }
 
@@ -46,7 +46,9 @@ export async function apiFetch(
     } catch {
       // no-op
     }
-    throw new Error(msg);
+    const err = new Error(msg);
+    err.status = res.status;
+    throw err;
   }
 
   // Respuestas OK según tipo
@@ -1,7 +1,13 @@
 import { apiFetch } from "./api";
 
-export async function listFiles(token) {
-  return apiFetch("/files", { token });
+// Paginado por cursor: devuelve { items, next_cursor }
+export async function listFiles(token, { cursor, limit, namePrefix } = {}) {
+  const params = new URLSearchParams();
+  if (cursor) params.set("cursor", cursor);
+  if (limit) params.set("limit", String(limit));
+  if (namePrefix) params.set("name_prefix", namePrefix);
+  const qs = params.toString();
+  return apiFetch(qs ? `/files?${qs}` : "/files", { token });
 }
 
 export async function deleteFile(fileId, token) {
@@ -23,10 +29,29 @@ export async function downloadFileXlsx(fileId, token) {
   });
 }
 
-export async function updateFile(fileIdOrCode, payload, token) {
+// Con revision se manda If-Match: el backend responde 412 si otro guardó antes
+function ifMatch(revision) {
+  return revision != null ? { "If-Match": `"r${revision}"` } : {};
+}
+
+export async function updateFile(fileIdOrCode, payload, token, revision) {
   return apiFetch(`/files/${fileIdOrCode}`, {
     method: "PATCH",
     body: payload,
     token,
+    headers: ifMatch(revision),
+  });
+}
+
+// Guardado parcial: ops es un JSON Patch (RFC 6902). Responde { id, code, size_bytes, revision, updated_at }
+export async function patchFile(fileIdOrCode, ops, token, revision) {
+  return apiFetch(`/files/${fileIdOrCode}`, {
+    method: "PATCH",
+    body: ops,
+    token,
+    headers: {
+      "Content-Type": "application/json-patch+json",
+      ...ifMatch(revision),
+    },
   });
 }
@@ -0,0 +1,55 @@
+// Genera un JSON Patch (RFC 6902) con las diferencias entre dos documentos JSON,
+// para guardar solo lo que cambió en vez de reenviar el documento completo.
+
+function escapePointer(key) {
+  return String(key).replace(/~/g, "~0").replace(/\//g, "~1");
+}
+
+function isPlainObject(v) {
+  return v !== null && typeof v === "object" && !Array.isArray(v);
+}
+
+function sameJson(a, b) {
+  if (a === b) return true;
+  if (typeof a !== typeof b || a === null || b === null) return false;
+  if (typeof a !== "object") return false;
+  return JSON.stringify(a) === JSON.stringify(b);
+}
+
+export function diffJsonPatch(before, after, path = "", ops = []) {
+  if (sameJson(before, after)) return ops;
+
+  if (isPlainObject(before) && isPlainObject(after)) {
+    for (const k of Object.keys(before)) {
+      if (!(k in after)) ops.push({ op: "remove", path: `${path}/${escapePointer(k)}` });
+    }
+    for (const k of Object.keys(after)) {
+      const p = `${path}/${escapePointer(k)}`;
+      if (!(k in before)) ops.push({ op: "add", path: p, value: after[k] });
+      else diffJsonPatch(before[k], after[k], p, ops);
+    }
+    return ops;
+  }
+
+  if (Array.isArray(before) && Array.isArray(after)) {
+    const common = Math.min(before.length, after.length);
+    for (let i = 0; i < common; i++) {
+      diffJsonPatch(before[i], after[i], `${path}/${i}`, ops);
+    }
+    for (let i = common; i < after.length; i++) {
+      ops.push({ op: "add", path: `${path}/-`, value: after[i] });
+    }
+    // se eliminan desde el final para no correr los índices
+    for (let i = before.length - 1; i >= common; i--) {
+      ops.push({ op: "remove", path: `${path}/${i}` });
+    }
+    return ops;
+  }
+
+  if (before === undefined) {
+    ops.push({ op: "add", path, value: after });
+  } else {
+    ops.push({ op: "replace", path, value: after });
+  }
+  return ops;
+}